@@ -1,51 +1,64 @@
 import numpy as np
-import copy as copy
 #agent.py
 #stores the agent class and related functionality
 
 #route_step = [next_service_name,node.name]
+#an agents path is a flat tuple of alternating route steps (service to board, node to alight at)
+#paths are never modified once created, so many agents can share the same tuple, progress along the path is tracked by path_index
 
 class Agent:
-    def __init__(self,start_node,destination_node,id,start_time,network,number_passengers,path):
-        self.start_node = start_node 
-        self.destination_node = destination_node
-        self.id = id
+    #agents are created in the millions, so use slots to avoid a per-agent attribute dictionary
+    __slots__ = ('start_node','destination_node','id','start_time','number_passengers','destination_path','path_index','done','cohort_key')
+
+    def __init__(self,start_node,destination_node,id,start_time,number_passengers,path):
+        self.id = id #id of the agent, this is also its slot in the agent pool
+        self.reset(start_node,destination_node,start_time,number_passengers,path)
+
+    #(re)initialise the agent, used both on creation and when a finished agent's slot is reused
+    def reset(self,start_node,destination_node,start_time,number_passengers,path):
+        self.start_node = start_node #id of the node the agent started at
+        self.destination_node = destination_node #id of the node the agent is travelling too
         self.start_time = start_time
-        self.network = network #reference to the network object
-        self.destination_path = path #path of actions to the destination node
+        self.destination_path = path #path of actions to the destination node (shared tuple)
+        self.path_index = 0 #index of the next action in the path
         self.number_passengers = number_passengers #number of passengers represented by this agent
-        #self.found_path = self.pathfind()
         self.done = False #has the agent reached their destination yet
-        
+        self.cohort_key = None #remaining path the agent was filed under when merged into a cohort (cohort mode only)
+
+    #the actions the agent still has to take, agents at the same place with the same remaining path behave identically
+    def remaining_path(self):
+        return self.destination_path[self.path_index:]
 
     #calculate a path from the start to the destination
     #store this path inside the agent
-    def pathfind(self):
-        #print('start ',self.start_node.name,' destination ',self.destination_node.name) #DEBUG
+    def pathfind(self,network):
+        start_node = network.nodes[self.start_node]
+        #print('start ',start_node.name,' destination ',network.nodes[self.destination_node].name) #DEBUG
         #get info about vehicles arriving at the starting node
-        start_next_service_times,start_nodes_after,start_node_times_after,start_schedule_names = self.start_node.provide_next_services(data_time=self.start_time,start=True)
+        start_next_service_times,start_nodes_after,start_node_times_after,start_schedule_names = start_node.provide_next_services(data_time=self.start_time,start=True)
         #get index (id) of starting and ending nodes in the network structure
-        start_node_index = self.start_node.id
-        destination_node_index = self.destination_node.id
+        start_node_index = self.start_node
+        destination_node_index = self.destination_node
         #create an array to store the paths to all the other nodes
-        num_nodes_in_network = len(self.network.node_names)
+        num_nodes_in_network = len(network.node_names)
         distance_to_nodes = np.zeros(num_nodes_in_network) + np.inf #initial distance to reach all other nodes will be infinite
         evaluated_nodes = np.zeros(num_nodes_in_network)  #when a node is evaluated the value in this matrix is set to infinite, ensuring that node is never evaluated again
         distance_to_nodes[start_node_index] = 0 #initial distance to reach the starting node is 0
-        distance_to_final_destination = self.network.distance_to_all[:,destination_node_index]
-        path_to_nodes = [[] for _ in range(num_nodes_in_network)] #create an empty nested list of the required length to store paths to nodes
+        distance_to_final_destination = network.distance_to_all[:,destination_node_index]
+        path_to_nodes = [() for _ in range(num_nodes_in_network)] #create an empty nested list of the required length to store paths to nodes
         #now that we have extracted preliminary data, start the pathfinding operation
         while True: #loop till we meet an exit condition
             expected_distance_to_nodes = distance_to_nodes + distance_to_final_destination + evaluated_nodes #expected (minimal) distance to reach a node
             min_index = np.argmin(expected_distance_to_nodes) #get the index of the node with the lowest expected travel time, evaluate this next
             minimum_expected_distance = expected_distance_to_nodes[min_index]
-            #print('evaluating ',self.network.nodes[min_index].name,' which takes ',distance_to_nodes[min_index],' to reach from start') #DEBUG
+            #print('evaluating ',network.nodes[min_index].name,' which takes ',distance_to_nodes[min_index],' to reach from start') #DEBUG
             #print('and ',expected_distance_to_nodes[min_index],' to reach final through') #DEBUG
             if minimum_expected_distance == np.inf:
                 break #break out of the loop, we have explored all the network we can reach
             elif min_index == destination_node_index:
                 #print('we have found the destination node')
                 self.destination_path = path_to_nodes[destination_node_index]
+                self.path_index = 0
                 #print(self.destination_path)
                 break
             else:
@@ -61,7 +74,7 @@ class Agent:
 
                 else:
                     #otherwise calculate data about vehicle arrivials at nodes on the fly
-                    next_service_times,nodes_after,times_after,schedule_names = self.network.nodes[min_index].provide_next_services(start=False,data_time=current_time)
+                    next_service_times,nodes_after,times_after,schedule_names = network.nodes[min_index].provide_next_services(start=False,data_time=current_time)
 
                 #now it's time to calculate the path to other nodes
                 num_schedules = len(next_service_times)
@@ -80,15 +93,9 @@ class Agent:
                             #if so, we have found a better path
                             #print('we have found a better path') #DEBUG
                             distance_to_nodes[node_index] = distance_to_current_node_new_path
-                            route_to_old_node = path_to_nodes[min_index] #extract the path to the evaluation node
-                            #print('route to previous node ',route_to_old_node) #DEBUG
-                            #print('route step ',route_step)
-                            route_to_new_node = copy.copy(route_to_old_node) #path to the next node is path to the evaluation node + new step
-                            route_to_new_node.append(next_service_name) #store the next service we need to catch
-                            route_to_new_node.append(node.name) #and when we need to get off that service
-                            #print('new route ',route_to_new_node) #DEBUG
-                            path_to_nodes[node_index] = route_to_new_node #store this in the list of all paths
-                
+                            #path to the next node is path to the evaluation node + the service we need to catch + where we need to get off that service
+                            path_to_nodes[node_index] = path_to_nodes[min_index] + (next_service_name,node.name) #store this in the list of all paths
+
                 #mark the evaluated node as evaluated, it will not be evaluated again
                 evaluated_nodes[min_index] = np.inf
 
@@ -99,26 +106,24 @@ class Agent:
             return True #indicate we successfully found a path to their destination
     #ask the agent if it wishes to board a vehicle of a particular schedule
     def board(self,schedule_name):
-        #print('boarding' ,self.destination_path)
-        if schedule_name==self.destination_path[0]:
+        #print('boarding' ,self.destination_path[self.path_index:])
+        if schedule_name==self.destination_path[self.path_index]:
             #print('boarding boarding')
             #board if schedule name matches with next schedule to board
-            del self.destination_path[0] #we only wish to board this service once
-            #print('boarding',self.destination_path)
+            self.path_index = self.path_index + 1 #we only wish to board this service once
             return True
         else:
             return False
 
     #ask the agent if it wishes to alight a vehicle at a particular node
     def alight(self,node_name):
-        #print('alighting',self.destination_path)
+        #print('alighting',self.destination_path[self.path_index:])
         #print('node name ',node_name)
-        if node_name==self.destination_path[0]:
+        if node_name==self.destination_path[self.path_index]:
             #print('alighting alighting')
             #alight if node name matches with next node to alight at
-            del self.destination_path[0] #we only wish to alight at this node once
-            #print('alighting',self.destination_path)
-            if len(self.destination_path)==0:
+            self.path_index = self.path_index + 1 #we only wish to alight at this node once
+            if self.path_index==len(self.destination_path):
                 return 2 #indicate agent has come to the end of its journey after alighting here
             else:
                 return 1 #indicate agent has alighted here, but still exists
@@ -126,16 +131,75 @@ class Agent:
             return 0 #indicate not alighting here
 
     #print the path from the start destination to the end destination
-    def test_agent_path(self):
-        print('START ',self.start_node.name)
-        print('DESTINATION ',self.destination_node.name)
-        print("PATH ",self.destination_path)
-        
+    def test_agent_path(self,network):
+        print('START ',network.nodes[self.start_node].name)
+        print('DESTINATION ',network.nodes[self.destination_node].name)
+        print("PATH ",self.destination_path[self.path_index:])
 
 
+#pool of agent objects, agents who finish their journey are returned to the pool and their slot is reused for new agents
+#this keeps memory bounded by the number of agents alive at once, rather than the number ever created
+class AgentPool:
+    def __init__(self,initial_capacity=1024):
+        self.agents = [] #agent objects, an agents id is its index in this list
+        self.in_use = np.zeros(initial_capacity,dtype=bool) #True if the slot currently holds an agent still travelling
+        self.free_ids = [] #ids of slots which have been released and can be reused
+        self.num_active = 0 #number of agents currently travelling
+        self.num_created = 0 #number of agents handed out by the pool over its lifetime
 
+    #get an agent from the pool, reusing a released slot if one is available
+    def acquire(self,start_node,destination_node,start_time,number_passengers,path):
+        if len(self.free_ids)>0:
+            id = self.free_ids.pop()
+            new_agent = self.agents[id]
+            new_agent.reset(start_node,destination_node,start_time,number_passengers,path)
+        else:
+            id = len(self.agents)
+            if id>=len(self.in_use): #grow the slot array when full
+                self.in_use = np.concatenate((self.in_use,np.zeros(len(self.in_use),dtype=bool)))
+            new_agent = Agent(start_node,destination_node,id,start_time,number_passengers,path)
+            self.agents.append(new_agent)
+        self.in_use[id] = True
+        self.num_active = self.num_active + 1
+        self.num_created = self.num_created + 1
+        return new_agent
 
+    #return a finished agent to the pool, the caller must have removed all other references to it
+    def release(self,agent):
+        agent.done = True
+        agent.destination_path = () #drop the reference to the (shared) path
+        self.in_use[agent.id] = False
+        self.free_ids.append(agent.id)
+        self.num_active = self.num_active - 1
 
-        
+    #number of slots allocated, live or free
+    def capacity(self):
+        return len(self.agents)
 
+    #save the pool and every agent still travelling, agents are saved as tuples of their fields
+    def capture_state(self):
+        live_agents = []
+        for id in np.flatnonzero(self.in_use):
+            agent = self.agents[id]
+            live_agents.append((agent.id,agent.start_node,agent.destination_node,agent.start_time,agent.number_passengers,agent.destination_path,agent.path_index,agent.cohort_key))
+        return {'num_slots':len(self.agents),'free_ids':list(self.free_ids),'num_active':self.num_active,'num_created':self.num_created,'agents':live_agents}
 
+    #return the pool to a state saved by capture_state, agents keep their ids so references to them can be rebuilt from ids
+    def restore_state(self,state):
+        num_slots = state['num_slots']
+        del self.agents[num_slots:]
+        while len(self.agents)<num_slots:
+            self.agents.append(Agent(-1,-1,len(self.agents),0,0,()))
+        self.in_use = np.zeros(max(len(self.in_use),num_slots),dtype=bool)
+        for agent in self.agents: #every slot starts released
+            agent.done = True
+            agent.destination_path = ()
+        for (id,start_node,destination_node,start_time,number_passengers,destination_path,path_index,cohort_key) in state['agents']:
+            agent = self.agents[id]
+            agent.reset(start_node,destination_node,start_time,number_passengers,destination_path)
+            agent.path_index = path_index
+            agent.cohort_key = cohort_key
+            self.in_use[id] = True
+        self.free_ids = list(state['free_ids'])
+        self.num_active = state['num_active']
+        self.num_created = state['num_created']
@@ -0,0 +1,195 @@
+#benchmark.py
+#time the setup and simulation of synthetic networks of controllable size, to find how the simulation scales
+
+import numpy as np #for large scale mathematical operations
+import pandas as pd
+import contextlib as contextlib #for silencing the simulation printout
+import os as os
+import time as time
+import json as json #for saving benchmark results
+import random as rand
+import network as n
+import instrument as instrument #for timing each phase of the simulation
+
+#centre of the synthetic networks, near Sydney so generated coordinates look like the real network
+CENTRE_LATITUDE = -33.87
+CENTRE_LONGITUDE = 151.2
+DEGREES_PER_KM = 0.009 #approximate, good enough for drawing synthetic networks
+
+#parameters, evaluation costs and demand used for all synthetic networks, matching the Sydney data
+def default_parameters_csv():
+    return pd.DataFrame({'Vehicle Max Seated':[910],'Vehicle Max Standing':[1610],'Traffic Time Gap':[60]})
+
+def default_eval_csv():
+    return pd.DataFrame({'Vehicle Cost':[652],'Agent Cost Seated':[10],'Agent Cost Standing':[15],'Agent Cost Waiting':[15],'Unfinished Penalty':[150]})
+
+#a constant traffic multiplier for the given number of minutes (rounded up to a whole number of traffic time gaps)
+def flat_scenario_csv(minutes,multiplier=0.05,traffic_time_gap=60):
+    num_gaps = int(np.ceil(minutes/traffic_time_gap))
+    return pd.DataFrame({'Traffic Multiplier':[0.0] + [multiplier]*num_gaps})
+
+#name of a synthetic stop
+def stop_name(i):
+    return 'Stop ' + str(i)
+
+#build the csv files of a synthetic network in the formats of nodes_*, edges_* and schedule_* (simple schedule format)
+#positions are (x,y) in km from the centre, edges are (start,end,time) pairs of stop indices, routes are lists of stop indices
+#every route is run in both directions, with the given headway (gap in minutes) between services
+def network_csvs(positions,daily_passengers,edges,routes,headways,finish=1200):
+    node_names = [stop_name(i) for i in range(len(positions))]
+    locations = [str(CENTRE_LATITUDE+y*DEGREES_PER_KM) + ', ' + str(CENTRE_LONGITUDE+x*DEGREES_PER_KM) for x,y in positions]
+    nodes_csv = pd.DataFrame({'Name':node_names,'Daily Passengers':daily_passengers,'Location':locations})
+    edges_csv = pd.DataFrame({'Start':[node_names[start] for start,end,travel_time in edges],'End':[node_names[end] for start,end,travel_time in edges],
+                              'Time':[travel_time for start,end,travel_time in edges],'Bidirectional':['Yes']*len(edges)})
+    headways = np.broadcast_to(headways,(len(routes),))
+    schedule_rows = []
+    for i,route in enumerate(routes):
+        for direction,stops in (('Up',route),('Down',route[::-1])):
+            schedule_rows.append({'Name':'Route ' + str(i) + ' ' + direction,'Gap':int(headways[i]),'Offset':0,'Finish':finish,'Schedule':','.join([node_names[stop] for stop in stops])})
+    schedule_csv = pd.DataFrame(schedule_rows,columns=['Name','Gap','Offset','Finish','Schedule'])
+    return {'nodes_csv':nodes_csv,'edges_csv':edges_csv,'schedule_csv':schedule_csv}
+
+#random daily passengers for each stop, similar in range to Sydney stations
+def random_daily_passengers(rng,num_stops):
+    return rng.integers(200,5000,num_stops).tolist()
+
+#stops on a rectangular grid (num_stops is rounded to the nearest rectangle), joined to their neighbours along rows and columns
+#returns the number of rows and columns, stop positions and edges, stop indices run along each row in turn
+def grid_layout(num_stops,spacing=1.5,edge_time=2):
+    num_columns = max(2,int(np.round(np.sqrt(num_stops))))
+    num_rows = max(2,int(np.round(num_stops/num_columns)))
+    positions = [(column*spacing,row*spacing) for row in range(num_rows) for column in range(num_columns)]
+    edges = []
+    for row in range(num_rows):
+        for column in range(num_columns):
+            stop = row*num_columns + column
+            if column+1<num_columns:
+                edges.append((stop,stop+1,edge_time))
+            if row+1<num_rows:
+                edges.append((stop,stop+num_columns,edge_time))
+    return num_rows,num_columns,positions,edges
+
+#grid of stops with a route along every row and every column
+#num_routes (if given) keeps only that many of the rows and columns as routes
+def grid_network(num_stops,num_routes=None,headway=10,spacing=1.5,edge_time=2,seed=0):
+    rng = np.random.default_rng(seed)
+    num_rows,num_columns,positions,edges = grid_layout(num_stops,spacing,edge_time)
+    routes = [[row*num_columns + column for column in range(num_columns)] for row in range(num_rows)]
+    routes = routes + [[row*num_columns + column for row in range(num_rows)] for column in range(num_columns)]
+    if num_routes is not None:
+        routes = routes[:num_routes]
+    return network_csvs(positions,random_daily_passengers(rng,len(positions)),edges,routes,headway)
+
+#stops along spokes out from a central stop, joined by a ring through the outer stops of each spoke
+#each spoke is a route to the centre, and the ring is a route of its own, so there are num_routes-1 spokes
+def radial_network(num_stops,num_routes=9,headway=10,spacing=1.5,edge_time=2,seed=0):
+    rng = np.random.default_rng(seed)
+    num_spokes = max(2,num_routes-1)
+    stops_per_spoke = max(1,int(np.round((num_stops-1)/num_spokes)))
+    positions = [(0.0,0.0)] #the centre is stop 0
+    edges = []
+    routes = []
+    outer_stops = []
+    for spoke in range(num_spokes):
+        angle = 2*np.pi*spoke/num_spokes
+        route = [0]
+        previous_stop = 0
+        for k in range(1,stops_per_spoke+1):
+            positions.append((k*spacing*np.cos(angle),k*spacing*np.sin(angle)))
+            new_stop = len(positions)-1
+            edges.append((previous_stop,new_stop,edge_time))
+            route.append(new_stop)
+            previous_stop = new_stop
+        routes.append(route)
+        outer_stops.append(previous_stop)
+    #ring between neighbouring spokes, travel time grows with the distance around the ring
+    ring_time = max(1,int(np.round(edge_time*2*np.pi*stops_per_spoke/num_spokes)))
+    for spoke in range(num_spokes):
+        edges.append((outer_stops[spoke],outer_stops[(spoke+1)%num_spokes],ring_time))
+    routes.append(outer_stops + [outer_stops[0]])
+    return network_csvs(positions,random_daily_passengers(rng,len(positions)),edges,routes,headway)
+
+#a grid of stops with many routes between random stops, each following the grid along its row then its column
+#routes overlap heavily in the middle of the grid, stressing stops served by many schedules
+def overlapping_routes_network(num_stops,num_routes,headway=10,spacing=1.5,edge_time=2,seed=0):
+    rng = np.random.default_rng(seed)
+    num_rows,num_columns,positions,edges = grid_layout(num_stops,spacing,edge_time)
+    routes = []
+    while len(routes)<num_routes:
+        start_row,end_row = rng.integers(0,num_rows,2)
+        start_column,end_column = rng.integers(0,num_columns,2)
+        if start_row==end_row or start_column==end_column:
+            continue #routes along a single row or column are what grid_network generates
+        column_step = 1 if end_column>start_column else -1
+        row_step = 1 if end_row>start_row else -1
+        route = [start_row*num_columns + column for column in range(start_column,end_column+column_step,column_step)]
+        route = route + [row*num_columns + end_column for row in range(start_row+row_step,end_row+row_step,row_step)]
+        routes.append([int(stop) for stop in route])
+    return network_csvs(positions,random_daily_passengers(rng,len(positions)),edges,routes,headway)
+
+#the synthetic network generators, by name
+GENERATORS = {'grid':grid_network,'radial':radial_network,'overlapping':overlapping_routes_network}
+
+#write the csv files of a network to a directory, named like the Sydney data (nodes_<name>.csv etc)
+def write_network_csvs(csvs,directory,name):
+    os.makedirs(directory,exist_ok=True)
+    for csv_name,prefix in (('nodes_csv','nodes'),('edges_csv','edges'),('schedule_csv','schedule'),('parameters_csv','parameters'),('eval_csv','eval'),('scenario_csv','scenario')):
+        if csv_name in csvs:
+            csvs[csv_name].to_csv(os.path.join(directory,prefix + '_' + name + '.csv'),index=False)
+
+#build and simulate one network, returning the seconds taken by each phase of setup and of the simulation, and the work done (see instrument.py)
+#csvs holds at least the nodes, edges and schedule csvs, defaults are used for the parameters, evaluation costs and demand
+#csvs may also give the schedule_type (eg the result of gtfs.import_feed), otherwise the simple schedule format is used
+def benchmark_network(csvs,minutes=60,agent_mode='individual',seed=30699):
+    network_kwargs = {'parameters_csv':default_parameters_csv(),'eval_csv':default_eval_csv(),'scenario_csv':flat_scenario_csv(minutes),'schedule_type':'simple'}
+    network_kwargs.update(csvs)
+    rand.seed(seed)
+    with open(os.devnull,'w') as devnull, contextlib.redirect_stdout(devnull): #the simulation prints every timestep
+        time1 = time.perf_counter()
+        network = n.Network(verbose=0,agent_mode=agent_mode,**network_kwargs)
+        network.attach_instrument(instrument.Instrument())
+        time2 = time.perf_counter()
+        trace,num_failed,num_successful,final_time = network.basic_sim(recording_policy='counts_only')
+        time3 = time.perf_counter()
+    result = {'num_stops':len(network.nodes),'num_edges':len(network.edges),'num_schedules':len(network.schedules),'minutes':final_time,'agent_mode':agent_mode,
+              'setup_seconds':time2-time1,'sim_seconds':time3-time2,'num_successful_agents':num_successful,'num_failed_agents':num_failed,
+              'num_vehicles':len(network.vehicle_names),'agent_slots':network.agent_pool.capacity()}
+    for phase,seconds in network.setup_timings.items():
+        result['setup_' + phase] = seconds
+    for phase,seconds in network.instrument.phase_totals().items():
+        result['step_' + phase] = seconds
+    for name,summary in network.instrument.summary()['counters'].items():
+        result['total_' + name] = summary['total']
+        result['max_' + name] = summary['max']
+    return result
+
+#benchmark each generator at each size, sizes are (num_stops,num_routes) pairs, routes are run in both directions so each gives two schedules
+#returns a list of results, one per network, see benchmark_network
+def run_benchmarks(generator_names,sizes,headway=10,minutes=60,agent_mode='individual',seed=0,csv_directory=None):
+    results = []
+    for generator_name in generator_names:
+        for num_stops,num_routes in sizes:
+            csvs = GENERATORS[generator_name](num_stops,num_routes,headway=headway,seed=seed)
+            if csv_directory is not None:
+                write_network_csvs(csvs,csv_directory,generator_name + '_' + str(num_stops) + '_' + str(num_routes))
+            result = benchmark_network(csvs,minutes,agent_mode)
+            result['generator'] = generator_name
+            result['headway'] = headway
+            print(generator_name,' stops ',result['num_stops'],' schedules ',result['num_schedules'],' setup ',round(result['setup_seconds'],3),'s simulation ',round(result['sim_seconds'],3),'s')
+            results.append(result)
+    return results
+
+#save benchmark results as json (with details of the machine) and as a csv with one row per network
+def save_results(results,json_path,csv_path=None):
+    with open(json_path,'w') as results_file:
+        json.dump({'created':time.strftime('%Y-%m-%d %H:%M:%S'),'cpu_count':os.cpu_count(),'numpy_version':np.__version__,'pandas_version':pd.__version__,'results':results},results_file,indent=1)
+    if csv_path is not None:
+        pd.DataFrame(results).to_csv(csv_path,index=False)
+
+def main():
+    sizes = [(25,6),(50,12),(100,25),(200,50)]
+    results = run_benchmarks(['grid','radial','overlapping'],sizes)
+    save_results(results,'benchmark_results.json','benchmark_results.csv')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+#canvas_pool.py
+#pools of tkinter canvas items which are kept alive between frames, rather than deleted and recreated every frame
+#items are moved with canvas.coords, recoloured with itemconfigure (only when an option actually changes) and hidden when not needed
+
+import tkinter as tk
+
+#a pool of canvas items of one type (eg 'rectangle', 'oval', 'line' or 'text'), all given the same tag
+#update shows one item per entry of a list of coordinates, reusing the items of the previous frame and creating more only when the pool is too small
+#event handlers are bound once to the tag rather than to each item, handlers find which item the event is for with index_of
+class CanvasItemPool:
+    def __init__(self,canvas,item_type,tag,shown_state=tk.NORMAL,bindings=None):
+        self.canvas = canvas
+        self.item_type = item_type #type of item, the create_<item_type> method of the canvas is used to make new items
+        self.tag = tag #tag given to every item of the pool
+        self.shown_state = shown_state #state of shown items, eg tk.DISABLED for text which should not respond to the mouse
+        self.bindings = bindings if bindings is not None else {} #event sequence to handler, for every item of the pool
+        self.ids = [] #canvas id of every item in the pool, the first num_shown are shown
+        self.item_options = [] #options last set on each item, so unchanged options are not sent to tk again
+        self.indices = {} #index of each item in the pool from its canvas id, for event handlers
+        self.num_shown = 0
+        for sequence,handler in self.bindings.items():
+            self.canvas.tag_bind(self.tag,sequence,handler) #applies to items created later too
+
+    #create a new item at the end of the pool
+    def create_item(self,coords,options):
+        create = getattr(self.canvas,'create_' + self.item_type)
+        item_id = create(*coords,tags=(self.tag,),state=self.shown_state,**options)
+        self.indices[item_id] = len(self.ids)
+        self.ids.append(item_id)
+        self.item_options.append(dict(options))
+
+    #show len(coords) items, item i at coords[i] with option values options[name][i] (or options[name] if it is the same for every item)
+    #any items beyond those needed are hidden
+    def update(self,coords,**options):
+        num_items = len(coords)
+        per_item = {name:isinstance(values,(list,tuple)) for name,values in options.items()}
+        for i in range(num_items):
+            item_options = {name:(values[i] if per_item[name] else values) for name,values in options.items()}
+            if i>=len(self.ids):
+                self.create_item(coords[i],item_options)
+                continue
+            item_id = self.ids[i]
+            self.canvas.coords(item_id,*coords[i])
+            last_options = self.item_options[i]
+            changed = {name:value for name,value in item_options.items() if last_options.get(name)!=value}
+            last_options.update(changed)
+            if i>=self.num_shown: #the item was hidden
+                changed['state'] = self.shown_state
+            if len(changed)>0:
+                self.canvas.itemconfigure(item_id,**changed)
+        for i in range(num_items,self.num_shown):
+            self.canvas.itemconfigure(self.ids[i],state=tk.HIDDEN)
+        self.num_shown = num_items
+
+    #hide all the items, keeping them for later frames
+    def hide(self):
+        for i in range(self.num_shown):
+            self.canvas.itemconfigure(self.ids[i],state=tk.HIDDEN)
+        self.num_shown = 0
+
+    #delete all the items from the canvas
+    def clear(self):
+        self.canvas.delete(self.tag)
+        self.ids = []
+        self.item_options = []
+        self.indices = {}
+        self.num_shown = 0
+
+    #index of the shown item with a canvas id, -1 if it is not a shown item of this pool
+    def index_of(self,item_id):
+        index = self.indices.get(item_id,-1)
+        if index>=self.num_shown:
+            return -1
+        return index
+
+    #index of the item under the mouse (the canvas 'current' item) for event handlers bound to the pool, -1 if it is not one of ours
+    def current_index(self):
+        current = self.canvas.find_withtag('current')
+        if len(current)==0:
+            return -1
+        return self.index_of(current[0])
+
+    #draw the items of the pool above all other items
+    def raise_items(self):
+        self.canvas.tag_raise(self.tag)
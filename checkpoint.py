@@ -0,0 +1,450 @@
+#checkpoint.py
+#rerun a simulation from a saved checkpoint after its timetable changes, rather than from the start
+#and save checkpoints to disk, so long simulations can be resumed after being interrupted, branched or split across machines
+
+import numpy as np #for large scale mathematical operations
+import copy as copy #for copying schedules when rebuilding vehicles
+import os as os
+import glob as glob #for finding the trace directories of old checkpoints
+import shutil as shutil #for removing the trace directories of old checkpoints
+import time as time #for naming new trace directories
+import json as json #for the small fields of a saved checkpoint
+import hashlib as hashlib #for fingerprinting the network a checkpoint belongs to
+import trace_store as trace_store #for the recording policy of a loaded checkpoint
+
+CHECKPOINT_VERSION = 3 #increased when the saved format changes
+
+#the numerical fields of vehicles, saved as one column each
+VEHICLE_FIELDS = ['id','state','state_new','at_final_destination','number_passengers','num_passengers','max_passengers','schedule','start_time','nodes_reached','edges_reached',
+                  'previous_stop','final_destination','next_destination','next_edge','edge_length','move_timer']
+
+#find the earliest time at which two dispatch schedules (lists of departure times for each schedule) differ
+#returns None if they are identical
+def first_dispatch_change(old_dispatch,new_dispatch):
+    first_change = None
+    for old_times,new_times in zip(old_dispatch,new_dispatch):
+        change = None
+        num_common = min(len(old_times),len(new_times))
+        for k in range(num_common):
+            if old_times[k]!=new_times[k]:
+                change = min(old_times[k],new_times[k])
+                break
+        if change is None: #identical up to the end of the shorter list
+            if len(old_times)>num_common:
+                change = old_times[num_common]
+            elif len(new_times)>num_common:
+                change = new_times[num_common]
+        if change is not None and (first_change is None or change<first_change):
+            first_change = change
+    return first_change
+
+#how long before a changed departure the simulation could already be affected by it
+#passengers plan their whole journey when created, so a passenger created up to a journey (the longest ideal travel time between any two nodes)
+#plus a wait for a service (the largest gap) before the departure could plan to use it, pathfinding caches can also be up to a gap old
+#this is a conservative estimate rather than a guarantee
+def default_lookahead(network,old_gaps):
+    distances = network.distance_to_all[np.isfinite(network.distance_to_all)]
+    max_gap = max(np.max(old_gaps),np.max(network.schedule_gaps))
+    return np.max(distances) + 2*max_gap
+
+#copy the first num_times timesteps of one trace into another (empty) trace
+def copy_trace_prefix(source,destination,num_times):
+    offsets,ids,latitudes,longitudes,passengers = source.get_vehicles_in_range(0,num_times)
+    record_trace_arrays(destination,source.times[:num_times],source.node_loads[:num_times],offsets,ids,latitudes,longitudes,passengers)
+
+#record timesteps held as arrays (as returned by get_vehicles_in_range) into an empty trace
+def record_trace_arrays(destination,times,node_loads,offsets,ids,latitudes,longitudes,passengers):
+    for i in range(len(times)):
+        destination.record_time(times[i])
+        start = offsets[i]
+        end = offsets[i+1]
+        destination.record_vehicles(ids[start:end],latitudes[start:end],longitudes[start:end],passengers[start:end])
+        if i<len(node_loads): #node loads are not recorded by every recording policy
+            destination.record_nodes(node_loads[i])
+
+#rerun a simulation which was run with checkpoints (basic_sim with checkpoint_interval) after changing schedule gaps and/or offsets
+#the simulation is resumed from the latest checkpoint at least lookahead timesteps before the first departure which changed
+#returns the same values as basic_sim, if trace_path is given it must differ from the path of the existing trace
+def resimulate(network,schedule_gaps=None,schedule_offsets=None,lookahead=None,trace_path=None):
+    if len(network.checkpoints)==0:
+        print('the simulation must first be run with checkpoints before it can be resimulated')
+        return False
+    old_dispatch = network.dispatch_schedule2
+    old_gaps = network.schedule_gaps
+    if schedule_gaps is not None:
+        network.schedule_gaps = np.array(schedule_gaps)
+    if schedule_offsets is not None:
+        network.schedule_offsets = np.array(schedule_offsets)
+    network.create_dispatch_schedule()
+    first_change = first_dispatch_change(old_dispatch,network.dispatch_schedule2)
+    if lookahead is None:
+        lookahead = default_lookahead(network,old_gaps)
+    if first_change is None:
+        resume_time = network.stop_simulation_time #nothing changed, so only the end of the simulation is rerun
+    else:
+        resume_time = first_change - lookahead
+    #find the latest checkpoint at or before the resume time, the first checkpoint is always the start of the simulation
+    checkpoint_index = 0
+    for i,state in enumerate(network.checkpoints):
+        if state['time']<=resume_time:
+            checkpoint_index = i
+    state = network.checkpoints[checkpoint_index]
+    del network.checkpoints[checkpoint_index+1:] #later checkpoints used the old timetable
+    if network.verbose>=1:
+        print('first changed departure at ',first_change,' resuming from checkpoint at ',state['time'])
+    old_trace = network.trace
+    network.restore_state(state)
+    network.trace_logging_init(network.stop_simulation_time,trace_path)
+    copy_trace_prefix(old_trace,network.trace,state['trace_num_times'])
+    return network.basic_sim(resume=True)
+
+#hash of the parts of the network a checkpoint refers to by index, a checkpoint can only be loaded into a network with the same fingerprint
+#schedule gaps and offsets are not included, they are saved with the checkpoint
+def network_fingerprint(network):
+    hasher = hashlib.sha256()
+    hasher.update(json.dumps(list(network.node_names)).encode())
+    hasher.update(json.dumps([(edge.name,float(edge.travel_time)) for edge in network.edges]).encode())
+    hasher.update(json.dumps([schedule.name for schedule in network.schedules]).encode())
+    hasher.update(str(network.agent_mode).encode())
+    return hasher.hexdigest()
+
+#flatten a list of lists of integers into one array and the offsets of each list within it
+def flatten_lists(lists,dtype=np.int64):
+    offsets = np.zeros(len(lists)+1,dtype=np.int64)
+    offsets[1:] = np.cumsum([len(values) for values in lists])
+    values = np.fromiter((value for values in lists for value in values),dtype=dtype,count=offsets[-1])
+    return values,offsets
+
+#inverse of flatten_lists
+def unflatten_lists(values,offsets):
+    values = values.tolist()
+    return [values[offsets[i]:offsets[i+1]] for i in range(len(offsets)-1)]
+
+#table of the distinct paths (tuples of schedule and node names) in a checkpoint
+#agents with the same journey share one path tuple, so each is saved once and referred to by index
+class PathTable:
+    def __init__(self):
+        self.path_ids = {} #index of each path
+        self.paths = []
+        self.token_ids = {} #index of each name used in a path
+        self.tokens = []
+
+    #index of a path, adding it to the table if it is new, None is saved as -1
+    def add(self,path):
+        if path is None:
+            return -1
+        path_id = self.path_ids.get(path)
+        if path_id is None:
+            path_id = len(self.paths)
+            self.path_ids[path] = path_id
+            self.paths.append(path)
+        return path_id
+
+    #the table as arrays, the names used followed by each path as indices into those names
+    def to_arrays(self):
+        encoded_paths = []
+        for path in self.paths:
+            encoded_path = []
+            for token in path:
+                token_id = self.token_ids.get(token)
+                if token_id is None:
+                    token_id = len(self.tokens)
+                    self.token_ids[token] = token_id
+                    self.tokens.append(token)
+                encoded_path.append(token_id)
+            encoded_paths.append(encoded_path)
+        path_tokens,path_offsets = flatten_lists(encoded_paths,np.int32)
+        return {'path_names':np.array(self.tokens,dtype=str),'path_tokens':path_tokens,'path_offsets':path_offsets}
+
+#rebuild the paths saved by PathTable.to_arrays, paths are shared tuples again once loaded
+def paths_from_arrays(arrays):
+    names = arrays['path_names'].tolist()
+    encoded_paths = unflatten_lists(arrays['path_tokens'],arrays['path_offsets'])
+    return [tuple([names[token_id] for token_id in encoded_path]) for encoded_path in encoded_paths]
+
+#convert a state from Network.capture_state into numpy arrays, replacing references to nodes, edges and schedules with their indices
+#small fields are stored as json in the 'metadata' entry
+def encode_state(network,state):
+    paths = PathTable()
+    arrays = {}
+    metadata = {'version':CHECKPOINT_VERSION,'fingerprint':network_fingerprint(network)}
+    for key in ('time','passenger_time_multiplier','num_failed_agents','num_successful_agents','trace_num_times'):
+        metadata[key] = state[key]
+    arrays['num_vehicles_started_here'] = np.asarray(state['num_vehicles_started_here'])
+    arrays['vehicle_names'] = np.array(state['vehicle_names'],dtype=str)
+    arrays['dispatch_cursors'] = np.array(state['dispatch_cursors'],dtype=np.int64)
+    arrays['schedule_gaps'] = np.asarray(network.schedule_gaps)
+    arrays['schedule_offsets'] = np.asarray(network.schedule_offsets)
+    version,internal_state,gauss_next = state['random_state']
+    arrays['random_state'] = np.array(internal_state,dtype=np.uint32)
+    metadata['random_version'] = version
+    metadata['random_gauss_next'] = gauss_next
+    policy = network.recording_policy
+    metadata['recording_policy'] = [policy.vehicle_position_interval,policy.record_vehicle_passengers,policy.record_node_loads]
+    #agents still travelling, one row each
+    pool_state = state['agent_pool']
+    metadata['agent_pool'] = {'num_slots':pool_state['num_slots'],'num_active':pool_state['num_active'],'num_created':pool_state['num_created']}
+    arrays['agent_free_ids'] = np.array(pool_state['free_ids'],dtype=np.int64)
+    agent_rows = pool_state['agents']
+    agent_columns = list(zip(*agent_rows)) if len(agent_rows)>0 else [()]*8
+    arrays['agent_ids'] = np.array(agent_columns[0],dtype=np.int64)
+    arrays['agent_start_nodes'] = np.array(agent_columns[1],dtype=np.int32)
+    arrays['agent_destination_nodes'] = np.array(agent_columns[2],dtype=np.int32)
+    arrays['agent_start_times'] = np.array(agent_columns[3],dtype=np.float64)
+    arrays['agent_number_passengers'] = np.array(agent_columns[4],dtype=np.float64)
+    arrays['agent_paths'] = np.array([paths.add(path) for path in agent_columns[5]],dtype=np.int32)
+    arrays['agent_path_indices'] = np.array(agent_columns[6],dtype=np.int32)
+    arrays['agent_cohort_keys'] = np.array([paths.add(path) for path in agent_columns[7]],dtype=np.int32)
+    #vehicles, one row each
+    schedule_ids = {schedule.name:i for i,schedule in enumerate(network.schedules)}
+    edge_ids = {id(edge):i for i,edge in enumerate(network.edges)}
+    vehicle_columns = {field:[] for field in VEHICLE_FIELDS}
+    vehicle_agents = []
+    for vehicle_state in state['vehicles']:
+        schedule_id = schedule_ids[vehicle_state['schedule_name']]
+        full_schedule = network.schedules[schedule_id]
+        remaining_schedule = vehicle_state['schedule']
+        row = {'id':vehicle_state['id'],'number_passengers':vehicle_state['number_passengers'],'num_passengers':vehicle_state['num_passengers'],'max_passengers':vehicle_state['max_passengers'],
+               'state':int(vehicle_state['state']=='moving'),'state_new':vehicle_state['state_new'],'at_final_destination':vehicle_state['at_final_destination'],
+               'schedule':schedule_id,'start_time':remaining_schedule.schedule_times[0]-full_schedule.schedule_times[0],
+               'nodes_reached':len(full_schedule.nodes)-len(remaining_schedule.nodes),'edges_reached':len(full_schedule.edges)-len(remaining_schedule.edges),
+               'previous_stop':vehicle_state['previous_stop'].id,'final_destination':vehicle_state['final_destination'].id,'next_destination':-1,'next_edge':-1,'edge_length':-1,'move_timer':-1}
+        if 'next_destination' in vehicle_state: #set once the vehicle first leaves a stop
+            row['next_destination'] = vehicle_state['next_destination'].id
+            row['next_edge'] = edge_ids[id(vehicle_state['next_edge'])]
+            row['edge_length'] = vehicle_state['edge_length']
+        if 'move_timer' in vehicle_state:
+            row['move_timer'] = vehicle_state['move_timer']
+        for field in VEHICLE_FIELDS:
+            vehicle_columns[field].append(row[field])
+        vehicle_agents.append(vehicle_state['agents'])
+    for field in VEHICLE_FIELDS:
+        arrays['vehicle_'+field] = np.array(vehicle_columns[field],dtype=np.float64)
+    arrays['vehicle_agents'],arrays['vehicle_agent_offsets'] = flatten_lists(vehicle_agents)
+    #nodes, one row each, nodes with a pathfinding cache in use also have a row in the cache arrays
+    node_states = state['nodes']
+    arrays['node_agents'],arrays['node_agent_offsets'] = flatten_lists([node_state['agents'] for node_state in node_states])
+    arrays['node_schedule_cursors'],arrays['node_schedule_cursor_offsets'] = flatten_lists([node_state['schedule_cursors'] for node_state in node_states])
+    arrays['node_num_agents'] = np.array([node_state['num_agents'] for node_state in node_states],dtype=np.float64)
+    arrays['node_next_vehicle_changed'] = np.array([node_state['next_vehicle_changed'] for node_state in node_states],dtype=bool)
+    cached_nodes = [i for i,node_state in enumerate(node_states) if 'pathfinding' in node_state]
+    num_nodes = len(node_states)
+    arrays['cached_nodes'] = np.array(cached_nodes,dtype=np.int64)
+    for i,name in enumerate(('cache_distance_to_nodes','cache_evaluated_nodes','cache_evaluated_nodes_tf')):
+        arrays[name] = np.array([node_states[node]['pathfinding'][i] for node in cached_nodes],dtype=np.float64).reshape(len(cached_nodes),num_nodes)
+    arrays['cache_path_to_nodes'] = np.array([[paths.add(path) for path in node_states[node]['pathfinding'][3]] for node in cached_nodes],dtype=np.int32).reshape(len(cached_nodes),num_nodes)
+    arrays.update(paths.to_arrays())
+    if 'evaluator' in state:
+        metadata['evaluator'] = {key:(value.item() if isinstance(value,np.generic) else value) for key,value in state['evaluator'].items()}
+    arrays['metadata'] = np.array(json.dumps(metadata))
+    return arrays
+
+#convert arrays saved by encode_state back into a state which Network.restore_state accepts
+def decode_state(network,arrays,metadata):
+    paths = paths_from_arrays(arrays)
+    state = {}
+    for key in ('time','passenger_time_multiplier','num_failed_agents','num_successful_agents','trace_num_times'):
+        state[key] = metadata[key]
+    state['num_vehicles_started_here'] = arrays['num_vehicles_started_here']
+    state['vehicle_names'] = arrays['vehicle_names'].tolist()
+    state['dispatch_cursors'] = arrays['dispatch_cursors'].tolist()
+    state['random_state'] = (metadata['random_version'],tuple(arrays['random_state'].tolist()),metadata['random_gauss_next'])
+    agent_rows = []
+    for row in zip(arrays['agent_ids'].tolist(),arrays['agent_start_nodes'].tolist(),arrays['agent_destination_nodes'].tolist(),arrays['agent_start_times'].tolist(),
+                   arrays['agent_number_passengers'].tolist(),arrays['agent_paths'].tolist(),arrays['agent_path_indices'].tolist(),arrays['agent_cohort_keys'].tolist()):
+        id,start_node,destination_node,start_time,number_passengers,path_id,path_index,cohort_id = row
+        cohort_key = paths[cohort_id] if cohort_id>=0 else None
+        agent_rows.append((id,start_node,destination_node,start_time,number_passengers,paths[path_id],path_index,cohort_key))
+    state['agent_pool'] = dict(metadata['agent_pool'])
+    state['agent_pool']['free_ids'] = arrays['agent_free_ids'].tolist()
+    state['agent_pool']['agents'] = agent_rows
+    #rebuild vehicles, their remaining schedule is the end of their schedule offset by the time they started
+    vehicle_columns = {field:arrays['vehicle_'+field].tolist() for field in VEHICLE_FIELDS}
+    vehicle_agents = unflatten_lists(arrays['vehicle_agents'],arrays['vehicle_agent_offsets'])
+    state['vehicles'] = []
+    for i in range(len(vehicle_agents)):
+        row = {field:vehicle_columns[field][i] for field in VEHICLE_FIELDS}
+        full_schedule = network.schedules[int(row['schedule'])]
+        remaining_schedule = copy.copy(full_schedule)
+        remaining_schedule.offset_schedule_times(row['start_time'])
+        del remaining_schedule.nodes[:int(row['nodes_reached'])]
+        del remaining_schedule.edges[:int(row['edges_reached'])]
+        vehicle_id = int(row['id'])
+        vehicle_state = {'schedule':remaining_schedule,'schedule_name':full_schedule.name,'name':state['vehicle_names'][vehicle_id],'id':vehicle_id,
+                         'state':'moving' if row['state']==1 else 'at_stop','state_new':bool(row['state_new']),'at_final_destination':bool(row['at_final_destination']),
+                         'number_passengers':row['number_passengers'],'num_passengers':row['num_passengers'],'max_passengers':row['max_passengers'],
+                         'previous_stop':network.nodes[int(row['previous_stop'])],'final_destination':network.nodes[int(row['final_destination'])],'agents':vehicle_agents[i]}
+        if row['next_destination']>=0:
+            vehicle_state['next_destination'] = network.nodes[int(row['next_destination'])]
+            vehicle_state['next_edge'] = network.edges[int(row['next_edge'])]
+            vehicle_state['edge_length'] = row['edge_length']
+        if row['move_timer']>=0:
+            vehicle_state['move_timer'] = int(row['move_timer'])
+        state['vehicles'].append(vehicle_state)
+    #rebuild nodes
+    node_agents = unflatten_lists(arrays['node_agents'],arrays['node_agent_offsets'])
+    node_cursors = unflatten_lists(arrays['node_schedule_cursors'],arrays['node_schedule_cursor_offsets'])
+    num_agents = arrays['node_num_agents'].tolist()
+    next_vehicle_changed = arrays['node_next_vehicle_changed'].tolist()
+    state['nodes'] = []
+    for i in range(len(node_agents)):
+        state['nodes'].append({'agents':node_agents[i],'num_agents':num_agents[i],'schedule_cursors':node_cursors[i],'next_vehicle_changed':next_vehicle_changed[i]})
+    for row,node in enumerate(arrays['cached_nodes'].tolist()):
+        path_to_nodes = [paths[path_id] for path_id in arrays['cache_path_to_nodes'][row].tolist()]
+        state['nodes'][node]['pathfinding'] = (arrays['cache_distance_to_nodes'][row],arrays['cache_evaluated_nodes'][row],arrays['cache_evaluated_nodes_tf'][row],path_to_nodes)
+    if 'evaluator' in metadata:
+        state['evaluator'] = metadata['evaluator']
+    return state
+
+#append the rows of an in memory trace recorded since the last checkpoint saved to path, to raw binary files in a directory beside it
+#so each checkpoint only writes the timesteps recorded since the previous one, rather than the whole trace again
+#a new directory is started for the first checkpoint of a trace (see network.trace_logging_init), or if the trace has been rewound behind the rows saved
+#files are only ever appended to, so the checkpoint already at path can still be loaded until it is replaced
+#returns the directory
+def append_checkpoint_trace(network,path,num_times):
+    trace = network.trace
+    directory,saved_times = network.checkpoint_trace_rows.get(path,(None,0))
+    first_offset = 1 #the offset where the saved rows end is already written
+    if directory is None or saved_times>num_times:
+        directory = path + '.trace_' + str(time.time_ns())
+        os.makedirs(directory)
+        saved_times = 0
+        first_offset = 0
+    first_record = trace.vehicle_offsets[saved_times]
+    last_record = trace.vehicle_offsets[num_times]
+    columns = [('times',trace.times[saved_times:num_times]),('node_loads',trace.node_loads[saved_times:num_times]),
+               ('vehicle_offsets',trace.vehicle_offsets[saved_times+first_offset:num_times+1])]
+    for column_name,column_type in trace_store.VEHICLE_COLUMNS:
+        columns.append((column_name,getattr(trace,column_name)[first_record:last_record]))
+    for column_name,values in columns:
+        with open(os.path.join(directory,column_name+'.bin'),'ab') as file:
+            values.tofile(file)
+    network.checkpoint_trace_rows[path] = (directory,num_times)
+    return directory
+
+#save a state of the simulation (by default its current state) to a compressed binary file, with the trace recorded up to that state
+#an in memory trace is saved to a directory beside the file, which each later checkpoint to the same file appends to, see append_checkpoint_trace
+#a trace streamed to disk (trace_store.MemmapTraceWriter) is not copied, the checkpoint refers to its files and how many timesteps of them it uses
+#so the checkpoint can only be loaded while those files are not overwritten, eg by another simulation with the same trace_path
+#the file is written to a temporary name then moved into place, so an interruption while saving never leaves a broken checkpoint
+def save_checkpoint(network,path,state=None):
+    if state is None:
+        state = network.capture_state()
+    arrays = encode_state(network,state)
+    num_times = state['trace_num_times']
+    metadata = json.loads(str(arrays['metadata']))
+    metadata['trace_num_vehicle_records'] = int(network.trace.vehicle_offsets[num_times])
+    directory = None
+    if isinstance(network.trace,trace_store.MemmapTraceWriter):
+        network.trace.flush()
+        metadata['trace_path'] = os.path.abspath(network.trace.trace_path)
+    else:
+        directory = append_checkpoint_trace(network,path,num_times)
+        metadata['trace_directory'] = os.path.basename(directory)
+    arrays['metadata'] = np.array(json.dumps(metadata))
+    temporary_path = path + '.tmp'
+    with open(temporary_path,'wb') as checkpoint_file:
+        np.savez_compressed(checkpoint_file,**arrays)
+    os.replace(temporary_path,path)
+    for old_directory in glob.glob(glob.escape(path) + '.trace_*'): #directories no longer used by the checkpoint at path
+        if old_directory!=directory:
+            shutil.rmtree(old_directory)
+
+#the trace recorded up to a checkpoint saved to path, as (times,node_loads,offsets,ids,latitudes,longitudes,passengers) arrays
+#a trace streamed to disk is read back from its files through memory maps, so only the timesteps copied from it are read
+def read_checkpoint_trace(path,metadata,num_nodes):
+    num_times = metadata['trace_num_times']
+    num_vehicle_records = metadata['trace_num_vehicle_records']
+    if 'trace_path' not in metadata:
+        directory = os.path.join(os.path.dirname(path),metadata['trace_directory'])
+        times = np.fromfile(os.path.join(directory,'times.bin'),dtype=np.int32,count=num_times)
+        node_loads = np.fromfile(os.path.join(directory,'node_loads.bin'),dtype=np.float32).reshape(-1,num_nodes)[:num_times] #empty if node loads were not recorded
+        offsets = np.fromfile(os.path.join(directory,'vehicle_offsets.bin'),dtype=np.int64,count=num_times+1)
+        columns = [np.fromfile(os.path.join(directory,column_name+'.bin'),dtype=column_type,count=num_vehicle_records) for column_name,column_type in trace_store.VEHICLE_COLUMNS]
+        return (times,node_loads,offsets) + tuple(columns)
+    trace_path = metadata['trace_path']
+    times = np.load(os.path.join(trace_path,'times.npy'),mmap_mode='r')[:num_times]
+    node_loads = np.load(os.path.join(trace_path,'node_loads.npy'),mmap_mode='r')[:num_times]
+    offsets = np.load(os.path.join(trace_path,'vehicle_offsets.npy'),mmap_mode='r')[:num_times+1]
+    columns = []
+    for column_name,column_type in trace_store.VEHICLE_COLUMNS:
+        if num_vehicle_records>0:
+            columns.append(np.memmap(os.path.join(trace_path,column_name+'.bin'),dtype=column_type,mode='r',shape=(num_vehicle_records,)))
+        else:
+            columns.append(np.zeros(0,dtype=column_type)) #an empty file cannot be memory mapped
+    return (times,node_loads,offsets) + tuple(columns)
+
+#load a checkpoint saved by save_checkpoint into a network created from the same csv files
+#the saved schedule gaps and offsets are applied, then the simulation can be carried on with network.basic_sim(resume=True)
+#schedule_gaps and schedule_offsets replace the saved ones, to branch a what-if run from the checkpoint
+#the trace recorded before the checkpoint is copied into a new trace, streamed to trace_path if given
+#if the checkpoint refers to a trace streamed to disk and trace_path is that same directory, the trace is carried on in place rather than copied
+def load_checkpoint(network,path,trace_path=None,schedule_gaps=None,schedule_offsets=None):
+    with np.load(path) as checkpoint_file:
+        arrays = {name:checkpoint_file[name] for name in checkpoint_file.files}
+    metadata = json.loads(str(arrays['metadata']))
+    if metadata['version']!=CHECKPOINT_VERSION:
+        print('checkpoint ',path,' has format version ',metadata['version'],' but only version ',CHECKPOINT_VERSION,' can be loaded')
+        return False
+    if metadata['fingerprint']!=network_fingerprint(network):
+        print('checkpoint ',path,' was saved from a different network and cannot be loaded')
+        return False
+    network.schedule_gaps = arrays['schedule_gaps'] if schedule_gaps is None else np.array(schedule_gaps)
+    network.schedule_offsets = arrays['schedule_offsets'] if schedule_offsets is None else np.array(schedule_offsets)
+    network.create_dispatch_schedule()
+    state = decode_state(network,arrays,metadata)
+    network.recording_policy = trace_store.RecordingPolicy(*metadata['recording_policy'])
+    network.restore_state(state)
+    if 'trace_path' in metadata and trace_path is not None and os.path.abspath(trace_path)==metadata['trace_path']:
+        network.trace = trace_store.MemmapTraceWriter(trace_path,network.stop_simulation_time,len(network.nodes),network.vehicle_names,
+                                                      resume_from=(metadata['trace_num_times'],metadata['trace_num_vehicle_records']))
+    else:
+        network.trace_logging_init(network.stop_simulation_time,trace_path)
+        record_trace_arrays(network.trace,*read_checkpoint_trace(path,metadata,len(network.nodes)))
+    network.checkpoints = [state] #later changes can be resimulated from the loaded checkpoint
+    if network.verbose>=1:
+        print('loaded checkpoint ',path,' at time ',state['time'])
+    return True
+
+
+#check that a checkpointed simulation can be resumed from its last checkpoint with the same results and trace as an uninterrupted run
+#a trace streamed to disk is resumed three ways, carrying on the same trace files, copying the trace into new files and copying it into memory
+#an in memory trace, saved a few timesteps at a time with each checkpoint, is resumed into memory
+def check_resumed_checkpoints(directory,minutes=60,checkpoint_interval=10,pause_time=35):
+    import random as rand
+    import contextlib as contextlib
+    import network as n
+    import benchmark as benchmark
+    csvs = benchmark.grid_network(16,headway=5)
+    network_kwargs = {'parameters_csv':benchmark.default_parameters_csv(),'eval_csv':benchmark.default_eval_csv(),'scenario_csv':benchmark.flat_scenario_csv(minutes),'schedule_type':'simple'}
+    network_kwargs.update(csvs)
+    def run(trace_path,checkpoint_path=None,resume_trace_path=None):
+        with open(os.devnull,'w') as devnull, contextlib.redirect_stdout(devnull):
+            rand.seed(30699)
+            network = n.Network(verbose=0,**network_kwargs)
+            if checkpoint_path is None:
+                return network.basic_sim(trace_path=trace_path)
+            network.basic_sim(trace_path=trace_path,checkpoint_interval=checkpoint_interval,checkpoint_path=checkpoint_path,end_time=pause_time)
+            rand.seed(0) #the resumed run must not depend on the random state it is resumed with
+            resumed_network = n.Network(verbose=0,**network_kwargs)
+            if load_checkpoint(resumed_network,checkpoint_path,trace_path=resume_trace_path)==False:
+                raise ValueError('checkpoint ' + checkpoint_path + ' could not be loaded')
+            return resumed_network.basic_sim(resume=True)
+    expected_trace,expected_failed,expected_successful,final_time = run(os.path.join(directory,'uninterrupted'))
+    streamed_path = os.path.join(directory,'streamed')
+    checkpoint_path = os.path.join(directory,'checkpoint.npz')
+    for trace_path,resume_trace_path in ((streamed_path,streamed_path),(streamed_path,os.path.join(directory,'copied')),(streamed_path,None),(None,None)):
+        trace,failed,successful,final_time = run(trace_path,checkpoint_path,resume_trace_path)
+        if (failed,successful)!=(expected_failed,expected_successful):
+            raise ValueError('resumed from ' + str(trace_path) + ' to ' + str(resume_trace_path) + ' with ' + str((failed,successful)) + ' failed and successful agents rather than ' + str((expected_failed,expected_successful)))
+        if trace.num_times!=expected_trace.num_times or not np.array_equal(trace.times,expected_trace.times) or not np.array_equal(trace.node_loads,expected_trace.node_loads) \
+           or not np.array_equal(trace.vehicle_offsets,expected_trace.vehicle_offsets) or not np.array_equal(trace.vehicle_passengers,expected_trace.vehicle_passengers):
+            raise ValueError('resumed from ' + str(trace_path) + ' to ' + str(resume_trace_path) + ' with a different trace to the uninterrupted run')
+    if len(glob.glob(glob.escape(checkpoint_path) + '.trace_*'))!=1:
+        raise ValueError('the trace directories of old checkpoints were not removed')
+    print('checkpoints resume to the same results as an uninterrupted run')
+
+if __name__ == '__main__':
+    import tempfile as tempfile
+    with tempfile.TemporaryDirectory() as directory:
+        check_resumed_checkpoints(directory)
@@ -1,3 +1,5 @@
+import numpy as np #for vectorised evaluation
+
 class Evaluator:
     #initalise the evaluators with the standard costs of a system
     def __init__(self,eval_csv,parameters_csv):
@@ -23,20 +25,24 @@ class Evaluator:
             node_passengers = sim_node_passengers[i]
             new_seated_time,new_standing_time,num_vehicles,max_passengers =  self.passenger_time_vehicles(vehicle_passengers)
             new_waiting_time =  self.passenger_time_nodes(node_passengers)
-            seated_passenger_time = seated_passenger_time + new_seated_time
-            standing_passenger_time = standing_passenger_time + new_standing_time
-            waiting_passenger_time = waiting_passenger_time + new_waiting_time
+            #logged counts may be float32, accumulate as python floats to avoid losing precision over a long simulation
+            seated_passenger_time = seated_passenger_time + float(new_seated_time)
+            standing_passenger_time = standing_passenger_time + float(new_standing_time)
+            waiting_passenger_time = waiting_passenger_time + float(new_waiting_time)
             vehicle_time = vehicle_time + num_vehicles
             if num_vehicles>max_num_vehicles_at_once:
                 max_num_vehicles_at_once = num_vehicles
             if max_passengers>max_passengers_in_a_vehicle:
                 max_passengers_in_a_vehicle = max_passengers
+        return self.build_report(seated_passenger_time,standing_passenger_time,waiting_passenger_time,vehicle_time,max_num_vehicles_at_once,max_passengers_in_a_vehicle,num_failed_passengers,num_successful_passengers)
+
+    #combined financial and time cost from accumulated passenger and vehicle minutes
+    def calculate_total_cost(self,seated_passenger_time,standing_passenger_time,waiting_passenger_time,vehicle_time,num_failed_passengers):
         #convert resource use time from minutes into hours
         seated_passenger_time = seated_passenger_time/self.timesteps_per_hour #amount of minutes passengers spend seated
         waiting_passenger_time = waiting_passenger_time/self.timesteps_per_hour #amount they spend waiting
         standing_passenger_time = waiting_passenger_time/self.timesteps_per_hour #amount they standing
         vehicle_time = vehicle_time/self.timesteps_per_hour #amount of minutes vehicles are used for
-        total_passenger_time = seated_passenger_time + waiting_passenger_time + standing_passenger_time
         cost_seated_passenger_time = standing_passenger_time*self.agent_cost_seated
         cost_standing_passenger_time = standing_passenger_time*self.agent_cost_standing
         cost_waiting_passenger_time = waiting_passenger_time*self.agent_cost_waiting
@@ -44,6 +50,18 @@ class Evaluator:
         cost_passenger_failure = num_failed_passengers*self.unfinished_penalty
         cost_vehicle_time = vehicle_time*self.vehicle_cost
         total_cost = cost_passenger_time + cost_vehicle_time + cost_passenger_failure
+        return total_cost
+
+    #build the evaluation printout from accumulated passenger and vehicle minutes
+    def build_report(self,seated_passenger_time,standing_passenger_time,waiting_passenger_time,vehicle_time,max_num_vehicles_at_once,max_passengers_in_a_vehicle,num_failed_passengers,num_successful_passengers):
+        total_cost = self.calculate_total_cost(seated_passenger_time,standing_passenger_time,waiting_passenger_time,vehicle_time,num_failed_passengers)
+        #convert resource use time from minutes into hours
+        seated_passenger_time = seated_passenger_time/self.timesteps_per_hour #amount of minutes passengers spend seated
+        waiting_passenger_time = waiting_passenger_time/self.timesteps_per_hour #amount they spend waiting
+        standing_passenger_time = waiting_passenger_time/self.timesteps_per_hour #amount they standing
+        vehicle_time = vehicle_time/self.timesteps_per_hour #amount of minutes vehicles are used for
+        total_passenger_time = seated_passenger_time + waiting_passenger_time + standing_passenger_time
+        cost_vehicle_time = vehicle_time*self.vehicle_cost
         #calculate some per capita stats
         num_passengers = num_failed_passengers+num_successful_passengers
         time_per_passenger = (total_passenger_time/num_passengers) #time in hours for each passenger
@@ -68,6 +86,45 @@ class Evaluator:
         message = message + "Total Cost per Passenger = $" + f'{total_cost_per_passenger:.2f}' + "\n"
         return message
 
+    #evaluate the timesteps from start to end (not including end) of a trace, by default the whole trace
+    def evaluate_trace(self,trace,num_failed_passengers,num_successful_passengers,start=0,end=None):
+        if end is None:
+            end = trace.num_times
+        return self.evaluate_arrays(trace.vehicle_passenger_matrix(start,end),trace.node_loads[start:end],num_failed_passengers,num_successful_passengers)
+
+    #vectorised equivalent of the accumulation in evaluate
+    #vehicle_passengers is (time x vehicle) with nan where there is no vehicle, node_loads is (time x node)
+    #a stack of traces can be passed as (run x time x vehicle) and (run x time x node), in which case each result is an array with one value per run
+    def accumulate_arrays(self,vehicle_passengers,node_loads):
+        vehicle_present = np.isfinite(vehicle_passengers)
+        passengers = np.where(vehicle_present,vehicle_passengers,0).astype(np.float64)
+        seated_passenger_time = np.minimum(passengers,self.vehicle_max_seated).sum(axis=(-2,-1))
+        standing_passenger_time = np.maximum(passengers-self.vehicle_max_seated,0).sum(axis=(-2,-1))
+        waiting_passenger_time = np.sum(node_loads,axis=(-2,-1),dtype=np.float64)
+        num_vehicles = vehicle_present.sum(axis=-1) #number of vehicles at each timestep
+        vehicle_time = num_vehicles.sum(axis=-1)
+        max_num_vehicles_at_once = np.max(num_vehicles,axis=-1,initial=0)
+        max_passengers_in_a_vehicle = np.max(passengers,axis=(-2,-1),initial=0)
+        return seated_passenger_time,standing_passenger_time,waiting_passenger_time,vehicle_time,max_num_vehicles_at_once,max_passengers_in_a_vehicle
+
+    #evaluate (time x vehicle) and (time x node) arrays, returning the same printout as evaluate
+    #for a stack of runs, num_failed_passengers and num_successful_passengers have one value per run and a list of printouts is returned
+    def evaluate_arrays(self,vehicle_passengers,node_loads,num_failed_passengers,num_successful_passengers):
+        totals = self.accumulate_arrays(vehicle_passengers,node_loads)
+        if np.ndim(vehicle_passengers)==2:
+            totals = [float(total) for total in totals]
+            return self.build_report(*totals,num_failed_passengers,num_successful_passengers)
+        messages = []
+        for run in range(len(vehicle_passengers)):
+            run_totals = [float(total[run]) for total in totals]
+            messages.append(self.build_report(*run_totals,num_failed_passengers[run],num_successful_passengers[run]))
+        return messages
+
+    #total cost of each run in a stack of (run x time x vehicle) and (run x time x node) arrays, as an array with one cost per run
+    def batch_total_cost(self,vehicle_passengers,node_loads,num_failed_passengers):
+        seated_passenger_time,standing_passenger_time,waiting_passenger_time,vehicle_time,junk1,junk2 = self.accumulate_arrays(vehicle_passengers,node_loads)
+        return self.calculate_total_cost(seated_passenger_time,standing_passenger_time,waiting_passenger_time,vehicle_time,np.asarray(num_failed_passengers))
+
     #get how many minutes passengers were sitting/standing in vehicles at this timestep
     def passenger_time_vehicles(self,vehicle_passengers):
         seated = 0
@@ -94,3 +151,60 @@ class Evaluator:
             waiting = waiting + num_passengers
 
         return waiting
+
+
+#evaluator which is fed the state of the network once per timestep while the simulation runs
+#only running totals are kept, so the simulation does not need to store a trace to be evaluated
+class OnlineEvaluator(Evaluator):
+    def __init__(self,eval_csv,parameters_csv):
+        super().__init__(eval_csv,parameters_csv)
+        self.reset()
+
+    #clear the running totals, ready for a new simulation
+    def reset(self):
+        self.num_timesteps = 0 #number of timesteps observed
+        self.seated_passenger_time = 0 #amount of minutes passengers spend seated
+        self.waiting_passenger_time = 0 #amount they spend waiting
+        self.standing_passenger_time = 0 #amount they standing
+        self.vehicle_time = 0 #amount of minutes vehicles are used for
+        self.max_num_vehicles_at_once = 0
+        self.max_passengers_in_a_vehicle = 0
+        self.num_failed_passengers = 0
+        self.num_successful_passengers = 0
+
+    #save the running totals, so the simulation can be resumed from a checkpoint
+    def capture_state(self):
+        return dict(self.__dict__)
+
+    def restore_state(self,state):
+        self.__dict__.update(state)
+
+    #add the passenger counts of all vehicles and nodes at one timestep to the running totals
+    def add_timestep(self,vehicle_passengers,node_passengers):
+        new_seated_time,new_standing_time,num_vehicles,max_passengers = self.passenger_time_vehicles(vehicle_passengers)
+        new_waiting_time = self.passenger_time_nodes(node_passengers)
+        self.seated_passenger_time = self.seated_passenger_time + float(new_seated_time)
+        self.standing_passenger_time = self.standing_passenger_time + float(new_standing_time)
+        self.waiting_passenger_time = self.waiting_passenger_time + float(new_waiting_time)
+        self.vehicle_time = self.vehicle_time + num_vehicles
+        if num_vehicles>self.max_num_vehicles_at_once:
+            self.max_num_vehicles_at_once = num_vehicles
+        if max_passengers>self.max_passengers_in_a_vehicle:
+            self.max_passengers_in_a_vehicle = max_passengers
+        self.num_timesteps = self.num_timesteps + 1
+
+    #observe the current state of the network, called by the network once per timestep
+    def observe(self,network):
+        vehicle_passengers = [vehicle.count_agents() for vehicle in network.vehicles]
+        node_passengers = [node.count_agents() for node in network.nodes]
+        self.add_timestep(vehicle_passengers,node_passengers)
+        self.num_failed_passengers = network.num_failed_agents
+        self.num_successful_passengers = network.num_successful_agents
+
+    #cost accumulated so far, this only increases as the simulation runs, so can be used to abandon runs that are already worse than the best found
+    def partial_cost(self):
+        return self.calculate_total_cost(self.seated_passenger_time,self.standing_passenger_time,self.waiting_passenger_time,self.vehicle_time,self.num_failed_passengers)
+
+    #the same printout as Evaluator.evaluate, for the timesteps observed so far
+    def report(self):
+        return self.build_report(self.seated_passenger_time,self.standing_passenger_time,self.waiting_passenger_time,self.vehicle_time,self.max_num_vehicles_at_once,self.max_passengers_in_a_vehicle,self.num_failed_passengers,self.num_successful_passengers)
@@ -0,0 +1,144 @@
+#event_log.py
+#structured log of simulation events, replacing prints in the simulation loop
+#callers check the level (network.verbose) before building an event, so nothing is formatted or written for events which are switched off
+
+import sys as sys
+import struct as struct #for the binary event format
+
+#levels of events, an event is logged if its level is at most the level of the log (the network verbosity)
+SUMMARY = 0 #results of a run, always logged
+VERBOSE = 1 #per timestep and per vehicle events
+DEBUG = 2 #the full state of vehicles every timestep
+
+BINARY_HEADER = b'EVLOG1\n'
+#binary records start with a one byte kind, strings (event names, field names and string values) are sent once as a definition and then referred to by id
+RECORD_STRING = 0
+RECORD_EVENT = 1
+STRING_STRUCT = struct.Struct('<BII') #kind, string id, length in bytes of the utf-8 string which follows
+EVENT_STRUCT = struct.Struct('<BBiIH') #kind, level, simulation time (-1 if none), event name id, number of fields which follow
+FIELD_STRUCT = struct.Struct('<IB') #field name id, type of the value which follows
+FIELD_INT = 0
+FIELD_FLOAT = 1
+FIELD_STRING = 2
+VALUE_STRUCTS = {FIELD_INT:struct.Struct('<q'),FIELD_FLOAT:struct.Struct('<d'),FIELD_STRING:struct.Struct('<I')}
+
+#log of events, written as text lines to a stream and/or in a compact binary format to a file
+#text goes to whatever sys.stdout is at the time (so redirecting stdout also redirects the log) unless text_stream is given
+class EventLog:
+    def __init__(self,level=SUMMARY,write_text=True,text_stream=None,binary_path=None):
+        self.level = level #events above this level are not logged
+        self.write_text = write_text #False to only write the binary file
+        self.text_stream = text_stream
+        self.binary_file = None
+        self.string_ids = {} #id of each string sent to the binary file
+        if binary_path is not None:
+            self.open_binary(binary_path)
+
+    #is an event of this level logged, check this before building an event in a hot loop
+    def enabled(self,level):
+        return level<=self.level
+
+    #start writing events to a binary file as well, see read_binary_events
+    def open_binary(self,path):
+        self.close_binary()
+        self.binary_file = open(path,'wb')
+        self.binary_file.write(BINARY_HEADER)
+        self.string_ids = {}
+
+    #finish writing the binary file
+    def close_binary(self):
+        if self.binary_file is not None:
+            self.binary_file.close()
+            self.binary_file = None
+
+    def flush(self):
+        if self.write_text:
+            self.get_text_stream().flush()
+        if self.binary_file is not None:
+            self.binary_file.flush()
+
+    #log an event, name describes what happened and fields hold the details, time is the simulation time (None if not during a timestep)
+    def event(self,level,name,time=None,**fields):
+        if level>self.level:
+            return
+        if self.write_text:
+            self.write_text_line(name,time,fields)
+        if self.binary_file is not None:
+            self.write_binary(level,name,time,fields)
+
+    #one line per event, eg "t=12 vehicle_created vehicle=12 Berowra-Central node=Berowra"
+    def write_text_line(self,name,time,fields):
+        parts = [name]
+        if time is not None:
+            parts.insert(0,'t=' + str(time))
+        for field_name,value in fields.items():
+            parts.append(field_name + '=' + str(value))
+        self.get_text_stream().write(' '.join(parts) + '\n')
+
+    def get_text_stream(self):
+        if self.text_stream is None:
+            return sys.stdout
+        return self.text_stream
+
+    #id of a string in the binary file, defining it first if it has not been sent yet
+    def binary_string_id(self,string):
+        string_id = self.string_ids.get(string)
+        if string_id is None:
+            string_id = len(self.string_ids)
+            self.string_ids[string] = string_id
+            encoded = string.encode('utf-8')
+            self.binary_file.write(STRING_STRUCT.pack(RECORD_STRING,string_id,len(encoded)))
+            self.binary_file.write(encoded)
+        return string_id
+
+    def write_binary(self,level,name,time,fields):
+        encoded_fields = []
+        for field_name,value in fields.items():
+            if isinstance(value,(bool,int)) or (hasattr(value,'dtype') and value.dtype.kind in 'iub'):
+                field_type = FIELD_INT
+                value = int(value)
+            elif isinstance(value,float) or (hasattr(value,'dtype') and value.dtype.kind=='f'):
+                field_type = FIELD_FLOAT
+                value = float(value)
+            else:
+                field_type = FIELD_STRING
+                value = self.binary_string_id(str(value))
+            encoded_fields.append(FIELD_STRUCT.pack(self.binary_string_id(field_name),field_type) + VALUE_STRUCTS[field_type].pack(value))
+        name_id = self.binary_string_id(name)
+        if time is None:
+            time = -1
+        self.binary_file.write(EVENT_STRUCT.pack(RECORD_EVENT,level,int(time),name_id,len(encoded_fields)))
+        self.binary_file.write(b''.join(encoded_fields))
+
+#read the events from a binary file written by EventLog, as a list of (level,name,time,fields) with time None for events outside a timestep
+def read_binary_events(path):
+    with open(path,'rb') as binary_file:
+        data = binary_file.read()
+    if data[:len(BINARY_HEADER)]!=BINARY_HEADER:
+        print(path,' is not a binary event log')
+        return False
+    strings = {}
+    events = []
+    position = len(BINARY_HEADER)
+    while position<len(data):
+        kind = data[position]
+        if kind==RECORD_STRING:
+            kind,string_id,length = STRING_STRUCT.unpack_from(data,position)
+            position = position + STRING_STRUCT.size
+            strings[string_id] = data[position:position+length].decode('utf-8')
+            position = position + length
+        else:
+            kind,level,time,name_id,num_fields = EVENT_STRUCT.unpack_from(data,position)
+            position = position + EVENT_STRUCT.size
+            fields = {}
+            for i in range(num_fields):
+                field_name_id,field_type = FIELD_STRUCT.unpack_from(data,position)
+                position = position + FIELD_STRUCT.size
+                value_struct = VALUE_STRUCTS[field_type]
+                value = value_struct.unpack_from(data,position)[0]
+                position = position + value_struct.size
+                if field_type==FIELD_STRING:
+                    value = strings[value]
+                fields[strings[field_name_id]] = value
+            events.append((level,strings[name_id],time if time>=0 else None,fields))
+    return events
@@ -0,0 +1,197 @@
+#export.py
+#render a recorded simulation trace to png images, or a video if ffmpeg is installed, without a tk window
+#frames are drawn into numpy rgb arrays with the appearance of the tk display (see style.py), in parallel worker processes
+#eg renderer = export.FrameRenderer(nodes_csv,edges_csv,trace); export.export_video(renderer,'simulation.mp4',fps=10)
+
+import numpy as np #for large scale mathematical operations
+import multiprocessing as mp #for rendering frames in parallel
+import os as os
+import zlib as zlib #for compressing png images
+import struct as struct #for the png chunk format
+import shutil as shutil #for finding ffmpeg
+import subprocess as subprocess #for running ffmpeg
+import loader as loader #for parsing node locations
+import style as style #for the appearance of nodes, edges and vehicles
+import spatial_index as spatial_index #for sampling points along edges
+import trace_store as trace_store #for reopening memory mapped traces in worker processes
+import copy as copy
+
+#draws frames of a simulation trace as (height x width x 3) uint8 rgb arrays
+#the network is laid out as the tk display lays it out on a canvas of the same size
+#vehicle_colour_type is 'crowding' or 'constant', as in the display
+#node_colour_type is 'constant' or 'node_passengers' (colour by passengers waiting, as a fraction of total_passengers as in the display)
+class FrameRenderer:
+    def __init__(self,nodes_csv,edges_csv,trace,width=1280,height=720,vehicle_colour_type='crowding',node_colour_type='constant',total_passengers=None):
+        self.trace = trace
+        self.width = width
+        self.height = height
+        self.vehicle_colour_type = vehicle_colour_type
+        self.node_colour_type = node_colour_type
+        self.total_passengers = total_passengers
+        if node_colour_type=='node_passengers' and total_passengers is None:
+            raise ValueError('node_colour_type node_passengers needs total_passengers, eg np.sum(network.origin_destination_trips)')
+        #lay out the nodes as Display.extract_nodes_graph does
+        latitudes,longitudes = loader.parse_coordinates(nodes_csv["Location"])
+        self.central_latitude = (np.min(latitudes)+np.max(latitudes))/2
+        self.central_longitude = (np.min(longitudes)+np.max(longitudes))/2
+        pixels_per_degree_vertical = (height-(style.MAX_NODE_RADIUS*4))/(np.max(latitudes)-np.min(latitudes))
+        pixels_per_degree_horizontal = (width-(style.MAX_NODE_RADIUS*4))/(np.max(longitudes)-np.min(longitudes))
+        self.pixels_per_degree = min(pixels_per_degree_vertical,pixels_per_degree_horizontal) #the lower value is the limiting factor for an undistorted map
+        self.nodes_x,self.nodes_y = self.convert_lat_long_to_x_y(latitudes,longitudes)
+        node_indices = {name:i for i,name in reversed(list(enumerate(nodes_csv["Name"].to_list())))}
+        start_indices = np.array([node_indices[name] for name in edges_csv["Start"]],dtype=np.int64)
+        end_indices = np.array([node_indices[name] for name in edges_csv["End"]],dtype=np.int64)
+        #the network doesn't change between frames, so edges are drawn once and copied into every frame
+        self.background = np.empty((height,width,3),dtype=np.uint8)
+        self.background[:,:] = style.colour_to_rgb(style.BACKGROUND_COLOUR)
+        draw_lines(self.background,self.nodes_x[start_indices],self.nodes_y[start_indices],self.nodes_x[end_indices],self.nodes_y[end_indices],
+                   style.DEFAULT_EDGE_WIDTH,style.colour_to_rgb(style.DEFAULT_EDGE_COLOUR))
+
+    #convert latitudes and longitudes to pixel coordinates, as Display.convert_lat_long_to_x_y does
+    def convert_lat_long_to_x_y(self,latitude,longitude):
+        y = self.height/2-((latitude-self.central_latitude)*self.pixels_per_degree) #flipped, as higher values are further down (south) in the image
+        x = self.width/2+((longitude-self.central_longitude)*self.pixels_per_degree)
+        return x,y
+
+    def num_frames(self):
+        return len(self.trace.times)
+
+    #draw the frame of timestep index
+    def render_frame(self,index):
+        image = self.background.copy()
+        num_nodes = len(self.nodes_x)
+        if self.node_colour_type=='node_passengers':
+            node_fractions = np.asarray(self.trace.get_node_loads_at(index),dtype=np.float64)/self.total_passengers
+            node_colours = style.node_scale_rgb(node_fractions**(1/style.CUSTOM_NODE_EXPONENT))
+        else:
+            node_colours = np.tile(style.colour_to_rgb(style.DEFAULT_NODE_COLOUR),(num_nodes,1))
+        draw_discs(image,self.nodes_x,self.nodes_y,style.DEFAULT_NODE_RADIUS,node_colours)
+        ids,latitudes,longitudes,passengers = self.trace.get_vehicles_at(index)
+        has_position = np.isfinite(latitudes) #only vehicles whose position was recorded at this timestep
+        vehicles_x,vehicles_y = self.convert_lat_long_to_x_y(latitudes[has_position],longitudes[has_position])
+        if self.vehicle_colour_type=='crowding':
+            vehicle_colours = style.crowding_rgb(passengers[has_position],style.VEHICLE_SEATED_CAPACITY,style.VEHICLE_STANDING_CAPACITY)
+        else:
+            vehicle_colours = np.tile(style.colour_to_rgb(style.DEFAULT_VEHICLE_COLOUR),(len(vehicles_x),1))
+        draw_squares(image,vehicles_x,vehicles_y,style.DEFAULT_VEHICLE_LENGTH,vehicle_colours)
+        return image
+
+#RASTERISING, all positions are in pixels and colours are rgb tuples or (n x 3) arrays
+
+#set the pixels at (x,y) to colours, skipping pixels outside the image
+def plot_pixels(image,x,y,colours):
+    height,width = image.shape[:2]
+    inside = (x>=0) & (x<width) & (y>=0) & (y<height)
+    colours = np.asarray(colours,dtype=np.uint8)
+    if colours.ndim==2:
+        colours = colours[inside]
+    image[y[inside],x[inside]] = colours
+
+#offsets of the pixels in a disc of a radius around its centre
+def disc_offsets(radius):
+    span = np.arange(-int(np.ceil(radius)),int(np.ceil(radius))+1)
+    offset_x,offset_y = np.meshgrid(span,span)
+    inside = offset_x**2 + offset_y**2 <= radius**2
+    return offset_x[inside],offset_y[inside]
+
+#draw lines of a width (in pixels) between (start_x,start_y) and (end_x,end_y), all in one colour
+def draw_lines(image,start_x,start_y,end_x,end_y,width,colour):
+    sample_x,sample_y,owners = spatial_index.sample_segments(start_x,start_y,end_x,end_y,0.5) #points close enough together to leave no gaps
+    offset_x,offset_y = disc_offsets(width/2)
+    x = (np.rint(sample_x)[:,np.newaxis] + offset_x).astype(np.int64).ravel()
+    y = (np.rint(sample_y)[:,np.newaxis] + offset_y).astype(np.int64).ravel()
+    plot_pixels(image,x,y,colour)
+
+#draw filled circles with a one pixel outline, as tk draws ovals
+def draw_discs(image,x,y,radius,colours):
+    offset_x,offset_y = disc_offsets(radius)
+    inner_x,inner_y = disc_offsets(radius-1)
+    centre_x = np.rint(x).astype(np.int64)[:,np.newaxis]
+    centre_y = np.rint(y).astype(np.int64)[:,np.newaxis]
+    plot_pixels(image,(centre_x+offset_x).ravel(),(centre_y+offset_y).ravel(),style.colour_to_rgb(style.OUTLINE_COLOUR))
+    plot_pixels(image,(centre_x+inner_x).ravel(),(centre_y+inner_y).ravel(),np.repeat(colours,len(inner_x),axis=0))
+
+#draw filled squares reaching half_length from their centres with a one pixel outline, as tk draws the vehicle rectangles
+def draw_squares(image,x,y,half_length,colours):
+    span = np.arange(-half_length,half_length+1)
+    offset_x,offset_y = [offsets.ravel() for offsets in np.meshgrid(span,span)]
+    inner = (np.abs(offset_x)<half_length) & (np.abs(offset_y)<half_length)
+    centre_x = np.rint(x).astype(np.int64)[:,np.newaxis]
+    centre_y = np.rint(y).astype(np.int64)[:,np.newaxis]
+    plot_pixels(image,(centre_x+offset_x).ravel(),(centre_y+offset_y).ravel(),style.colour_to_rgb(style.OUTLINE_COLOUR))
+    plot_pixels(image,(centre_x+offset_x[inner]).ravel(),(centre_y+offset_y[inner]).ravel(),np.repeat(colours,np.sum(inner),axis=0))
+
+#encode an rgb image as a png file
+def encode_png(image):
+    height,width = image.shape[:2]
+    def chunk(chunk_type,data):
+        return struct.pack('>I',len(data)) + chunk_type + data + struct.pack('>I',zlib.crc32(chunk_type+data) & 0xffffffff)
+    header = struct.pack('>IIBBBBB',width,height,8,2,0,0,0) #8 bit rgb, no interlacing
+    rows = np.concatenate((np.zeros((height,1),dtype=np.uint8),image.reshape(height,width*3)),axis=1) #each row starts with filter type 0 (none)
+    return b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR',header) + chunk(b'IDAT',zlib.compress(rows.tobytes(),6)) + chunk(b'IEND',b'')
+
+#PARALLEL EXPORT
+#each worker process gets its own copy of the renderer once, rather than with every frame
+#a memory mapped trace (trace_store.TraceReader) is reopened from its path by each worker, rather than every column being copied to it
+worker_renderer = None
+
+#arguments for init_worker, the renderer without its trace and the trace path if the trace is memory mapped, otherwise the renderer with its trace
+def worker_initargs(renderer):
+    if isinstance(renderer.trace,trace_store.TraceReader):
+        renderer_without_trace = copy.copy(renderer)
+        renderer_without_trace.trace = None
+        return (renderer_without_trace,renderer.trace.trace_path)
+    return (renderer,None)
+
+def init_worker(renderer,trace_path=None):
+    global worker_renderer
+    if trace_path is not None:
+        renderer.trace = trace_store.TraceReader(trace_path)
+    worker_renderer = renderer
+
+#render a frame to a png file, returning its path
+def render_png_worker(job):
+    index,path = job
+    with open(path,'wb') as file:
+        file.write(encode_png(worker_renderer.render_frame(index)))
+    return path
+
+#render a frame to raw rgb bytes, for sending to a video encoder
+def render_raw_worker(index):
+    return worker_renderer.render_frame(index).tobytes()
+
+#indices of the frames to export, every step'th timestep from start up to (not including) end
+def frame_indices(renderer,start,end,step):
+    if end is None:
+        end = renderer.num_frames()
+    return list(range(start,min(end,renderer.num_frames()),step))
+
+#write frames to output_dir as <prefix>_00000.png, <prefix>_00001.png ... (numbered in order of export), returning the paths
+def export_frames(renderer,output_dir,start=0,end=None,step=1,num_workers=None,prefix='frame'):
+    os.makedirs(output_dir,exist_ok=True)
+    jobs = [(index,os.path.join(output_dir,prefix + '_' + format(i,'05d') + '.png')) for i,index in enumerate(frame_indices(renderer,start,end,step))]
+    with mp.Pool(processes=num_workers,initializer=init_worker,initargs=worker_initargs(renderer)) as pool:
+        paths = pool.map(render_png_worker,jobs)
+    return paths
+
+#encode frames as a video at fps frames per second with ffmpeg, frames are rendered in parallel and streamed to ffmpeg in order
+#returns False (and writes nothing) if ffmpeg is not installed, use export_frames instead
+def export_video(renderer,output_path,fps=10,start=0,end=None,step=1,num_workers=None):
+    ffmpeg_path = shutil.which('ffmpeg')
+    if ffmpeg_path is None:
+        print('ffmpeg not found, cannot export video, use export_frames to export png images instead')
+        return False
+    if renderer.width%2!=0 or renderer.height%2!=0:
+        print('video width and height must be even, not ' + str(renderer.width) + 'x' + str(renderer.height))
+        return False
+    command = [ffmpeg_path,'-y','-loglevel','error','-f','rawvideo','-pix_fmt','rgb24','-s',str(renderer.width) + 'x' + str(renderer.height),'-r',str(fps),'-i','-',
+               '-pix_fmt','yuv420p',output_path]
+    encoder = subprocess.Popen(command,stdin=subprocess.PIPE)
+    with mp.Pool(processes=num_workers,initializer=init_worker,initargs=worker_initargs(renderer)) as pool:
+        for frame in pool.imap(render_raw_worker,frame_indices(renderer,start,end,step),chunksize=4): #imap keeps the frames in order
+            encoder.stdin.write(frame)
+    encoder.stdin.close()
+    if encoder.wait()!=0:
+        print('ffmpeg failed to encode ' + output_path)
+        return False
+    return True
@@ -0,0 +1,180 @@
+#gtfs.py
+#import a GTFS feed (stops, routes, trips and stop_times) as the node, edge and schedule tables used by the network
+#trips visiting the same stops in the same order share one schedule, dispatched at the departure time of each trip
+#use the result with schedule_type='timetable', eg n.Network(**gtfs.import_feed(path),parameters_csv=...,eval_csv=...,scenario_csv=...)
+
+import numpy as np #for large scale mathematical operations
+import pandas as pd
+import os as os
+import loader as loader #for checking the columns of the feed
+
+STOP_TIMES_COLUMNS = ['trip_id','arrival_time','departure_time','stop_id','stop_sequence']
+
+#convert GTFS times ("HH:MM:SS", hours may go past 24 for trips running after midnight) to minutes after midnight
+#empty times (allowed by GTFS for stops between timepoints) are returned as nan
+def gtfs_times_to_minutes(times):
+    parts = pd.Series(times,dtype=str).str.strip().str.split(':',expand=True)
+    if parts.shape[1]<3:
+        return np.full(len(times),np.nan)
+    hours = pd.to_numeric(parts[0],errors='coerce').to_numpy(dtype=np.float64)
+    minutes = pd.to_numeric(parts[1],errors='coerce').to_numpy(dtype=np.float64)
+    seconds = pd.to_numeric(parts[2],errors='coerce').to_numpy(dtype=np.float64)
+    return hours*60 + minutes + seconds/60
+
+#integer codes for string ids, assigned in the order ids are first seen, kept across the chunks of a file
+class IdCodes:
+    def __init__(self):
+        self.codes = {}
+        self.ids = []
+
+    #codes of a series of ids, adding ids not seen before
+    def encode(self,ids):
+        unique_ids = pd.unique(ids)
+        for new_id in unique_ids:
+            if new_id not in self.codes:
+                self.codes[new_id] = len(self.ids)
+                self.ids.append(new_id)
+        return ids.map(self.codes).to_numpy(dtype=np.int64)
+
+#read stop_times.txt in chunks, keeping only compact numerical columns so feeds with millions of rows fit in memory
+#stop ids are mapped through stop_parents (stop id to the station it belongs to) when given
+#returns trip codes, stop codes, stop sequence, arrival and departure minutes (one entry per row) and the IdCodes of trips and stops
+def read_stop_times(path,chunk_size=1000000,stop_parents=None,trip_filter=None):
+    trip_codes = IdCodes()
+    stop_codes = IdCodes()
+    columns = {'trips':[],'stops':[],'sequences':[],'arrivals':[],'departures':[]}
+    for chunk in pd.read_csv(path,usecols=STOP_TIMES_COLUMNS,dtype=str,chunksize=chunk_size,keep_default_na=False):
+        if trip_filter is not None:
+            chunk = chunk[chunk['trip_id'].isin(trip_filter)]
+        stop_ids = chunk['stop_id']
+        if stop_parents is not None:
+            stop_ids = stop_ids.map(stop_parents).fillna(stop_ids) #stops without a parent keep their own id
+        arrivals = gtfs_times_to_minutes(chunk['arrival_time'])
+        departures = gtfs_times_to_minutes(chunk['departure_time'])
+        #a stop with only one of its times given uses it for both
+        arrivals = np.where(np.isnan(arrivals),departures,arrivals)
+        departures = np.where(np.isnan(departures),arrivals,departures)
+        columns['trips'].append(trip_codes.encode(chunk['trip_id']).astype(np.int32))
+        columns['stops'].append(stop_codes.encode(stop_ids).astype(np.int32))
+        columns['sequences'].append(pd.to_numeric(chunk['stop_sequence']).to_numpy(dtype=np.int32))
+        columns['arrivals'].append(arrivals.astype(np.float32))
+        columns['departures'].append(departures.astype(np.float32))
+    for name,chunks in columns.items():
+        columns[name] = np.concatenate(chunks) if len(chunks)>0 else np.zeros(0)
+    return columns,trip_codes,stop_codes
+
+#fill in the times of stops between timepoints (nan) by interpolating along each trip, rows must be sorted by trip and sequence
+def interpolate_trip_times(trips,times):
+    known = ~np.isnan(times)
+    if np.all(known):
+        return times
+    row_positions = np.arange(len(times))
+    filled = times.copy()
+    trip_starts = np.flatnonzero(np.r_[True,trips[1:]!=trips[:-1]])
+    trip_ends = np.r_[trip_starts[1:],len(trips)]
+    for start,end in zip(trip_starts,trip_ends):
+        trip_known = known[start:end]
+        if np.all(trip_known) or np.sum(trip_known)<2:
+            continue
+        filled[start:end] = np.interp(row_positions[start:end],row_positions[start:end][trip_known],times[start:end][trip_known])
+    return filled
+
+#read a GTFS feed directory into the tables used by the network with schedule_type='timetable'
+#start_minute is the time of day (in minutes after midnight) when the simulation starts, trips departing before it or at or after end_minute (if given) are skipped
+#service_ids (if given) keeps only trips running on those services, eg the services of one weekday from calendar.txt
+#merge_platforms treats the platforms of a station (stops with a parent_station) as the station itself
+#daily passengers are not part of GTFS, so each stop is given passengers_per_visit for each vehicle departing or arriving at it, to be replaced by real demand where known
+#returns a dictionary of nodes_csv, edges_csv, schedule_csv and schedule_type which can be passed straight to network.Network
+#the Schedule column of schedule_csv holds lists of node names rather than comma separated text, as stop names may contain commas
+def import_feed(feed_path,start_minute=0,end_minute=None,service_ids=None,merge_platforms=True,passengers_per_visit=20,chunk_size=1000000):
+    stops = pd.read_csv(os.path.join(feed_path,'stops.txt'),dtype=str,keep_default_na=False)
+    routes = pd.read_csv(os.path.join(feed_path,'routes.txt'),dtype=str,keep_default_na=False)
+    trips = pd.read_csv(os.path.join(feed_path,'trips.txt'),dtype=str,keep_default_na=False)
+    loader.require_columns(stops,['stop_id','stop_name','stop_lat','stop_lon'],'stops.txt')
+    loader.require_columns(routes,['route_id'],'routes.txt')
+    loader.require_columns(trips,['route_id','trip_id'],'trips.txt')
+    if service_ids is not None:
+        loader.require_columns(trips,['service_id'],'trips.txt')
+        trips = trips[trips['service_id'].isin(service_ids)]
+    stop_parents = None
+    if merge_platforms and 'parent_station' in stops.columns:
+        has_parent = stops['parent_station']!=''
+        stop_parents = dict(zip(stops['stop_id'][has_parent],stops['parent_station'][has_parent]))
+    #read the stop times and sort them into trips
+    columns,trip_codes,stop_codes = read_stop_times(os.path.join(feed_path,'stop_times.txt'),chunk_size,stop_parents,set(trips['trip_id']))
+    order = np.lexsort((columns['sequences'],columns['trips']))
+    #platforms of the same station next to each other in a trip (after merge_platforms) are one stop
+    repeated = np.r_[False,(columns['trips'][order][1:]==columns['trips'][order][:-1]) & (columns['stops'][order][1:]==columns['stops'][order][:-1])]
+    order = order[~repeated]
+    trip_of_row = columns['trips'][order]
+    stop_of_row = columns['stops'][order]
+    arrivals = interpolate_trip_times(trip_of_row,columns['arrivals'][order].astype(np.float64)) - start_minute
+    departures = interpolate_trip_times(trip_of_row,columns['departures'][order].astype(np.float64)) - start_minute
+    trip_starts = np.flatnonzero(np.r_[True,trip_of_row[1:]!=trip_of_row[:-1]]) if len(trip_of_row)>0 else np.zeros(0,dtype=np.int64)
+    trip_ends = np.r_[trip_starts[1:],len(trip_of_row)].astype(np.int64)
+    #group trips visiting the same stops in the same order into patterns, each becomes a schedule
+    route_of_trip = dict(zip(trips['trip_id'],trips['route_id']))
+    pattern_ids = {} #(route id,stops visited) to index of the pattern
+    pattern_stops = []
+    pattern_routes = []
+    pattern_departures = []
+    kept_rows = np.zeros(len(trip_of_row),dtype=bool) #rows of the trips kept, only these are used for edges
+    for start,end in zip(trip_starts,trip_ends):
+        first_departure = departures[start]
+        if end-start<2 or np.isnan(first_departure) or first_departure<0 or (end_minute is not None and first_departure>=end_minute-start_minute):
+            continue
+        kept_rows[start:end] = True
+        trip_stops = tuple(stop_of_row[start:end].tolist())
+        route_id = route_of_trip[trip_codes.ids[trip_of_row[start]]]
+        key = (route_id,trip_stops)
+        pattern_id = pattern_ids.get(key)
+        if pattern_id is None:
+            pattern_id = len(pattern_stops)
+            pattern_ids[key] = pattern_id
+            pattern_stops.append(trip_stops)
+            pattern_routes.append(route_id)
+            pattern_departures.append([])
+        #trips departing within the same minute are kept as separate services, as each is a vehicle worth of capacity
+        pattern_departures[pattern_id].append(int(np.round(first_departure)))
+    if len(pattern_stops)==0:
+        raise ValueError('no trips in ' + feed_path + ' depart in the requested time window')
+    #travel time of each edge is the median over the trips kept of the time between leaving one stop and reaching the next
+    #the simulation moves vehicles a whole minute at a time, so edges take at least one minute
+    same_trip = (trip_of_row[1:]==trip_of_row[:-1]) & kept_rows[:-1]
+    edge_table = pd.DataFrame({'start':stop_of_row[:-1][same_trip],'end':stop_of_row[1:][same_trip],'time':(arrivals[1:]-departures[:-1])[same_trip]})
+    edge_table = edge_table[edge_table['start']!=edge_table['end']]
+    edge_times = edge_table.groupby(['start','end'])['time'].median()
+    used_stops = sorted(set([stop for stops_visited in pattern_stops for stop in stops_visited]))
+    #nodes, named after their stops (with the stop id added to names shared by several stops)
+    stop_table = stops.set_index('stop_id')
+    stop_ids = [stop_codes.ids[stop] for stop in used_stops]
+    missing = [stop_id for stop_id in stop_ids if stop_id not in stop_table.index]
+    if len(missing)>0:
+        raise ValueError('stop_times.txt refers to stops not in stops.txt: ' + ', '.join(missing[:5]))
+    stop_names = stop_table.loc[stop_ids,'stop_name'].to_list()
+    name_counts = pd.Series(stop_names).value_counts()
+    node_names = [name if name_counts[name]==1 else name + ' (' + stop_id + ')' for name,stop_id in zip(stop_names,stop_ids)]
+    node_name_of_stop = dict(zip(used_stops,node_names))
+    #arrivals are counted as well as departures, so stops which are only ever the end of a trip still have passengers
+    visits_at_stop = dict.fromkeys(used_stops,0)
+    for stops_visited,pattern_times in zip(pattern_stops,pattern_departures):
+        for stop in stops_visited:
+            visits_at_stop[stop] = visits_at_stop[stop] + len(pattern_times)
+    locations = [str(latitude) + ', ' + str(longitude) for latitude,longitude in zip(stop_table.loc[stop_ids,'stop_lat'],stop_table.loc[stop_ids,'stop_lon'])]
+    nodes_csv = pd.DataFrame({'Name':node_names,'Daily Passengers':[visits_at_stop[stop]*passengers_per_visit for stop in used_stops],'Location':locations})
+    edges_csv = pd.DataFrame({'Start':[node_name_of_stop[start] for start,end in edge_times.index],'End':[node_name_of_stop[end] for start,end in edge_times.index],
+                              'Time':np.maximum(1,np.round(edge_times.to_numpy())).astype(np.int64),'Bidirectional':'No'})
+    #schedules, named after their route
+    route_table = routes.set_index('route_id')
+    route_names = {}
+    for route_id in set(pattern_routes):
+        short_name = route_table['route_short_name'].get(route_id,'') if 'route_short_name' in route_table.columns else ''
+        long_name = route_table['route_long_name'].get(route_id,'') if 'route_long_name' in route_table.columns else ''
+        route_names[route_id] = short_name if short_name!='' else (long_name if long_name!='' else route_id)
+    schedule_rows = []
+    for i,(route_id,stops_visited,pattern_times) in enumerate(zip(pattern_routes,pattern_stops,pattern_departures)):
+        pattern_times = sorted(pattern_times)
+        schedule_rows.append({'Name':route_names[route_id] + ' ' + node_name_of_stop[stops_visited[0]] + '-' + node_name_of_stop[stops_visited[-1]] + ' #' + str(i),
+                              'Schedule':[node_name_of_stop[stop] for stop in stops_visited],'Departures':','.join([str(time) for time in pattern_times])})
+    schedule_csv = pd.DataFrame(schedule_rows,columns=['Name','Schedule','Departures'])
+    return {'nodes_csv':nodes_csv,'edges_csv':edges_csv,'schedule_csv':schedule_csv,'schedule_type':'timetable'}
@@ -0,0 +1,91 @@
+#instrument.py
+#low overhead timers and counters for each phase of a simulation timestep
+#the network only calls into an instrument when one is attached (see Network.attach_instrument), so runs without one pay nothing
+
+import numpy as np #for summarising the recorded values
+import pandas as pd #for exporting per-timestep values
+import time as time
+import json as json #for exporting summaries
+
+#records, for every timestep, the nanoseconds spent in each phase and the value of each counter
+#values are kept per timestep so they can be summarised as histograms and percentiles at the end of the run
+class Instrument:
+    def __init__(self,histogram_bins=20):
+        self.histogram_bins = histogram_bins #number of bins in the histograms of summary
+        self.reset()
+
+    #clear all recorded values, ready for a new simulation
+    def reset(self):
+        self.timers = {} #nanoseconds spent in each phase, one entry per timestep
+        self.counters = {} #value of each counter, one entry per timestep
+        self.step_timers = {} #values for the timestep in progress
+        self.step_counters = {}
+        self.num_steps = 0
+        self.last_lap = 0
+
+    #start timing a new timestep
+    def start_step(self):
+        self.step_timers = {}
+        self.step_counters = {}
+        self.last_lap = time.perf_counter_ns()
+
+    #add the time since the last lap (or the start of the step) to a phase
+    def lap(self,phase):
+        now = time.perf_counter_ns()
+        self.step_timers[phase] = self.step_timers.get(phase,0) + (now-self.last_lap)
+        self.last_lap = now
+
+    #add to a counter for the timestep in progress
+    def count(self,name,amount=1):
+        self.step_counters[name] = self.step_counters.get(name,0) + amount
+
+    #store the values of the timestep in progress, phases or counters not seen this timestep are stored as 0
+    def end_step(self):
+        for values,step_values in ((self.timers,self.step_timers),(self.counters,self.step_counters)):
+            for name in step_values:
+                if name not in values:
+                    values[name] = [0]*self.num_steps #first seen this timestep
+            for name,series in values.items():
+                series.append(step_values.get(name,0))
+        self.num_steps = self.num_steps + 1
+
+    #total, mean, extremes, percentiles and histogram of one series of per-timestep values
+    def summarise_series(self,values,scale=1):
+        values = np.asarray(values,dtype=np.float64)*scale
+        counts,edges = np.histogram(values,bins=self.histogram_bins)
+        return {'total':float(np.sum(values)),'mean':float(np.mean(values)),'min':float(np.min(values)),'max':float(np.max(values)),
+                'p50':float(np.percentile(values,50)),'p95':float(np.percentile(values,95)),'p99':float(np.percentile(values,99)),
+                'histogram':{'counts':counts.tolist(),'edges':edges.tolist()}}
+
+    #summary of every phase (in milliseconds) and counter over the run
+    def summary(self):
+        summary = {'num_steps':self.num_steps,'timers_ms':{},'counters':{}}
+        if self.num_steps==0:
+            return summary
+        for phase,values in self.timers.items():
+            summary['timers_ms'][phase] = self.summarise_series(values,1e-6)
+        for name,values in self.counters.items():
+            summary['counters'][name] = self.summarise_series(values)
+        return summary
+
+    #total seconds spent in each phase over the run
+    def phase_totals(self):
+        return {phase:float(np.sum(values))*1e-9 for phase,values in self.timers.items()}
+
+    #the per-timestep values as a table, one row per timestep, phase times are in nanoseconds
+    def step_table(self):
+        columns = {'step':np.arange(self.num_steps)}
+        for phase,values in self.timers.items():
+            columns[phase + '_ns'] = values
+        for name,values in self.counters.items():
+            columns[name] = values
+        return pd.DataFrame(columns)
+
+    #save the summary as json
+    def save_json(self,path):
+        with open(path,'w') as summary_file:
+            json.dump(self.summary(),summary_file,indent=1)
+
+    #save the per-timestep values as csv
+    def save_csv(self,path):
+        self.step_table().to_csv(path,index=False)
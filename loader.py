@@ -0,0 +1,117 @@
+#loader.py
+#parse and validate the node, edge and schedule csv files with vectorised pandas/numpy operations
+#all functions raise ValueError describing the offending rows if the data is invalid
+
+import numpy as np #for large scale mathematical operations
+import pandas as pd
+
+#describe up to the first few offending rows of a table in an error message
+def describe_rows(series,mask,limit=5):
+    rows = np.flatnonzero(mask)
+    described = ', '.join(['row ' + str(row) + ' (' + str(series.iloc[row]) + ')' for row in rows[:limit]])
+    if len(rows)>limit:
+        described = described + ' and ' + str(len(rows)-limit) + ' more'
+    return described
+
+#check that a table has the columns needed
+def require_columns(csv,columns,table_name):
+    missing = [column for column in columns if column not in csv.columns]
+    if len(missing)>0:
+        raise ValueError(table_name + ' is missing the columns ' + ', '.join(missing))
+
+#parse "latitude, longitude" strings (the format provided by google maps) into two float arrays
+def parse_coordinates(locations):
+    locations = pd.Series(locations).astype(str)
+    parts = locations.str.split(',',n=1,expand=True)
+    if parts.shape[1]<2:
+        parts[1] = None
+    latitudes = pd.to_numeric(parts[0].str.strip(),errors='coerce').to_numpy(dtype=np.float64)
+    longitudes = pd.to_numeric(parts[1].str.strip(),errors='coerce').to_numpy(dtype=np.float64)
+    invalid = np.isnan(latitudes) | np.isnan(longitudes)
+    if np.any(invalid):
+        raise ValueError('locations must be "latitude, longitude", invalid at ' + describe_rows(locations,invalid))
+    invalid = (np.abs(latitudes)>90) | (np.abs(longitudes)>180)
+    if np.any(invalid):
+        raise ValueError('locations out of range at ' + describe_rows(locations,invalid))
+    return latitudes,longitudes
+
+#parse counts which may have thousands separators (eg "1,635"), columns read with thousands=',' are already numeric and kept as they are
+def parse_counts(counts,column_name='counts'):
+    counts = pd.Series(counts)
+    if pd.api.types.is_numeric_dtype(counts):
+        values = counts.to_numpy().copy() #a copy, as the array may be a read only view of the table and callers (eg the optimiser) modify it
+    else:
+        values = pd.to_numeric(counts.astype(str).str.replace(',','',regex=False).str.strip(),errors='coerce').to_numpy(dtype=np.float64)
+    invalid = pd.isna(values) | (values<0)
+    if np.any(invalid):
+        raise ValueError(column_name + ' must be non-negative numbers, invalid at ' + describe_rows(counts,invalid))
+    return values
+
+#split comma separated lists (eg schedules) in bulk, returns a list of lists of names with surrounding whitespace kept, as in the original files
+#entries which are already lists (eg the schedules from gtfs.import_feed, whose stop names may contain commas) are used as they are
+def split_lists(texts):
+    texts = pd.Series(texts)
+    is_list = texts.map(lambda text: isinstance(text,(list,tuple))).to_numpy(dtype=bool)
+    invalid = texts.isna().to_numpy() & ~is_list
+    if np.any(invalid):
+        raise ValueError('lists must not be empty, empty at ' + describe_rows(texts,invalid))
+    if np.any(is_list):
+        return [list(text) if listed else str(text).split(',') for text,listed in zip(texts,is_list)]
+    return texts.astype(str).str.split(',').to_list()
+
+#parse a nodes csv, returning the names, latitudes, longitudes and daily passengers of each node
+def load_nodes(nodes_csv):
+    require_columns(nodes_csv,['Name','Location','Daily Passengers'],'nodes csv')
+    names = nodes_csv['Name'].astype(str)
+    duplicated = names.duplicated().to_numpy()
+    if np.any(duplicated):
+        raise ValueError('node names must be unique, repeated at ' + describe_rows(names,duplicated))
+    latitudes,longitudes = parse_coordinates(nodes_csv['Location'])
+    daily_passengers = parse_counts(nodes_csv['Daily Passengers'],'daily passengers')
+    return names.to_list(),latitudes,longitudes,daily_passengers
+
+#parse an edges csv given the index of each node name
+#returns the start and end node names, the start and end node indices, travel times and whether each edge is bidirectional
+def load_edges(edges_csv,node_index):
+    require_columns(edges_csv,['Start','End','Time','Bidirectional'],'edges csv')
+    starts = edges_csv['Start'].astype(str)
+    ends = edges_csv['End'].astype(str)
+    start_indices = starts.map(node_index)
+    end_indices = ends.map(node_index)
+    for names,indices in ((starts,start_indices),(ends,end_indices)):
+        unknown = indices.isna().to_numpy()
+        if np.any(unknown):
+            raise ValueError('edges refer to nodes not in the nodes csv at ' + describe_rows(names,unknown))
+    travel_times = parse_counts(edges_csv['Time'],'edge times')
+    invalid = travel_times<=0
+    if np.any(invalid):
+        raise ValueError('edge times must be positive, invalid at ' + describe_rows(edges_csv['Time'],invalid))
+    bidirectional = edges_csv['Bidirectional'].astype(str).str.strip()
+    invalid = ~bidirectional.isin(['Yes','No']).to_numpy()
+    if np.any(invalid):
+        raise ValueError('edge bidirectional must be Yes or No, invalid at ' + describe_rows(bidirectional,invalid))
+    return starts.to_list(),ends.to_list(),start_indices.to_numpy(dtype=np.int64),end_indices.to_numpy(dtype=np.int64),travel_times,(bidirectional=='Yes').to_numpy()
+
+#check the columns of a schedule csv shared by both schedule types, returning the gaps, offsets and finish times as arrays
+def load_schedule_times(schedule_csv):
+    require_columns(schedule_csv,['Name','Gap','Offset','Finish'],'schedule csv')
+    gaps = parse_counts(schedule_csv['Gap'],'schedule gaps')
+    invalid = gaps<=0
+    if np.any(invalid):
+        raise ValueError('schedule gaps must be positive, invalid at ' + describe_rows(schedule_csv['Gap'],invalid))
+    offsets = parse_counts(schedule_csv['Offset'],'schedule offsets')
+    finish = parse_counts(schedule_csv['Finish'],'schedule finish times')
+    return gaps,offsets,finish
+
+#parse the "Departures" column of a timetable schedule csv (comma separated departure times in minutes for each schedule)
+#returns a sorted list of integer departure times for each schedule
+#a time may be listed more than once, each is a separate service (eg two trips of a GTFS feed departing within the same minute)
+def load_departures(schedule_csv):
+    require_columns(schedule_csv,['Name','Departures'],'schedule csv')
+    departures = []
+    for i,times in enumerate(split_lists(schedule_csv['Departures'])):
+        times = pd.to_numeric(pd.Series(times).str.strip(),errors='coerce').to_numpy(dtype=np.float64)
+        if np.any(np.isnan(times)) or np.any(times<0) or np.any(times!=np.round(times)):
+            raise ValueError('departures must be whole non-negative minutes, invalid at ' + describe_rows(schedule_csv['Departures'],np.arange(len(schedule_csv))==i))
+        departures.append(sorted(times.astype(np.int64).tolist()))
+    return departures
@@ -10,6 +10,10 @@ import copy as copy #for shallow-copying schedules
 import random as rand
 rand.seed(30699) #consistent seed to ensure consistent results
 import agent as a
+import trace_store as trace_store #for logging simulation data
+import checkpoint as checkpoint #for saving checkpoints to disk
+import event_log as event_log #for logging what happens during the simulation
+import loader as loader #for parsing and validating the csv files
 
 #edge class, represents a (one-way) link between two nodes
 #at the moment, only relevant property is travel time taken, but more properties may be added later
@@ -37,15 +41,19 @@ class Edge:
 #node class, represents a location between which passengers can travel
 #the node stores the names of all the nodes which start at it
 class Node:
-    def __init__(self,name,coordinates,id,network):
+    def __init__(self,name,latitude,longitude,id,network):
         self.name = name
         self.edge_names = []#list of all edges starting at this node
         self.edge_destinations = []#and the destination of each node
         self.edge_times = []#matching list of travel time of each respective edge
-        (self.latitude,self.longitude) = extract_coordinates(coordinates)
+        self.latitude = latitude
+        self.longitude = longitude
         self.agents = [] #list of all agents at this stations
+        self.agent_cohorts = {} #in cohort mode, the agent at this station for each remaining path
         self.schedule_names = [] #list of schedules stopping at this station
-        self.schedule_times = [] #times at which vehicles arrive at this node
+        self.timetables = [] #departure times of each schedule from its start node, shared with the network
+        self.timetable_offsets = [] #time for each schedule to reach this node from its start node
+        self.schedule_cursors = [] #index of the next service of each schedule which has not yet arrived
         self.nodes_after = [] #list of nodes after this node on a schedule
         self.node_times_after = [] #time to reach nodes after the node on the schedule
         self.id = id #id of the node
@@ -98,15 +106,32 @@ class Node:
     
     #add a agent to the station
     def add_agent(self,agent):
-        self.agents.append(agent)
         self.num_agents = self.num_agents + agent.number_passengers #the number of passengers has increased
+        if self.network.agent_mode == 'cohort':
+            #merge the agent into the cohort already waiting here with the same remaining path, if there is one
+            cohort_key = agent.remaining_path()
+            cohort = self.agent_cohorts.get(cohort_key)
+            if cohort is not None:
+                cohort.number_passengers = cohort.number_passengers + agent.number_passengers
+                self.network.agent_pool.release(agent) #the merged agent no longer exists on its own
+                return
+            agent.cohort_key = cohort_key
+            self.agent_cohorts[cohort_key] = agent
+        self.agents.append(agent)
 
     #remove agent from the station
     def remove_agent(self,id):
         removed_agent = self.agents.pop(id)
         self.num_agents = self.num_agents - removed_agent.number_passengers #the number of passengers has decreased
+        if self.network.agent_mode == 'cohort':
+            del self.agent_cohorts[removed_agent.cohort_key]
         return removed_agent
 
+    #some of the passengers represented by an agent have left the station (eg the agent was split when a vehicle filled up)
+    def remove_agent_passengers(self,agent,num_passengers):
+        agent.number_passengers = agent.number_passengers - num_passengers
+        self.num_agents = self.num_agents - num_passengers
+
 
     #count the number of agents at the station
     def count_agents(self):
@@ -116,43 +141,66 @@ class Node:
         return self.num_agents 
 
 
-    #add a schedule which stops at that station
-    def add_stopping_schedule(self,schedule_name,schedule_times,node_offset,nodes_after,node_times_after):
+    #clear agents and schedule information, ready for the simulation to be rerun
+    def reset_simulation_state(self):
+        self.agents = []
+        self.agent_cohorts = {}
+        self.num_agents = 0
+        self.schedule_names = []
+        self.timetables = []
+        self.timetable_offsets = []
+        self.schedule_cursors = []
+        self.nodes_after = []
+        self.node_times_after = []
+        self.next_vehicle_changed = True #pathfinding info must be recalculated
+
+    #save the agents waiting here, how far through the timetable we are and the pathfinding cache, see restore_state
+    def capture_state(self):
+        state = {'agents':[agent.id for agent in self.agents],'num_agents':self.num_agents,'schedule_cursors':list(self.schedule_cursors),'next_vehicle_changed':self.next_vehicle_changed}
+        if self.next_vehicle_changed == False: #the pathfinding cache is in use, so must be saved
+            state['pathfinding'] = (self.distance_to_nodes.copy(),self.evaluated_nodes.copy(),self.evaluated_nodes_tf.copy(),list(self.path_to_nodes))
+        return state
+
+    #return to a state saved by capture_state, the timetable must already have been set up, agents is the agent pools list of agents
+    def restore_state(self,state,agents):
+        self.agents = [agents[id] for id in state['agents']]
+        self.num_agents = state['num_agents']
+        self.schedule_cursors = list(state['schedule_cursors'])
+        self.next_vehicle_changed = state['next_vehicle_changed']
+        if self.next_vehicle_changed == False:
+            self.reset_pathfinding_info()
+            distance_to_nodes,evaluated_nodes,evaluated_nodes_tf,path_to_nodes = state['pathfinding']
+            self.distance_to_nodes = distance_to_nodes.copy() #copied as pathfinding updates them in place
+            self.evaluated_nodes = evaluated_nodes.copy()
+            self.evaluated_nodes_tf = evaluated_nodes_tf.copy()
+            self.path_to_nodes = list(path_to_nodes)
+        self.agent_cohorts = {}
+        if self.network.agent_mode == 'cohort':
+            for agent in self.agents:
+                self.agent_cohorts[agent.cohort_key] = agent
+
+    #add a schedule which stops at that station, timetable is the schedules shared timetable and node_offset the time to reach this node
+    def add_stopping_schedule(self,schedule_name,timetable,node_offset,nodes_after,node_times_after):
         self.schedule_names.append(schedule_name)
-        schedule_times_mod = [schedule_time+node_offset for schedule_time in schedule_times] #offset schedule times by time to reach the node
-        self.schedule_times.append(schedule_times_mod)
+        self.timetables.append(timetable)
+        self.timetable_offsets.append(node_offset)
+        self.schedule_cursors.append(0) #no services have arrived yet
         self.nodes_after.append(nodes_after)
         self.node_times_after.append(node_times_after)
 
     #calculate the time till the next service of each schedule arrives at a node
     def time_till_next_vehicles(self,current_time):
-        num_schedules = len(self.schedule_names)
         next_service_times = []
-        for i in range(num_schedules): #go through all the schedules at a node
-            #calculate service data for each particular schedule
-            schedule_times = self.schedule_times[i]
-            num_future_services = len(schedule_times)
-            j = 0 #which service are we looking at
-            next_service_time = np.inf #default next service time is infinity
-            while j<num_future_services:
-                service_time = schedule_times[j]
-                if service_time>=current_time:
-                    next_service_time = service_time
-                    break #we have found a service after (or equal) to the present time, so need to search further
-                j = j + 1 #look at the next service
-            next_service_times.append(next_service_time)
-
+        for timetable,offset,cursor in zip(self.timetables,self.timetable_offsets,self.schedule_cursors): #go through all the schedules at a node
+            #services before the cursor have already arrived, so search for the first service after (or equal to) the present time from it
+            next_service_times.append(timetable.service_time(timetable.next_service_index(current_time,offset,cursor),offset))
         return next_service_times            
 
-    #remove vehicles which have already arrived at the node
+    #remove vehicles which have already arrived at the node, by moving the cursor of each schedule past them
+    #the timetable itself is left unchanged, so the cursors are all that needs saving to restore it
     def remove_arrived_vehicles(self,current_time):
-        num_schedules = len(self.schedule_names)
-        for i in range(num_schedules): #go through all the schedules at a node
-            while len(self.schedule_times[i])>0:
-                if self.schedule_times[i][0]<=current_time: #if this service is in the past
-                    self.schedule_times[i].pop(0) #remove it from the list of services
-                else:
-                    break #as services of a schedule are in order, we only need to evaluate till we find a service in the future
+        for i,(timetable,offset) in enumerate(zip(self.timetables,self.timetable_offsets)): #go through all the schedules at a node
+            self.schedule_cursors[i] = timetable.first_service_after(current_time,offset,self.schedule_cursors[i])
     
     #reset the internal info required for pathfinding 
     def reset_pathfinding_info(self):
@@ -162,7 +210,7 @@ class Node:
         self.evaluated_nodes_tf = np.zeros(self.num_nodes_in_network) #as above, but evaluated nodes are set to 1
         self.distance_to_nodes[self.id] = 0 #initial distance to reach the starting node is 0
         #create an array to store the paths to all the other nodes       
-        self.path_to_nodes = [[] for _ in range(self.num_nodes_in_network)] #create an empty nested list of the required length to store paths to nodes
+        self.path_to_nodes = [() for _ in range(self.num_nodes_in_network)] #create a list of empty paths of the required length to store paths to nodes
 
     def check_evaluated_destinations(self,destination_nodes):
         num_evaluated_destinations = np.sum(np.logical_and(self.evaluated_nodes,destination_nodes)) 
@@ -173,6 +221,9 @@ class Node:
         if self.next_vehicle_changed == True:
             self.reset_pathfinding_info() #restart the pathfinding process if the next vehicle arriving at this node has changed
             self.next_vehicle_changed = False #compared to the present, next vehicle has not changed
+        instrument = self.network.instrument
+        if instrument is not None:
+            num_evaluated_before = np.count_nonzero(self.evaluated_nodes_tf) #nodes already expanded by earlier searches using the cache
          #get info about vehicles arriving at the starting node
         start_next_service_times,start_nodes_after,start_node_times_after,start_schedule_names = self.provide_next_services(data_time=start_time,start=True)
         destination_nodes = num_passengers_to_node>0 #determine which nodes we need to calculate paths too (I.E those where passengers are actually going)
@@ -213,17 +264,17 @@ class Node:
                     distance_to_current_node_new_path = minimum_distance + (next_service_time-current_time) + route_times_after[j] #how long to reach next node through evaluation node
                     if distance_to_current_node_new_path<distance_to_current_node_old_path: #we have a better path
                         self.distance_to_nodes[node_index] = distance_to_current_node_new_path
-                        route_to_old_node = self.path_to_nodes[min_index] #extract the path to the evaluation node
-                        route_to_new_node = copy.copy(route_to_old_node) #path to the next node is path to the evaluation node + new step
-                        route_to_new_node.append(next_service_name) #store the next service we need to catch
-                        route_to_new_node.append(node.name) #and when we need to get off that service
-                        self.path_to_nodes[node_index] = route_to_new_node #store this in the list of all paths
+                        #path to the next node is path to the evaluation node + the next service we need to catch + where we need to get off that service
+                        #paths are immutable tuples, so agents created from them can share them without copying
+                        self.path_to_nodes[node_index] = self.path_to_nodes[min_index] + (next_service_name,node.name) #store this in the list of all paths
             
             self.evaluated_nodes[min_index] = np.inf #mark the node as evaluated, it will not be evaluated again
             self.evaluated_nodes_tf[min_index] = True #as above
             if destination_nodes[min_index]==True:
                 num_evaluated_destinations = num_evaluated_destinations+1
 
+        if instrument is not None:
+            instrument.count('nodes_expanded',np.count_nonzero(self.evaluated_nodes_tf)-num_evaluated_before)
         #once we have found the paths to all nodes, return the paths and number of passengers
         #note we return the number of passengers going to an unreachable station as zero, but we return the number of passengers who failed to reach their destination as well
         num_nodes = len(self.network.nodes)
@@ -263,33 +314,38 @@ class Node:
 class Network:
     #initalise the physical network
     #note, this assumes that passengers are evenly distributed through the day
-    def __init__(self,nodes_csv,edges_csv,schedule_csv,parameters_csv,eval_csv,scenario_csv,verbose=1,segment_csv='',schedule_type='simple',optimiser='hardcoded'):
+    def __init__(self,nodes_csv,edges_csv,schedule_csv,parameters_csv,eval_csv,scenario_csv,verbose=1,segment_csv='',schedule_type='simple',optimiser='hardcoded',agent_mode='individual'):
         time1 = time.time()
         print('optimiser ',optimiser)
         self.verbose = verbose #import verbosity
+        self.event_log = event_log.EventLog(verbose) #events during the simulation, see set_verbose
+        self.setup_timings = {} #seconds taken by each phase of setting up the network, used for benchmarking
         #where we will store edges and nodes
         self.edges = [] #list of edges 
         self.nodes = [] #list of nodes
         self.edge_names = [] #list of generated edge names
+        self.edge_index = {} #index of each edge name in edge_names
         self.optimiser = optimiser #optimisers we can use, options are "hardcoded", the set frequency from the schedule and "henryconvex", my own custom convex optimisation function 
+        #how passengers are grouped into agents, options are "individual", one agent per origin-destination pair per minute
+        #and "cohort", where agents at the same place with the same remaining path are merged into one agent, only splitting when a vehicle fills up
+        self.agent_mode = agent_mode
         #extract the raw data
-        #now extract node data
-        self.node_names = nodes_csv["Name"].to_list()
-        node_positions = nodes_csv["Location"].to_list() 
+        #now extract node data, the loader raises a ValueError if the data is invalid
+        self.node_names,node_latitudes,node_longitudes,node_daily_passengers = loader.load_nodes(nodes_csv)
+        self.node_index = {name:i for i,name in enumerate(self.node_names)} #index of each node name in node_names
         #and let's create the nodes
         num_nodes = len(self.node_names)
         for i in range(num_nodes):
-            self.nodes.append(Node(self.node_names[i],node_positions[i],i,self)) #nodes id is it's position in the array
+            self.nodes.append(Node(self.node_names[i],float(node_latitudes[i]),float(node_longitudes[i]),i,self)) #nodes id is it's position in the array
 
         #extract edge data
-        self.edge_starts = edges_csv["Start"].to_list()
-        self.edge_ends = edges_csv["End"].to_list()
-        self.edge_times = edges_csv["Time"].to_list()
-        self.edge_bidirectional = edges_csv["Bidirectional"].to_list()
+        self.edge_starts,self.edge_ends,edge_start_indices,edge_end_indices,edge_times,edge_bidirectional = loader.load_edges(edges_csv,self.node_index)
+        self.edge_times = edge_times.tolist()
+        self.edge_bidirectional = edge_bidirectional.tolist()
         #and let's create the edges
         num_edges = len(self.edge_starts)
         for i in range(num_edges):
-            if (self.edge_bidirectional[i]=='Yes'):#if input edge is two-way
+            if self.edge_bidirectional[i]:#if input edge is two-way
                 #create two edges, one "UP" (by convention towards central), one "DOWN", (away from central)
                 self.add_edge(self.edge_starts[i],self.edge_ends[i],self.edge_times[i])#UP
                 self.add_edge(self.edge_ends[i],self.edge_starts[i],self.edge_times[i])#DOWN
@@ -310,23 +366,27 @@ class Network:
         self.unfinished_penalty = eval_csv["Unfinished Penalty"].to_list()[0] #penalty if passengers are unable to reach their destination, based roughly on cost of late night taxi ride
         self.passenger_time_multiplier = float(0) #multiplier on how many passengers are generated per hour, converted to a float as it refuses to become an integer later
         #allocate passengers 
-        self.node_passengers = (nodes_csv["Daily Passengers"]).to_list()#passengers per day for each station
+        self.node_passengers = node_daily_passengers.tolist()#passengers per day for each station
         time2 = time.time()
+        self.setup_timings['network_data'] = time2-time1
         if self.verbose>=1:
             print('time to extract and process network data - ', time2-time1, ' seconds')
         time1 = time.time()
         self.find_distance_to_all_path()#find the shortest distance between all edges on the network, as well as the paths between them
         time2 = time.time()
+        self.setup_timings['all_pairs'] = time2-time1
         if self.verbose>=1:
             print('time to find ideal travel time between all nodes - ', time2-time1, ' seconds')
         time1 = time.time()
         self.create_origin_destination_matrix()#create the origin destination matrix for the network
         time2 = time.time()
+        self.setup_timings['gravity'] = time2-time1
         if self.verbose>=1:
             print('time to assign passengers to origin destination pairs - ', time2-time1, ' seconds')
         time1 = time.time()
         self.find_expected_edge_traffic()
         time2 = time.time()
+        self.setup_timings['edge_traffic'] = time2-time1
         if self.verbose>=1:
             print('time to calculate traffic along each edge ',time2-time1, ' seconds')
         #in simple scheduling, schedules are just lists of nodes
@@ -342,12 +402,15 @@ class Network:
         self.vehicle_names = [] #container to store vehicle names in, note this is just schedule name followed by initial departure time 
         #set the simulation timestamp to be 0 (start of simulation)
         self.time = 0
-        #containers to store agents (passengers) and agent ids
-        self.agents = []
-        self.agent_ids = []
-        self.agent_id_counter = 0 #id of the next agent to be generated
+        #pool storing agents (passengers), slots of agents which have finished their journey are reused
+        self.agent_pool = a.AgentPool()
         self.num_failed_agents = 0 #number of agents created who could not find a path and hence were immediately unmade
         self.num_successful_agents = 0 #number of agents who were created and found a path to their destination
+        self.online_evaluator = None #evaluator fed the network state every timestep, see attach_evaluator
+        self.checkpoint_interval = None #timesteps between saved states of the simulation, None to not save any
+        self.checkpoints = [] #saved states of the simulation, see capture_state
+        self.checkpoint_trace_rows = {} #for each checkpoint file, the directory its trace is saved to and the timesteps saved, see checkpoint.append_checkpoint_trace
+        self.instrument = None #times and counts the work done each timestep, see attach_instrument
         time1 = time.time()
         self.create_schedules() #create the schedules
         if self.optimiser=='hardcoded':
@@ -357,12 +420,83 @@ class Network:
         self.create_dispatch_schedule()
         self.determine_which_nodes_have_schedule() #determine which nodes have which schedules
         time2 = time.time()
+        self.setup_timings['schedules'] = time2-time1
         if self.verbose>=1:
             print('time to extract and generate schedules', time2-time1, 'seconds')
 
-    #implemention of my own custom optimisation algorithm
-    #which determines the optimal wait time between services based on minimising total service cost + waiting cost
-    def henry_convex_optimiser(self):
+    #return the network to the state it was in before the simulation started, so the simulation can be rerun
+    #if seed is given the random number generator is reseeded, so reruns with the same seed create the same passengers
+    def reset_simulation(self,seed=None):
+        if seed is not None:
+            rand.seed(seed)
+        self.time = 0
+        self.passenger_time_multiplier = float(0)
+        self.num_vehicles_started_here = np.zeros(len(self.nodes))
+        self.vehicles = []
+        self.vehicle_names = []
+        self.agent_pool = a.AgentPool()
+        self.num_failed_agents = 0
+        self.num_successful_agents = 0
+        for node in self.nodes:
+            node.reset_simulation_state()
+        self.create_dispatch_schedule()
+        self.determine_which_nodes_have_schedule()
+
+    #save everything which changes as the simulation runs, so the simulation can later be resumed from this point
+    #agents are saved by id, vehicles and nodes store the ids of the agents they hold
+    def capture_state(self):
+        state = {}
+        state['time'] = self.time
+        state['passenger_time_multiplier'] = self.passenger_time_multiplier
+        state['num_failed_agents'] = self.num_failed_agents
+        state['num_successful_agents'] = self.num_successful_agents
+        state['num_vehicles_started_here'] = self.num_vehicles_started_here.copy()
+        state['vehicle_names'] = list(self.vehicle_names)
+        state['dispatch_cursors'] = list(self.dispatch_cursors)
+        state['random_state'] = rand.getstate()
+        state['agent_pool'] = self.agent_pool.capture_state()
+        state['vehicles'] = [vehicle.capture_state() for vehicle in self.vehicles]
+        state['nodes'] = [node.capture_state() for node in self.nodes]
+        state['trace_num_times'] = self.trace.num_times #number of timesteps recorded in the trace
+        if self.online_evaluator is not None:
+            state['evaluator'] = self.online_evaluator.capture_state()
+        return state
+
+    #return the simulation to a state saved by capture_state
+    #node timetables are rebuilt from the current dispatch schedule, which may differ from the one in use when the state was saved
+    def restore_state(self,state):
+        self.time = state['time']
+        self.passenger_time_multiplier = state['passenger_time_multiplier']
+        self.num_failed_agents = state['num_failed_agents']
+        self.num_successful_agents = state['num_successful_agents']
+        self.num_vehicles_started_here = state['num_vehicles_started_here'].copy()
+        self.vehicle_names[:] = state['vehicle_names'] #modified in place, as the trace holds a reference to the list
+        self.dispatch_cursors = list(state['dispatch_cursors'])
+        rand.setstate(state['random_state'])
+        self.agent_pool.restore_state(state['agent_pool'])
+        agents = self.agent_pool.agents
+        if self.agent_mode == 'cohort':
+            cohort_pool = self.agent_pool
+        else:
+            cohort_pool = None
+        self.vehicles = [vehicle.restore_vehicle(vehicle_state,agents,cohort_pool) for vehicle_state in state['vehicles']]
+        for node in self.nodes:
+            node.reset_simulation_state()
+        self.determine_which_nodes_have_schedule()
+        for node,node_state in zip(self.nodes,state['nodes']):
+            node.restore_state(node_state,agents)
+        if self.online_evaluator is not None and 'evaluator' in state:
+            self.online_evaluator.restore_state(state['evaluator'])
+
+    #set the gap (in minutes) between services on each schedule, and reset the simulation to use them
+    def apply_schedule_gaps(self,gaps,seed=None):
+        self.schedule_gaps = np.array(gaps)
+        self.reset_simulation(seed)
+
+    #cost terms used by the henry_convex optimiser
+    #schedule_costs is the cost of running one service of each schedule ($)
+    #weighted_passengers is the passengers at the nodes of each schedule (scaled by the mean traffic multiplier), nodes shared by several schedules split their passengers between them
+    def calculate_convex_cost_terms(self):
         schedule_costs = []
         num_nodes = len(self.node_names)
         num_schedules_each_node = np.zeros(num_nodes) #number of schedules at each node
@@ -376,6 +510,7 @@ class Network:
                 num_schedules_each_node[node_index] = num_schedules_each_node[node_index] + 1 #one more schedule is present at this node
 
         #now determine the number of passengers starting at each schedule (nodes with multiple schedules have reduced weight)
+        schedule_weighted_passengers = []
         for i,schedule in enumerate(self.schedules):
             weighted_passengers = 0
             node_names = schedule.node_names #get the name of all the node
@@ -383,18 +518,20 @@ class Network:
                 node_index = self.get_node_index(name)
                 node_passengers = self.node_passengers[node_index]*np.mean(self.traffic_multiplier)
                 weighted_passengers = weighted_passengers + (node_passengers/num_schedules_each_node[node_index])
+            schedule_weighted_passengers.append(weighted_passengers)
+        return np.array(schedule_costs),np.array(schedule_weighted_passengers)
+
+    #implemention of my own custom optimisation algorithm
+    #which determines the optimal wait time between services based on minimising total service cost + waiting cost
+    def henry_convex_optimiser(self):
+        schedule_costs,schedule_weighted_passengers = self.calculate_convex_cost_terms()
+        for i,schedule in enumerate(self.schedules):
             #now use the derived equation (see thesis) to determine the optimal frequency
-            optimal_wait_time = np.sqrt((2*schedule_costs[i])/(weighted_passengers*self.agent_cost_waiting))
+            optimal_wait_time = np.sqrt((2*schedule_costs[i])/(schedule_weighted_passengers[i]*self.agent_cost_waiting))
             optimal_wait_time = int(optimal_wait_time*60) #convert to integers minutes
             print('for schedule ',schedule.name,' optimal wait time is ',optimal_wait_time,' mins') #DEBUG
             self.schedule_gaps[i] = optimal_wait_time
 
-
-           
-        #having determined the length and weighted number of passengers in each schedule, let's calculate the optimal frequency 
-    
-    
-
     #update the passenger time multiplier, sets the number of passengers generated to vary throughout the day based on the scenario    
     def update_passenger_time_multiplier(self):
         time_period = int(self.time/self.traffic_time_gap)
@@ -411,43 +548,67 @@ class Network:
         self.passenger_time_multiplier = self.passenger_time_multiplier
 
     #create a new vehicle and add it to the network
-    def create_vehicle(self,schedule):
-        vehicle_name = str(self.time) + " " + schedule.provide_name() #calculate the vehicles name
+    #name_suffix tells apart vehicles of the same schedule created in the same minute
+    def create_vehicle(self,schedule,name_suffix=''):
+        vehicle_name = str(self.time) + " " + schedule.provide_name() + name_suffix #calculate the vehicles name
         #produce a shallow copy of the schedule to provide to the vehicle, note we use a class defined implemention of shallow-copying
         copy_schedule = copy.copy(schedule) #copy the schedule object, but maintain keep references to node/edges identical
-        if self.verbose>=1:
-            print('schedule destinations ',copy_schedule.nodes)
         junk,start_node = copy_schedule.provide_next_destination() #extract the first destination of the schedule
         start_node_index = start_node.id
         self.num_vehicles_started_here[start_node_index] += 1 #record that a vehicle started at a particular node
+        vehicle_id = len(self.vehicle_names) #id of the vehicle is its position in the list of vehicle names
         self.vehicle_names.append(vehicle_name) #add the vehicles name to the list
-        self.vehicles.append(vehicle.Vehicle(copy_schedule,self.time,vehicle_name,seated_capacity=self.vehicle_max_seated,standing_capacity=self.vehicle_max_standing)) #create the vehicle and add it to the list
+        if self.agent_mode == 'cohort':
+            cohort_pool = self.agent_pool #vehicles merge boarding agents into cohorts, returning merged agents to the pool
+        else:
+            cohort_pool = None
+        self.vehicles.append(vehicle.Vehicle(copy_schedule,self.time,vehicle_name,vehicle_id,seated_capacity=self.vehicle_max_seated,standing_capacity=self.vehicle_max_standing,cohort_pool=cohort_pool)) #create the vehicle and add it to the list
         if self.verbose>=1:
-            print('a vehicle ', vehicle_name, ' has been created at ',start_node.name, ' at time ',self.time)
+            self.event_log.event(event_log.VERBOSE,'vehicle_created',self.time,vehicle=vehicle_name,node=start_node.name)
 
     #this function updates all the vehicle objects in the network
     def move_vehicles(self):
         for count,vehicle in enumerate(self.vehicles):
             #logging
             if self.verbose==1:
-                vehicle.verbose_stop()
+                if vehicle.state == 'at_stop':
+                    self.event_log.event(event_log.VERBOSE,'vehicle_stopped',self.time,vehicle=vehicle.name,node=vehicle.previous_stop.name)
             elif self.verbose>=2:
-                vehicle.verbose_position()
+                self.event_log.event(event_log.DEBUG,'vehicle_position',self.time,vehicle=vehicle.name,state=vehicle.state,schedule=vehicle.schedule_name,remaining=','.join([node.name for node in vehicle.schedule.nodes]))
             not_reached_destination = vehicle.update()  
             if not_reached_destination == False:
                 if self.verbose>=1:
-                    print('a vehicle ', vehicle.name, ' has reached the end of its path at time ', self.time)
+                    self.event_log.event(event_log.VERBOSE,'vehicle_finished',self.time,vehicle=vehicle.name)
+                self.release_stranded_agents(vehicle)
                 del self.vehicles[count] #remove the vehicle when it has reached it's destination
 
+    #return the agents still aboard a vehicle which has finished its schedule to the pool, as they can no longer reach their destination
+    #they were counted as successful when they found a path, so they are counted as failed instead
+    def release_stranded_agents(self,finished_vehicle):
+        for agent in finished_vehicle.agents:
+            self.num_successful_agents = self.num_successful_agents - agent.number_passengers
+            self.num_failed_agents = self.num_failed_agents + agent.number_passengers
+            if self.verbose>=1:
+                self.event_log.event(event_log.VERBOSE,'agents_stranded',self.time,vehicle=finished_vehicle.name,passengers=agent.number_passengers)
+            self.agent_pool.release(agent)
+        finished_vehicle.agents = []
+        finished_vehicle.agent_cohorts = {}
+        finished_vehicle.num_passengers = 0
+
     #create vehicles at nodes as needed by the schedule
     def assign_vehicles_schedule(self):
         #run through the all the schedules in the dispatch list
         num_schedules = len(self.schedules)
         for i in range(num_schedules):
-            if len(self.dispatch_schedule2[i])>0: #if there are still schedules left to be dispatched
-                if self.time == self.dispatch_schedule2[i][0]: #a vehicle of this schedule is required to be created a the current time
-                    self.create_vehicle(self.schedules[i])
-                    self.dispatch_schedule2[i].pop(0) #remove the first element of the list as the vehicle has been created at the required time
+            cursor = self.dispatch_cursors[i] #index of the next service of this schedule to dispatch
+            departures = self.dispatch_schedule2[i]
+            #create every service which is due, a timetable may have several services of a schedule departing in the same minute
+            num_created = 0
+            while cursor<len(departures) and departures[cursor]<=self.time:
+                self.create_vehicle(self.schedules[i],'' if num_created==0 else ' (' + str(num_created+1) + ')')
+                num_created = num_created + 1
+                cursor = cursor + 1 #move on to the next service as the vehicle has been created at the required time
+            self.dispatch_cursors[i] = cursor
 
     #create passengers with pathfinding done at the node level rather than the agent level
     def create_all_passengers_pathfinding(self):
@@ -473,12 +634,8 @@ class Network:
             for j in range(num_nodes): #go through all the nodes we are ending up at
                 num_passengers = num_passengers_created[j]
                 if num_passengers>0:
-                    end_node = self.nodes[j]
-                    path = copy.deepcopy(path_to_nodes[j])
-                    new_agent = a.Agent(start_node,end_node,self.agent_id_counter,self.time,self,num_passengers,path) #create the new passenger
-                    self.agents.append(new_agent) #create the new passengers and add to the list
-                    self.agent_ids.append(self.agent_id_counter) #store the id of the newly created passenger
-                    self.agent_id_counter = self.agent_id_counter + 1 #increment the id counter
+                    #create the new passenger, the path tuple is shared with the node's pathfinding cache rather than copied
+                    new_agent = self.agent_pool.acquire(i,j,self.time,num_passengers,path_to_nodes[j])
                     #assign the passenger to their starting station
                     start_node.add_agent(new_agent)
             
@@ -506,17 +663,16 @@ class Network:
     #create a single passenger
     def create_passenger(self,start_node,end_node,num_passengers):
         #create the passenger
-        new_agent = a.Agent(start_node,end_node,self.agent_id_counter,self.time,self,num_passengers)
-        if new_agent.found_path == True:
-            #create the new passenger if they can find a path to their destination
-            self.agents.append(new_agent) #create the new passengers and add to the list
-            self.agent_ids.append(self.agent_id_counter) #store the id of the newly created passenger
-            self.agent_id_counter = self.agent_id_counter + 1 #increment the id counter
+        new_agent = self.agent_pool.acquire(start_node.id,end_node.id,self.time,num_passengers,())
+        found_path = new_agent.pathfind(self)
+        if found_path == True:
+            #keep the new passenger if they can find a path to their destination
             #assign the passenger to their starting station
             start_node.add_agent(new_agent)
             self.num_successful_agents = self.num_successful_agents + num_passengers
         else:
             #if we cannot find a path to their destination, uncreate the agent
+            self.agent_pool.release(new_agent)
             self.num_failed_agents = self.num_failed_agents + num_passengers
 
             
@@ -544,21 +700,16 @@ class Network:
                 #go through all the agents on the vehicle
                 for j,agent in enumerate(copy_vehicle_agents):
                     alight_status = agent.alight(stop_node.name)
-                    if agent.done==True: #we will not waste our time processing agents that have reached their destination
+                    if alight_status == 1: #agent is alighting
+                        agent = vehicle.alight_agent(j-num_removed) #remove them from the list of agents at the vehicle
+                        num_removed = num_removed + 1
+                        stop_node.add_agent(agent) #and add them to list of agents at the station
+                    elif alight_status == 2: #agent is alighting at their destination
+                        agent = vehicle.alight_agent(j-num_removed) #remove them from the list of agents at the vehicle
+                        num_removed = num_removed + 1
+                        self.agent_pool.release(agent)  #the agent has achieved their goals, so return it to the pool for reuse
+                    elif alight_status == 0: #agent is not alighting
                         pass
-                    else:
-                        if alight_status == 1: #agent is alighting
-                            agent = vehicle.alight_agent(j-num_removed) #remove them from the list of agents at the vehicle
-                           # print('type ',type(agent),' name',agent.name) #DEBUG
-                            num_removed = num_removed + 1
-                            stop_node.add_agent(agent) #and add them to list of agents at the station
-                        elif alight_status == 2: #agent is alighting at their destination
-                            agent = vehicle.alight_agent(j-num_removed) #remove them from the list of agents at the vehicle
-                          #  print('type ',type(agent),' name',agent.name) #DEBUG
-                            num_removed = num_removed + 1
-                            agent.done = True  #mark the agent as having achieved their goals
-                        elif alight_status == 0: #agent is not alighting
-                            pass
 
     #passengers board vehicles which have stopped
     def board_passengers(self):
@@ -570,9 +721,11 @@ class Network:
                 stop_node.next_vehicle_changed = True #the next vehicle stopping at this node will now be different
                 schedule_name = vehicle.schedule_name
                 copy_stop_node_agents = copy.copy(stop_node.agents) #create a shallow copy of the list of agents at the node (agents will be the same, but references will be independent)
+                if self.instrument is not None:
+                    self.instrument.count('boarding_attempts',len(copy_stop_node_agents)) #every agent at the stop is asked to board
                 num_removed = 0 #keep of number removed so we can pop the right agent
                 for j,agent in enumerate(copy_stop_node_agents): #go through all the agents where the vehicle stopped
-                    original_path = copy.deepcopy(agent.destination_path)
+                    original_path_index = agent.path_index #where the agent was along its path before being asked to board
                     will_board = agent.board(schedule_name)
                     if will_board == True:
                         #if the agent is getting on the vehicles
@@ -583,13 +736,13 @@ class Network:
                             vehicle.board_agent(agent) #have the agents board the vehicle
                             num_removed = num_removed + 1 #we have removed another agent
                         elif vehicle_capacity==0:
-                            agent.destination_path = original_path
+                            agent.path_index = original_path_index
                         else:
-                            leftover_passengers = agent_passengers-vehicle_capacity
-                            agent = stop_node.agents[j-num_removed]
-                            copy_agent = a.Agent(agent.start_node,agent.destination_node,agent.id,agent.start_time,agent.network,vehicle_capacity,copy.deepcopy(agent.destination_path))
-                            agent.num_passengers = leftover_passengers
-                            agent.destination_path = original_path 
+                            #split the agent, as many passengers as will fit board, the rest keep waiting
+                            copy_agent = self.agent_pool.acquire(agent.start_node,agent.destination_node,agent.start_time,vehicle_capacity,agent.destination_path)
+                            copy_agent.path_index = agent.path_index #the boarding passengers have progressed along the path
+                            stop_node.remove_agent_passengers(agent,vehicle_capacity) #the leftover passengers stay at the station
+                            agent.path_index = original_path_index 
                             vehicle.board_agent(copy_agent)
                     else:
                         #if agent is not boarding, we do not need to do anything
@@ -599,84 +752,161 @@ class Network:
     def update_time(self):
         self.update_passenger_time_multiplier()
         if self.verbose>=1:
-            print('time ', self.time)
-        if self.verbose>=1:
-            print('at start num passengers ', len(self.agents))
+            self.event_log.event(event_log.VERBOSE,'step_start',self.time,agents=self.agent_pool.num_active)
+        instrument = self.instrument #None unless instrumentation is switched on, see attach_instrument
+        if instrument is not None:
+            instrument.start_step()
+            num_agents_created = self.agent_pool.num_created
         self.move_vehicles() #move vehicles around the network
+        if instrument is not None:
+            instrument.lap('move_vehicles')
         self.update_nodes_next_vehicle() #update when the next vehicles will arrive at each node
+        if instrument is not None:
+            instrument.lap('next_vehicle')
         self.alight_passengers() #passengers alight from vehicles
+        if instrument is not None:
+            instrument.lap('alighting')
         if self.verbose>=1:
-            print('after alighting num passengers ', len(self.agents))
+            self.event_log.event(event_log.VERBOSE,'alighted',self.time,agents=self.agent_pool.num_active)
         #self.remove_arrived_vehicles()  #remove vehicles which have completed their path
         self.assign_vehicles_schedule() #create new vehicles at scheduled locations
+        if instrument is not None:
+            instrument.lap('dispatch')
         self.create_all_passengers_pathfinding() #create new passengers
+        if instrument is not None:
+            instrument.lap('pathfinding')
+            instrument.count('agents_created',self.agent_pool.num_created-num_agents_created)
         if self.verbose>=1:
-            print('after creating new, new passengers ', len(self.agents))
+            self.event_log.event(event_log.VERBOSE,'agents_created',self.time,agents=self.agent_pool.num_active)
         self.board_passengers() #passengers board vehicles
+        if instrument is not None:
+            instrument.lap('boarding')
         if self.verbose>=1:
-            print('after boarding num passengers ', len(self.agents)) 
+            self.event_log.event(event_log.VERBOSE,'boarded',self.time,agents=self.agent_pool.num_active)
         self.time = self.time + 1 #increment time
+        if self.online_evaluator is not None:
+            self.online_evaluator.observe(self) #accumulate costs for this timestep
+        if instrument is not None:
+            instrument.lap('evaluation')
+            instrument.count('vehicles',len(self.vehicles))
+            instrument.count('active_agents',self.agent_pool.num_active)
+            instrument.end_step()
+
+    #attach an evaluator.OnlineEvaluator which is fed the state of the network at the end of every timestep
+    def attach_evaluator(self,online_evaluator):
+        self.online_evaluator = online_evaluator
+
+    #attach an instrument.Instrument which times each phase of every timestep and counts the work done, None to switch instrumentation off
+    def attach_instrument(self,instrument):
+        self.instrument = instrument
 
     #run for a certain amount of time
-    def basic_sim(self):
-        self.time = 0
-        self.times = []
+    #if trace_path is given the trace is streamed to files in that directory rather than held in memory
+    #recording_policy is a trace_store.RecordingPolicy or the name of a preset, by default everything is recorded
+    #if cost_limit is given, the simulation stops early once the cost accumulated by the attached online evaluator exceeds it
+    #if checkpoint_interval is given, the state of the simulation is saved to self.checkpoints every checkpoint_interval timesteps, see checkpoint.py
+    #if resume is True, the simulation carries on from its current state (eg after restore_state) rather than starting again, keeping the existing trace
+    #if checkpoint_path is given, each checkpoint is also saved to that file (replacing the last), so an interrupted run can be resumed with checkpoint.load_checkpoint
+    #if end_time is given, the simulation pauses at that time and the trace is left open, so it can be saved or carried on with resume=True
+    def basic_sim(self,trace_path=None,recording_policy=None,cost_limit=None,checkpoint_interval=None,resume=False,checkpoint_path=None,end_time=None):
+        self.stopped_early = False #set if the simulation was stopped by the cost limit
         final_time = self.stop_simulation_time #determine when the simulation will end
-        self.vehicle_logging_init() #initialise vehicle logging
-        self.node_logging_init() #initialise node logging
-        #create lists to store latitudes,longitudes and names of vehicles over time as lists of lists
+        if end_time is None or end_time>final_time:
+            end_time = final_time
+        if recording_policy is None:
+            if resume:
+                recording_policy = self.recording_policy #keep recording the same data
+            else:
+                recording_policy = trace_store.RecordingPolicy()
+        elif isinstance(recording_policy,str):
+            recording_policy = trace_store.recording_policy_preset(recording_policy)
+        self.recording_policy = recording_policy
+        if resume==False:
+            self.time = 0
+            if self.instrument is not None:
+                self.instrument.reset() #values are recorded from the start of this run
+            self.trace_logging_init(final_time,trace_path) #initialise vehicle and node logging
+            if self.online_evaluator is not None:
+                self.online_evaluator.reset() #costs are accumulated from the start of this run
+            self.checkpoint_interval = checkpoint_interval
+            self.checkpoints = [] #saved states, in order of time
+            if checkpoint_interval is not None:
+                self.save_checkpoint(checkpoint_path) #the initial state, so any change can be rerun
+        elif checkpoint_interval is not None:
+            self.checkpoint_interval = checkpoint_interval
         old_real_time = time.time() 
-        while self.time<final_time:#till we reach the specified time
+        while self.time<end_time:#till we reach the specified time
             self.update_time() #run the simulation
-            self.times.append(self.time) #store the current time
+            self.trace.record_time(self.time) #store the current time
             self.get_vehicle_data_at_time() #extract vehicle data at the current time
             self.get_node_data_at_time() #extract node data at the current time
-            print("TIME ", self.time,'step took time ',time.time()-old_real_time)
-            old_real_time = time.time()
-        print("number of passengers who could reach their destination ",self.num_successful_agents)
-        print("number of passengers who failed to reach their destination ",self.num_failed_agents)
-        return self.times,self.vehicle_latitudes,self.vehicle_longitudes,self.store_vehicle_names,self.vehicle_passengers,self.node_passengers,self.num_failed_agents,self.num_successful_agents,final_time #return relevant data from the simulation to the calling code
+            if self.verbose>=1:
+                new_real_time = time.time()
+                self.event_log.event(event_log.VERBOSE,'step_finished',self.time,seconds=new_real_time-old_real_time)
+                old_real_time = new_real_time
+            if self.checkpoint_interval is not None and self.time%self.checkpoint_interval==0:
+                self.save_checkpoint(checkpoint_path)
+            if cost_limit is not None and self.online_evaluator.partial_cost()>cost_limit:
+                self.event_log.event(event_log.SUMMARY,'cost_limit_exceeded',self.time,cost_limit=cost_limit)
+                self.stopped_early = True
+                break
+        if self.time<final_time and self.stopped_early==False: #paused at end_time, the trace is finished when the simulation is
+            return self.trace,self.num_failed_agents,self.num_successful_agents,final_time
+        self.trace = self.trace.finish() #trim the trace down to the data recorded, or finish writing it to disk
+        self.times = self.trace.times
+        self.event_log.event(event_log.SUMMARY,'simulation_finished',self.time,successful_passengers=self.num_successful_agents,failed_passengers=self.num_failed_agents)
+        self.event_log.flush()
+        return self.trace,self.num_failed_agents,self.num_successful_agents,final_time #return relevant data from the simulation to the calling code
         
-    #class to initialise class variables to store data about the vehicles as lists of lists
-    def vehicle_logging_init(self):
-        self.vehicle_latitudes = []
-        self.vehicle_longitudes = []
-        self.store_vehicle_names = []
-        self.vehicle_passengers = []
-
-    #class to initalise class variables to store data about nodes as lists of lists
-    def node_logging_init(self):
-        self.node_passengers = []
-
-    #get relevant data about all vehicles in the network at the present time and store them in lists
+    #keep the current state of the simulation in self.checkpoints, also saving it to checkpoint_path if given
+    def save_checkpoint(self,checkpoint_path=None):
+        state = self.capture_state()
+        self.checkpoints.append(state)
+        if checkpoint_path is not None:
+            checkpoint.save_checkpoint(self,checkpoint_path,state)
+
+    #create the trace store used to log data about vehicles and nodes, one row per timestep up to final_time
+    def trace_logging_init(self,final_time,trace_path=None):
+        self.checkpoint_trace_rows = {} #rows of an earlier trace saved with checkpoints are not part of this one
+        if trace_path is None:
+            self.trace = trace_store.TraceStore(final_time,len(self.nodes),self.vehicle_names,record_node_loads=self.recording_policy.record_node_loads)
+        else:
+            self.trace = trace_store.MemmapTraceWriter(trace_path,final_time,len(self.nodes),self.vehicle_names,record_node_loads=self.recording_policy.record_node_loads)
+
+    #get relevant data about all vehicles in the network at the present time and store them in the trace
+    #data the recording policy does not want at this timestep is not calculated, and stored as nan
     def get_vehicle_data_at_time(self):
-        current_vehicle_latitudes = []
-        current_vehicle_longitudes = []
-        current_vehicle_names = []
-        current_vehicle_passenger_counts = []
-        for vehicle in self.vehicles:
-            #extract and store the data at the current time in a list
-            latitude,longitude = vehicle.get_coordinates() #get the latitude, longitude and direction of the vehicle
-            current_vehicle_latitudes.append(latitude)
-            current_vehicle_longitudes.append(longitude)
-            current_vehicle_names.append(vehicle.name)
-            current_vehicle_passenger_counts.append(vehicle.count_agents())
-            if self.verbose>=1:
-                print('vehicle ',vehicle.name) #DEBUG
-                print('num passengers ',vehicle.count_agents())
-            #print(longitude) #DEBUG
-        #and store that list in a list containing data for all time
-        self.vehicle_latitudes.append(current_vehicle_latitudes)
-        self.vehicle_longitudes.append(current_vehicle_longitudes)
-        self.store_vehicle_names.append(current_vehicle_names)
-        self.vehicle_passengers.append(current_vehicle_passenger_counts)
-
-    #get relevant data about all nodes in the network at the present time and store them in lists
+        index = self.trace.num_times-1 #index of the timestep being recorded
+        if self.recording_policy.record_vehicles_at(index)==False:
+            return #nothing about vehicles is recorded at this timestep
+        num_vehicles = len(self.vehicles)
+        current_vehicle_ids = [vehicle.id for vehicle in self.vehicles]
+        if self.recording_policy.record_positions_at(index):
+            current_vehicle_latitudes = []
+            current_vehicle_longitudes = []
+            for vehicle in self.vehicles:
+                latitude,longitude = vehicle.get_coordinates() #get the latitude, longitude and direction of the vehicle
+                current_vehicle_latitudes.append(latitude)
+                current_vehicle_longitudes.append(longitude)
+        else:
+            current_vehicle_latitudes = np.full(num_vehicles,np.nan)
+            current_vehicle_longitudes = current_vehicle_latitudes
+        if self.recording_policy.record_vehicle_passengers:
+            current_vehicle_passenger_counts = [vehicle.count_agents() for vehicle in self.vehicles]
+        else:
+            current_vehicle_passenger_counts = np.full(num_vehicles,np.nan)
+        if self.verbose>=2:
+            for vehicle in self.vehicles:
+                self.event_log.event(event_log.DEBUG,'vehicle_passengers',self.time,vehicle=vehicle.name,passengers=vehicle.count_agents())
+        #and store the data for this timestep in the trace
+        self.trace.record_vehicles(current_vehicle_ids,current_vehicle_latitudes,current_vehicle_longitudes,current_vehicle_passenger_counts)
+
+    #get relevant data about all nodes in the network at the present time and store them in the trace
     def get_node_data_at_time(self):
-        current_node_passenger_counts = []
-        for node in self.nodes:
-            current_node_passenger_counts.append(node.count_agents())
-        self.node_passengers.append(current_node_passenger_counts)
+        if self.recording_policy.record_node_loads==False:
+            return #node loads are left at zero
+        current_node_passenger_counts = [node.count_agents() for node in self.nodes]
+        self.trace.record_nodes(current_node_passenger_counts)
                    
     #call the correct schedule generation code based on the mode we are using
     def create_schedules(self):
@@ -684,6 +914,8 @@ class Network:
             self.create_schedules_simple()
         elif self.schedule_type == "complex":
             self.create_schedules_complex()
+        elif self.schedule_type == "timetable":
+            self.create_schedules_timetable()
         else:
             print(self.schedule_type,' is not a valid schedule type')
 
@@ -693,14 +925,12 @@ class Network:
         #extract info about the segments
         segment_routes = self.segment_csv["Route"].to_list() #extract the name of the route (start-end)
         segment_modifiers = self.segment_csv["Modifier"].to_list() #extract the modifier of the route description(eg, fast, semi-fast)
-        segment_txt_schedules = self.segment_csv["Schedule"].to_list() #extract the actual schedule text of the segment
-        segment_reverse_txt_schedules = [] #reverse schedule txts
+        segment_forward_nodes = loader.split_lists(self.segment_csv["Schedule"]) #extract the nodes of the segment from the schedule text, all segments at once
         segment_names = [] #names of the segments
         segment_reverse_names = [] #names of the reverse segments
         num_segments = len(segment_routes) #how many segments are there
-        #calculate names and schedules of segments and their reverses
+        #calculate names of segments and their reverses
         for i in range(num_segments):
-            segment_reverse_txt_schedules.append(reverse_schedule_list_txt(segment_txt_schedules[i])) #determine the reverse schedule
             #determine names of segments
             if segment_modifiers[i]=="":
                 new_segment_name = segment_routes[i]
@@ -713,36 +943,34 @@ class Network:
             segment_reverse_names.append(reverse_segment_name)
         #merge regular and reverse list
         segment_names = segment_names + segment_reverse_names
-        segment_txt_schedules = segment_txt_schedules + segment_reverse_txt_schedules
-        #extract node names from the segments
-        all_segment_nodes = []
-        for i in range(num_segments*2):
-            segment_nodes = extract_schedule_list_txt(segment_txt_schedules[i])
-            all_segment_nodes.append(segment_nodes)
+        all_segment_nodes = segment_forward_nodes + [segment_nodes[::-1] for segment_nodes in segment_forward_nodes] #reverse segments visit the nodes backwards
+        segment_ids = {} #index of the first segment with each name
+        for i,segment_name in enumerate(segment_names):
+            segment_ids.setdefault(segment_name,i)
         
         #now that we have determined the nodes making up a segment
         #we need to combine the segments into schedules
         self.schedule_names = self.schedule_csv["Name"].to_list() #extract the name of schedules (a route that a vehicle will perform)
-        self.schedule_gaps = np.array(self.schedule_csv["Gap"].to_list()) #extract the gap in time (in minutes) between services along a particular route
-        self.schedule_offsets = np.array(self.schedule_csv["Offset"].to_list()) #extract the offset from the start of time (in minutes) and when the first service occurs
-        self.schedule_finish = np.array(self.schedule_csv["Finish"].to_list()) #time at which the last service of a schedule may depart
-        schedule_segments_texts = self.schedule_csv["Schedule Segments"].to_list() #extract the raw text that makes up a schedule as a list of segmentss   
+        #extract the gap in time (in minutes) between services along a particular route, the offset from the start of time (in minutes) and when the first service occurs
+        #and the time at which the last service of a schedule may depart
+        self.schedule_gaps,self.schedule_offsets,self.schedule_finish = loader.load_schedule_times(self.schedule_csv)
+        schedule_segments = loader.split_lists(self.schedule_csv["Schedule Segments"]) #extract the segments that make up each schedule
         self.schedules = [] #list to store schedule objects
         schedule_strings = [] #list of schedule strings in the simple format
         num_schedules = len(self.schedule_names)
         for i in range(num_schedules):
             #for each schedule, extract the segments of the schedule
-            segments_in_schedule = extract_schedule_list_txt(schedule_segments_texts[i]) #we can reuse this function as it extracts any comma seperated valued list
+            segments_in_schedule = schedule_segments[i]
             num_segments = len(segments_in_schedule)
             first_segment = True
             for j in range(num_segments):
                 try:
-                    segment_id =  segment_names.index(segments_in_schedule[j])
-                except:
+                    segment_id = segment_ids[segments_in_schedule[j]]
+                except KeyError:
                     print('error cannot find "',segments_in_schedule[j], '" in list of segment names')
                 else:
                     #if we can find the segment ids
-                    segment_nodes = copy.deepcopy(all_segment_nodes[segment_id]) #copy to prevent modifying originals
+                    segment_nodes = list(all_segment_nodes[segment_id]) #copy to prevent modifying originals
                     if first_segment==True:
                         #initial list of nodes is just the segment nodes
                         nodes = segment_nodes
@@ -766,39 +994,51 @@ class Network:
             self.schedules.append(self.create_schedule(self.schedule_names[i],schedule_strings[i])) #create a schedule object for each schedule
         #create the dispatch schedule
     
+    #create the timetable of each schedule, shared by the nodes it stops at, and dispatch vehicles from it
     def create_dispatch_schedule(self):
         num_schedules = len(self.schedule_names)
-        self.dispatch_schedule2 = []
-        for i in range(num_schedules):
-            #create the dispatch schedule for each particular schedule
-            single_dispatch_schedule = []
-            service_time = self.schedule_offsets[i] #extract the starting time of a service
-            finish_time = self.schedule_finish[i] #and the last time at which a service can start
-            service_gap = self.schedule_gaps[i]
-            while service_time<=finish_time:
-                single_dispatch_schedule.append(service_time) #add the time of the service to the dispatch schedule
-                service_time = service_time + service_gap #calculate when the next service will occur
-            #once we have added all the departure times for this service, store it in the overall dispatch schedules
-            self.dispatch_schedule2.append(single_dispatch_schedule)
+        self.dispatch_cursors = [0]*num_schedules #index of the next service to dispatch for each schedule
+        if self.schedule_type=="timetable":
+            #timetabled services depart at the listed times rather than at regular gaps
+            self.timetables = [schedule.Timetable(departures) for departures in self.schedule_departures]
+        else:
+            #services depart every gap minutes from the offset till the finish time
+            self.timetables = [schedule.Timetable(schedule.regular_departures(self.schedule_offsets[i],self.schedule_gaps[i],self.schedule_finish[i])) for i in range(num_schedules)]
+        self.dispatch_schedule2 = [timetable.departures for timetable in self.timetables] #departure times of each schedule
 
 
     #create the schedule and functionality needed for scheduling using the simple method
     def create_schedules_simple(self):
         self.schedule_names = self.schedule_csv["Name"].to_list() #extract the name of schedules (a route that a vehicle will perform)
-        self.schedule_gaps = np.array(self.schedule_csv["Gap"].to_list()) #extract the gap in time (in minutes) between services along a particular route
-        self.schedule_offsets = np.array(self.schedule_csv["Offset"].to_list()) #extract the offset from the start of time (in minutes) and when the first service occurs
-        self.schedule_finish = np.array(self.schedule_csv["Finish"].to_list())
-        schedule_texts = self.schedule_csv["Schedule"].to_list() #extract the raw text that makes up a schedule
+        self.schedule_gaps,self.schedule_offsets,self.schedule_finish = loader.load_schedule_times(self.schedule_csv) #gap between services, time of the first service and time of the last service
+        schedule_node_names = loader.split_lists(self.schedule_csv["Schedule"]) #extract the nodes of each schedule from its raw text, all schedules at once
         self.schedules = [] #list to store the schedule objects
         num_schedules = len(self.schedule_names)
 
         for i in range(num_schedules):
-            self.schedules.append(self.create_schedule(self.schedule_names[i],schedule_texts[i])) #create a schedule object for each schedule
+            self.schedules.append(self.create_schedule_from_node_names(self.schedule_names[i],schedule_node_names[i])) #create a schedule object for each schedule
         
 
+    #create the schedules for the timetable method, simple schedules with an explicit list of departure times (eg imported from GTFS, see gtfs.py)
+    #gaps, offsets and finish times are summaries of the departures (median gap, first and last departure), the dispatch schedule uses the departures themselves
+    def create_schedules_timetable(self):
+        self.schedule_names = self.schedule_csv["Name"].to_list()
+        self.schedule_departures = loader.load_departures(self.schedule_csv)
+        self.schedule_gaps = np.array([max(1,np.median(np.diff(departures))) if len(departures)>1 else 1 for departures in self.schedule_departures])
+        self.schedule_offsets = np.array([departures[0] for departures in self.schedule_departures])
+        self.schedule_finish = np.array([departures[-1] for departures in self.schedule_departures])
+        schedule_node_names = loader.split_lists(self.schedule_csv["Schedule"])
+        self.schedules = []
+        for i in range(len(self.schedule_names)):
+            self.schedules.append(self.create_schedule_from_node_names(self.schedule_names[i],schedule_node_names[i]))
+
     #create a schedule object from a name and a text string
     def create_schedule(self,name,schedule_string):
         node_names = extract_schedule_list_txt(schedule_string) #extract node names from the schedule string
+        return self.create_schedule_from_node_names(name,node_names)
+
+    #create a schedule object from a name and the list of names of the nodes it visits
+    def create_schedule_from_node_names(self,name,node_names):
         num_nodes = len(node_names)
         node_arrival_times = np.zeros(num_nodes)#arrival times at each node, starting from 0 at the starting node
         node_counter = 0 #which node is currently the next destination
@@ -807,7 +1047,10 @@ class Network:
         #add nodes and edges to the schedule
         for node_name in node_names:
             #when processing the starting node, we just add the node to the schedule
-            node = self.nodes[self.get_node_index(node_name)]
+            node_index = self.node_index.get(node_name)
+            if node_index is None:
+                raise ValueError('schedule ' + str(name) + ' visits ' + repr(node_name) + ' which is not a node of this network')
+            node = self.nodes[node_index]
             if previous_node_name == "":
                 new_schedule.add_start_node(node,node_name)
                 previous_node = node
@@ -815,7 +1058,10 @@ class Network:
                 node_counter += 1 #we will now be processing the next node
             else:
                 edge_name = previous_node_name + ' to ' + node_name #calculate the name of the edge between these two nodes
-                edge = self.edges[self.get_edge_index(edge_name)]
+                edge_index = self.edge_index.get(edge_name)
+                if edge_index is None:
+                    raise ValueError('schedule ' + str(name) + ' uses the edge ' + repr(edge_name) + ' which is not an edge of this network')
+                edge = self.edges[edge_index]
                 edge_time = edge.provide_travel_time()
                 new_schedule.add_destination(node,edge,node_name)
                 node_arrival_times[node_counter] = node_arrival_times[node_counter-1] + edge_time
@@ -828,46 +1074,34 @@ class Network:
         return new_schedule
 
     #determine which nodes have which schedules present
+    #each schedule is walked once, and every node it stops at is given a reference to the schedules timetable
     def determine_which_nodes_have_schedule(self):
-        #go through all the nodes
-        for i,node_name in enumerate(self.node_names):
-            #find all the nodes
-            for j,schedule in enumerate(self.schedules):
-                #find out if that node name is in that schedule and if so return nodes 
-                node_found,search_node_time,nodes_after,node_times_after = schedule.node_name_in_schedule(node_name)
-                if node_found == True:
-                    #if we found the node in a schedule, add that schedule to the list of schedules stopping at that node
-                    self.nodes[i].add_stopping_schedule(self.schedule_names[j],self.dispatch_schedule2[j],search_node_time,nodes_after,node_times_after)
+        for j,schedule in enumerate(self.schedules):
+            for node_name,position in schedule.first_node_positions().items():
+                search_node_time,nodes_after,node_times_after = schedule.nodes_after_position(position)
+                self.nodes[self.get_node_index(node_name)].add_stopping_schedule(self.schedule_names[j],self.timetables[j],search_node_time,nodes_after,node_times_after)
 
     #add an edge between specified start and end node            
     def add_edge(self,start_node,end_node,travel_time):
         name = start_node + ' to ' + end_node
-        while name in self.edge_names:#prevent duplicate names
+        while name in self.edge_index:#prevent duplicate names
             #note, that duplicate edge names cause problems with the creation of schedules, so try and avoid them
-            warnings.warn('duplicate edge name ', name, ' this is poorly supported, try and only have one edge directly between two nodes')
+            warnings.warn('duplicate edge name ' + name + ' this is poorly supported, try and only have one edge directly between two nodes')
             name = name + ' alt '
+        self.edge_index[name] = len(self.edge_names)
         self.edge_names.append(name)#update the list of edge names
         new_edge = Edge(name,start_node,end_node,travel_time)
         self.edges.append(new_edge)#and create the new edge
         #let's also add the edge to the list of edges at the node it starts from
-        i = 0 #temporary counter variable
-        for node_name in self.node_names:
-            if node_name == start_node:#if node names matches with the starting node
-                #add edge to the node
-                self.nodes[i].add_edge(new_edge)
-            else:
-                pass
-            i = i+1 
-            #increment the counter
-            pass     
+        self.nodes[self.node_index[start_node]].add_edge(new_edge)
 
     #find the time taken to travel from the specified node to all other nodes in the network
     #note, this is making the assumption that all nodes are always traversible, the ideal case which does not apply for real passengers
     def find_distance_dijistraka(self,start_node_name):
         #try and find the starting node in the list of all nodes
         try:
-            start_index = self.node_names.index(start_node_name)
-        except ValueError:
+            start_index = self.node_index[start_node_name]
+        except KeyError:
             #handle case where starting name not in list of names
             warnings.warn('start_node_name  ', start_node_name, 'is not in the list of node names in this network')
             return False #return false to indicate error
@@ -886,8 +1120,8 @@ class Network:
             num_edges = len(edge_times)
             for i in range(num_edges):
                 try:
-                    destination_index = self.node_names.index(edge_destinations[i])
-                except ValueError:
+                    destination_index = self.node_index[edge_destinations[i]]
+                except KeyError:
                     #handle case where destination name not in list of names
                     print('WARNING destination name  ', edge_destinations[i], 'is not in the list of node names in this network')
                     continue #skip remaining computation steps
@@ -904,8 +1138,8 @@ class Network:
     def find_distance_dijistraka_path(self,start_node_name):
         #try and find the starting node in the list of all nodes
         try:
-            start_index = self.node_names.index(start_node_name)
-        except ValueError:
+            start_index = self.node_index[start_node_name]
+        except KeyError:
             #handle case where starting name not in list of names
             print('WARNING start_node_name  ', start_node_name, 'is not in the list of node names in this network')
             return False #return false to indicate error
@@ -926,8 +1160,8 @@ class Network:
             num_edges = len(edge_times)
             for i in range(num_edges):
                 try:
-                    destination_index = self.node_names.index(edge_destinations[i])
-                except ValueError:
+                    destination_index = self.node_index[edge_destinations[i]]
+                except KeyError:
                     #handle case where destination name not in list of names
                     print('WARNING destination name', edge_destinations[i], 'is not in the list of node names in this network')
                     continue #skip remaining computation steps
@@ -997,9 +1231,9 @@ class Network:
     def get_node_index(self,node_name):
         #try and find the starting node in the list of all nodes
         try:
-            index = self.node_names.index(node_name)
+            index = self.node_index[node_name]
             return index
-        except ValueError:
+        except KeyError:
             #handle case where starting name not in list of names
             print('node_name  ', node_name, 'is not in the list of node names in this network')
             return -1 #return -1 to indicate error
@@ -1008,9 +1242,9 @@ class Network:
     def get_edge_index(self,edge_name):
         #try and find the starting node in the list of all nodes
         try:
-            index = self.edge_names.index(edge_name)
+            index = self.edge_index[edge_name]
             return index
-        except ValueError:
+        except KeyError:
             #handle case where starting name not in list of names
             print('edge_name  ', edge_name, 'is not in the list of edge names in this network')
             return -1 #return -1 to indicate error
@@ -1079,6 +1313,11 @@ class Network:
         for i in range(num_schedules):
             self.schedules[i].test_schedule()
         
+    #change the verbosity, both for the remaining prints and the event log
+    def set_verbose(self,verbose):
+        self.verbose = verbose
+        self.event_log.level = verbose
+
     def test_verbose(self):
         print('verbosity = ',self.verbose)
         if self.verbose==0:
@@ -1113,7 +1352,11 @@ def gravity_assignment(starts,stops,distances,distance_exponent,flat_distance,ve
 
                 trip_importance[k] = ((destination_importance_factors[k]*stops[k])/distance_between)
         
-        num_trips = (trip_importance/np.sum(trip_importance))*this_node_starts #calculate the number of trips from this node to all other nodes
+        total_importance = np.sum(trip_importance)
+        if total_importance>0:
+            num_trips = (trip_importance/total_importance)*this_node_starts #calculate the number of trips from this node to all other nodes
+        else:
+            num_trips = np.zeros(num_nodes) #no round trip is possible from this node (eg the end of a one way line), so no trips start here
         list_trips.append(num_trips)
         
     calc_trips = np.stack(list_trips)#merge the number of trips from each node to each destination into a numpy array
@@ -1121,8 +1364,9 @@ def gravity_assignment(starts,stops,distances,distance_exponent,flat_distance,ve
     while True:
         calc_stops = np.sum(calc_trips,0)
         calc_starts = np.sum(calc_trips,1)
-        stop_correction_factor = stops/calc_stops
-        start_correction_factor = starts/calc_starts
+        #nodes which no trip can reach or leave are left as they are, rather than dividing by zero
+        stop_correction_factor = np.divide(stops,calc_stops,out=np.ones(num_nodes),where=calc_stops>0)
+        start_correction_factor = np.divide(starts,calc_starts,out=np.ones(num_nodes),where=calc_starts>0)
         abs_start_error = np.abs(start_correction_factor-1)
         abs_stop_error = np.abs(stop_correction_factor-1)
         if (max(abs_stop_error)<required_accuracy) and (max(abs_start_error)<required_accuracy):
@@ -1141,7 +1385,7 @@ def gravity_assignment(starts,stops,distances,distance_exponent,flat_distance,ve
                 calc_trips[j,k] = calc_trips[j,k]*stop_correction_factor[k] #multiply the number of trips going to each destination node by the stop correction factor of that destination
         calc_stops = np.sum(calc_trips,0)
         calc_starts = np.sum(calc_trips,1)
-        start_correction_factor = starts/calc_starts
+        start_correction_factor = np.divide(starts,calc_starts,out=np.ones(num_nodes),where=calc_starts>0)
         #print('start correction factors ',start_correction_factor)
         #now apply the start correction factor to traffic
         for j in range(num_nodes):#go through starting node
@@ -1171,65 +1415,22 @@ def gravity_assignment(starts,stops,distances,distance_exponent,flat_distance,ve
 
 
 #extract latitude and longitude from a string of coordinates (in the format provided by google maps)
+#to parse a whole column at once, use loader.parse_coordinates
 def extract_coordinates(coordinates):
-    #extract the latitude and longitude strings
-    latitude = ''
-    longitude = ''
-    extracting_longitude = False
-    i = 0
-    while i < len(coordinates):
-        if coordinates[i] == ',':
-            extracting_longitude = True
-            i = i + 2
-        else:
-            if extracting_longitude:
-                longitude += coordinates[i]
-            else:
-                latitude += coordinates[i]
-            i = i + 1
-        
+    latitude,longitude = coordinates.split(',',1)
     return float(latitude),float(longitude)
 
 #extract a list of nodes in a schedule from a text string
 def extract_schedule_list_txt(schedule_string):
-    new_node = []
-    nodes = []
-    for letter in schedule_string:
-        if letter==',': #move onto the next node when the delimiter is reached
-            nodes.append("".join(new_node))#append the node name to the list of nodes
-            new_node = [] #reset the node
-        else:
-            new_node.append(letter) #append the letter to the node name
-    #also add on the final node (after the last comma)
-    nodes.append("".join(new_node))
-    return nodes
+    return schedule_string.split(',')
 
 #reverse the order of nodes in a schedule string
 def reverse_schedule_list_txt(schedule_string):
-    nodes = extract_schedule_list_txt(schedule_string) #get the list of node names
-    nodes.reverse() #reverse the list of nodes
-    #reconvert it back into a text string
-    schedule_string = ""
-    for node in nodes:
-        schedule_string = schedule_string + node + ','
-    #remove the trailing comma
-    schedule_string = schedule_string[:-1]
-    return schedule_string
-
-#reverse the route name of a segment
-def reverse_segment_route(route_name_string):
-    start_node_name = ""
-    end_node_name = ""
-    start_node_extracted = False
-    for letter in route_name_string:
-        if start_node_extracted==False:
-            if letter=='-':
-                start_node_extracted = True
-            else:
-                start_node_name = start_node_name + letter
-        else:
-            end_node_name = end_node_name + letter
+    return ','.join(reversed(schedule_string.split(',')))
 
+#reverse the route name of a segment, the start node is everything before the first '-' and the end node everything after
+def reverse_segment_route(route_name_string):
+    start_node_name,separator,end_node_name = route_name_string.partition('-')
     reverse_name = end_node_name + "-" + start_node_name
     return reverse_name
 
@@ -1244,9 +1445,4 @@ def random_true(chance):
         return False
 #turn a list of nodes into a schedule string
 def make_schedule_string(nodes):
-    schedule_string = ""
-    for node in nodes:
-        #add each node name to the schedule string
-        schedule_string = schedule_string + node + ','
-    schedule_string = schedule_string[:-1] #remove trailing comma
-    return schedule_string
+    return ','.join(nodes)
@@ -0,0 +1,276 @@
+#optimiser.py
+#simulation in the loop optimisation of the gap between services on each schedule
+
+import numpy as np #for large scale mathematical operations
+import pandas as pd
+import multiprocessing as mp #for evaluating candidates in parallel
+import contextlib as contextlib #for silencing the simulation printout in worker processes
+import os as os
+import time as time
+import hashlib as hashlib #for hashing evaluation cache keys
+import json as json #for saving the evaluation cache
+import network as n
+import evaluator as e
+
+#each worker process builds its own network once, and reuses it for every candidate it evaluates
+worker_network = None
+worker_evaluator = None
+worker_seed = None
+
+#setup a worker process, network_kwargs are the keyword arguments used to construct the network
+def init_worker(network_kwargs,eval_csv,parameters_csv,seed):
+    global worker_network,worker_evaluator,worker_seed
+    with open(os.devnull,'w') as devnull, contextlib.redirect_stdout(devnull):
+        worker_network = n.Network(**network_kwargs)
+    worker_evaluator = e.OnlineEvaluator(eval_csv,parameters_csv)
+    worker_network.attach_evaluator(worker_evaluator)
+    worker_seed = seed
+
+#simulate the network with a candidate set of schedule gaps, returning its cost and whether the simulation ran to completion
+#the simulation is abandoned once its cost exceeds cost_limit (if not None), as it can no longer beat the best candidate
+def evaluate_candidate(candidate):
+    gaps,cost_limit = candidate
+    worker_network.apply_schedule_gaps(gaps,seed=worker_seed) #every candidate sees the same passengers
+    with open(os.devnull,'w') as devnull, contextlib.redirect_stdout(devnull):
+        worker_network.basic_sim(recording_policy='none',cost_limit=cost_limit)
+    return worker_evaluator.partial_cost(),(worker_network.stopped_early==False)
+
+#add a csv (or the empty string used for missing csvs) to a hash
+def hash_csv(hasher,csv):
+    if isinstance(csv,pd.DataFrame):
+        hasher.update(','.join([str(column) for column in csv.columns]).encode())
+        hasher.update(pd.util.hash_pandas_object(csv,index=True).values.tobytes())
+    else:
+        hasher.update(str(csv).encode())
+
+#hash of everything other than the schedule gaps which determines the result of a simulation
+#this is the network, the schedule set and their offsets, the demand scenario, the parameters and the random seed
+def scenario_key(network_kwargs,seed):
+    hasher = hashlib.sha256()
+    for csv_name in ('nodes_csv','edges_csv','segment_csv','parameters_csv','eval_csv','scenario_csv'):
+        hash_csv(hasher,network_kwargs.get(csv_name,''))
+    hash_csv(hasher,network_kwargs['schedule_csv'].drop(columns=["Gap"])) #gaps are part of each candidate
+    for option_name in ('schedule_type','agent_mode'):
+        hasher.update(str(network_kwargs.get(option_name,'')).encode())
+    hasher.update(str(seed).encode())
+    return hasher.hexdigest()
+
+#cache of simulation results, keyed by the scenario key and the schedule gaps
+#results of simulations stopped early are also kept, as their cost is a lower bound on the full cost
+class EvaluationCache:
+    #if path is given, results are loaded from and saved to that json file, so they can be reused between optimisation runs
+    def __init__(self,path=None):
+        self.path = path
+        self.results = {} #key -> [cost,completed]
+        self.num_hits = 0
+        self.num_misses = 0
+        if path is not None and os.path.exists(path):
+            with open(path,'r') as file:
+                self.results = json.load(file)
+
+    #key of a candidate set of gaps in a given scenario
+    def make_key(self,scenario,gaps):
+        return hashlib.sha256(scenario.encode() + np.asarray(gaps,dtype=np.int64).tobytes()).hexdigest()
+
+    #check whether a candidate needs simulating given the current cost limit
+    #returns (True,cost,completed) if the cached result is enough to judge the candidate, otherwise (False,None,None)
+    def lookup(self,key,cost_limit):
+        result = self.results.get(key)
+        if result is not None:
+            cost,completed = result
+            if completed or (cost_limit is not None and cost>cost_limit):
+                self.num_hits = self.num_hits + 1
+                return True,cost,completed
+        self.num_misses = self.num_misses + 1
+        return False,None,None
+
+    def store(self,key,cost,completed):
+        old_result = self.results.get(key)
+        if old_result is None or completed:
+            self.results[key] = [float(cost),bool(completed)]
+        elif old_result[1]==False and cost>old_result[0]:
+            self.results[key] = [float(cost),False] #a tighter lower bound
+
+    def save(self):
+        if self.path is not None:
+            with open(self.path,'w') as file:
+                json.dump(self.results,file)
+
+#cheap model of the simulated cost of a set of gaps, used to screen out candidates before simulating them
+#built on the henry_convex cost model, where each schedule costs schedule_cost/headway to operate and weighted_passengers*waiting_cost*headway/2 in waiting time
+#the simulated cost is fitted by least squares as a + b*(total operating cost) + c*(total waiting cost)
+class ConvexSurrogate:
+    def __init__(self,schedule_costs,weighted_passengers,agent_cost_waiting):
+        self.schedule_costs = np.asarray(schedule_costs)
+        self.weighted_passengers = np.asarray(weighted_passengers)
+        self.agent_cost_waiting = agent_cost_waiting
+        self.coefficients = None #set once fitted
+
+    #features of each row of a (candidate x schedule) array of gaps
+    def features(self,gaps):
+        headways = np.atleast_2d(gaps)/60 #gaps in hours
+        operating_cost = np.sum(self.schedule_costs/headways,axis=1)
+        waiting_cost = np.sum(self.weighted_passengers*self.agent_cost_waiting*headways/2,axis=1)
+        return np.column_stack((np.ones(len(headways)),operating_cost,waiting_cost))
+
+    #fit to simulated costs, only done once there are more results than coefficients
+    #a fit where either cost term has a negative weight does not follow the convex model, and is not used
+    def fit(self,gaps,costs):
+        self.coefficients = None
+        if len(costs)<=3:
+            return False
+        coefficients = np.linalg.lstsq(self.features(gaps),np.asarray(costs),rcond=None)[0]
+        if np.any(coefficients[1:]<0):
+            return False
+        self.coefficients = coefficients
+        return True
+
+    def predict(self,gaps):
+        return self.features(gaps)@self.coefficients
+
+#optimises schedule gaps by pattern search, starting from the henry_convex solution
+#each iteration tries increasing and decreasing the gap of every schedule by a fraction of its current value
+#the best improving candidate is moved to, if none improve, the fraction is halved, stopping once it falls below min_fraction
+#candidates already simulated are taken from the evaluation cache, and once enough results exist candidates the surrogate predicts
+#to be more than surrogate_margin worse than the incumbent are not simulated
+class FrequencyOptimiser:
+    #network_kwargs are the keyword arguments used to construct the network (as for network.Network)
+    def __init__(self,network_kwargs,num_workers=None,seed=30699,min_gap=1,max_gap=120,verbose=1,cache=None,use_surrogate=True,surrogate_margin=0.05):
+        self.network_kwargs = dict(network_kwargs)
+        self.network_kwargs['verbose'] = 0 #worker networks are silent
+        self.num_workers = num_workers #number of worker processes, None uses one per cpu
+        self.seed = seed #random seed used for every simulation, so candidates are compared on the same passengers
+        self.min_gap = min_gap #smallest allowed gap between services (minutes)
+        self.max_gap = max_gap #largest allowed gap between services (minutes)
+        self.verbose = verbose
+        self.history = [] #(gaps,cost) of every improvement found
+        if cache is None:
+            cache = EvaluationCache()
+        self.cache = cache
+        self.scenario = scenario_key(self.network_kwargs,seed)
+        self.use_surrogate = use_surrogate
+        self.surrogate_margin = surrogate_margin
+        self.surrogate = None #created along with the convex gaps
+        self.simulated_gaps = [] #gaps and costs of completed simulations, used to fit the surrogate
+        self.simulated_costs = []
+
+    #get the schedule gaps produced by the henry_convex optimiser, which are used as the starting point
+    #this also sets up the surrogate model from the same cost terms
+    def convex_gaps(self):
+        convex_kwargs = dict(self.network_kwargs)
+        convex_kwargs['optimiser'] = 'henry_convex'
+        with open(os.devnull,'w') as devnull, contextlib.redirect_stdout(devnull):
+            convex_network = n.Network(**convex_kwargs)
+        schedule_costs,weighted_passengers = convex_network.calculate_convex_cost_terms()
+        self.surrogate = ConvexSurrogate(schedule_costs,weighted_passengers,convex_network.agent_cost_waiting)
+        return np.clip(convex_network.schedule_gaps,self.min_gap,self.max_gap)
+
+    #generate the candidates around the current gaps for a given step fraction
+    def generate_candidates(self,gaps,fraction):
+        candidates = []
+        for i,gap in enumerate(gaps):
+            step = max(1,int(round(gap*fraction))) #always change the gap by at least a minute
+            for new_gap in (gap-step,gap+step):
+                new_gap = min(max(new_gap,self.min_gap),self.max_gap)
+                if new_gap!=gap:
+                    candidate = gaps.copy()
+                    candidate[i] = new_gap
+                    candidates.append(candidate)
+        return candidates
+
+    #evaluate candidates, using the cache and surrogate where possible and simulating the rest in the worker pool
+    #returns (cost,completed) for each candidate, candidates screened out by the surrogate are returned as (inf,False)
+    def evaluate_candidates(self,pool,candidates,cost_limit):
+        results = [None]*len(candidates)
+        keys = [self.cache.make_key(self.scenario,candidate) for candidate in candidates]
+        to_simulate = []
+        for i,key in enumerate(keys):
+            found,cost,completed = self.cache.lookup(key,cost_limit)
+            if found:
+                results[i] = (cost,completed)
+            else:
+                to_simulate.append(i)
+        if cost_limit is not None and self.use_surrogate and self.surrogate is not None and len(to_simulate)>1:
+            if self.surrogate.fit(np.array(self.simulated_gaps),self.simulated_costs):
+                predicted_costs = self.surrogate.predict(np.array([candidates[i] for i in to_simulate]))
+                best_predicted = np.argmin(predicted_costs)
+                screened = []
+                for j,i in enumerate(to_simulate):
+                    if predicted_costs[j]>cost_limit*(1+self.surrogate_margin) and j!=best_predicted: #always simulate the most promising candidate
+                        results[i] = (np.inf,False)
+                    else:
+                        screened.append(i)
+                to_simulate = screened
+        simulated = pool.map(evaluate_candidate,[(candidates[i],cost_limit) for i in to_simulate])
+        for i,(cost,completed) in zip(to_simulate,simulated):
+            results[i] = (cost,completed)
+            self.cache.store(keys[i],cost,completed)
+            if completed:
+                self.simulated_gaps.append(candidates[i])
+                self.simulated_costs.append(cost)
+        return results,len(to_simulate)
+
+    #run the optimisation, returning the best gaps found and their cost
+    def optimise(self,initial_gaps=None,initial_fraction=0.5,min_fraction=0.05,max_iterations=20):
+        if initial_gaps is None or self.surrogate is None:
+            convex_gaps = self.convex_gaps()
+            if initial_gaps is None:
+                initial_gaps = convex_gaps
+        gaps = np.array(initial_gaps,dtype=int)
+        eval_csv = self.network_kwargs['eval_csv']
+        parameters_csv = self.network_kwargs['parameters_csv']
+        with mp.Pool(processes=self.num_workers,initializer=init_worker,initargs=(self.network_kwargs,eval_csv,parameters_csv,self.seed)) as pool:
+            results,num_simulated = self.evaluate_candidates(pool,[gaps],None)
+            cost,completed = results[0]
+            self.history = [(gaps.copy(),cost)]
+            if self.verbose>=1:
+                print('initial cost $',f'{cost:,.2f}')
+            fraction = initial_fraction
+            iteration = 0
+            while fraction>=min_fraction and iteration<max_iterations:
+                time1 = time.time()
+                candidates = self.generate_candidates(gaps,fraction)
+                results,num_simulated = self.evaluate_candidates(pool,candidates,cost)
+                best_index = -1
+                best_cost = cost
+                for i,(candidate_cost,candidate_completed) in enumerate(results):
+                    if candidate_completed and candidate_cost<best_cost:
+                        best_index = i
+                        best_cost = candidate_cost
+                if best_index>=0:
+                    gaps = candidates[best_index]
+                    cost = best_cost
+                    self.history.append((gaps.copy(),cost))
+                else:
+                    fraction = fraction/2 #no improvement at this step size, search more finely
+                iteration = iteration + 1
+                self.cache.save()
+                if self.verbose>=1:
+                    num_stopped = len(results) - sum([candidate_completed for candidate_cost,candidate_completed in results])
+                    print('iteration ',iteration,' cost $',f'{cost:,.2f}',' step fraction ',fraction,' candidates ',len(candidates),' simulated ',num_simulated,' not completed ',num_stopped,' took ',time.time()-time1,' seconds')
+        return gaps,cost
+
+#copy of a schedule csv with the gaps replaced, rows of the csv are in the same order as the gaps
+def updated_schedule_csv(schedule_csv,gaps):
+    new_schedule_csv = schedule_csv.copy()
+    new_schedule_csv["Gap"] = np.array(gaps,dtype=int)
+    return new_schedule_csv
+
+#optimise the sydney network and write the optimised schedule to a new csv
+def main():
+    network_kwargs = {
+        'nodes_csv':pd.read_csv('nodes_sydney.csv',thousands=r','),
+        'edges_csv':pd.read_csv('edges_sydney.csv',thousands=r','),
+        'schedule_csv':pd.read_csv('schedule_sydney.csv',thousands=r','),
+        'parameters_csv':pd.read_csv('parameters_sydney.csv',thousands=r','),
+        'eval_csv':pd.read_csv('eval_sydney.csv',thousands=r','),
+        'scenario_csv':pd.read_csv('ScenarioFixed.csv',thousands=r','),
+        'segment_csv':pd.read_csv('schedule_segments_sydney.csv',thousands=r',',keep_default_na=False),
+        'schedule_type':'complex'}
+    frequency_optimiser = FrequencyOptimiser(network_kwargs,cache=EvaluationCache('optimiser_cache.json'))
+    gaps,cost = frequency_optimiser.optimise()
+    print('optimised cost $',f'{cost:,.2f}')
+    updated_schedule_csv(network_kwargs['schedule_csv'],gaps).to_csv('schedule_sydney_optimised.csv',index=False)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+#playback.py
+#playback of a simulation, frames (the ready to draw data of one timestep) are prepared by a worker thread and drawn by the tk thread
+#tk can only be used from the thread running its mainloop, so the worker never touches the canvas
+
+import threading as threading #for preparing frames alongside the tk mainloop
+import queue as queue #for passing prepared frames to the tk thread
+import time as time
+import collections as collections #for the least recently used order of cached frames
+
+#worker thread which prepares frames in order, every step'th frame from start_index up to (but not including) num_frames, into a bounded queue
+#the queue holds at most max_frames frames, so the worker only runs a little ahead of the display and then blocks
+#prepare_frame(index) must not use tk, it is called from the worker thread
+class FrameWorker(threading.Thread):
+    def __init__(self,prepare_frame,start_index,num_frames,step=1,max_frames=8):
+        super().__init__(daemon=True) #don't keep the program open if the window is closed during playback
+        self.prepare_frame = prepare_frame
+        self.start_index = start_index
+        self.num_frames = num_frames
+        self.step = step #frames skipped to play faster, eg every 5th frame
+        self.frames = queue.Queue(maxsize=max_frames) #(index,frame) pairs, in order of index
+        self.playing = threading.Event() #cleared while paused, the worker waits on it rather than polling
+        self.playing.set()
+        self.stopped = threading.Event()
+        self.next_frame = None #frame taken from the queue which is not yet due
+        self.num_dropped = 0 #frames which were prepared but skipped as the display was behind
+
+    def run(self):
+        for index in range(self.start_index,self.num_frames,self.step):
+            self.playing.wait()
+            if self.stopped.is_set():
+                return
+            frame = self.prepare_frame(index)
+            self.frames.put((index,frame)) #blocks while the queue is full
+            if self.stopped.is_set():
+                return
+
+    def pause(self):
+        self.playing.clear()
+
+    def resume(self):
+        self.playing.set()
+
+    #stop preparing frames, the thread finishes shortly after
+    def stop(self):
+        self.stopped.set()
+        self.playing.set() #wake the worker if paused, so it sees it has been stopped
+        #empty the queue, so a worker blocked putting a frame can continue and see it has been stopped
+        while True:
+            try:
+                self.frames.get_nowait()
+            except queue.Empty:
+                break
+
+    #take the latest prepared frame with an index at most due_index, dropping older frames, so a display that is behind catches up
+    #returns (index,frame), or (-1,None) if no frame up to due_index has been prepared yet
+    def take_frame(self,due_index):
+        taken = (-1,None)
+        while True:
+            if self.next_frame is None:
+                try:
+                    self.next_frame = self.frames.get_nowait()
+                except queue.Empty:
+                    break
+            if self.next_frame[0]>due_index:
+                break #not due yet, keep it for later
+            if taken[1] is not None:
+                self.num_dropped = self.num_dropped + 1
+            taken = self.next_frame
+            self.next_frame = None
+        return taken
+
+#wall clock time of each frame of a playback, frame start_index is shown at start_time and every step'th frame follows every frame_time seconds
+#restarted from the current frame whenever the speed changes or playback resumes
+class PlaybackClock:
+    def __init__(self,start_index,frame_time,step=1):
+        self.restart(start_index,frame_time,step)
+
+    def restart(self,start_index,frame_time,step=1):
+        self.start_index = start_index
+        self.frame_time = frame_time
+        self.step = step
+        self.start_time = time.perf_counter()
+
+    #index of the frame which should be on screen now
+    def due_index(self):
+        return self.start_index + int((time.perf_counter()-self.start_time)/self.frame_time)*self.step
+
+    #seconds until a frame is due, 0 if it is already due
+    def time_until(self,index):
+        return max(0,self.start_time + (index-self.start_index)/self.step*self.frame_time - time.perf_counter())
+
+#cache of the most recently used prepared frames, shared by the tk thread and the playback threads
+#frames around the playback cursor are prefetched on a background thread, so seeking nearby or stepping back is immediate
+class FrameCache:
+    def __init__(self,prepare_frame,capacity=128):
+        self.prepare_frame = prepare_frame
+        self.capacity = capacity
+        self.frames = collections.OrderedDict() #index to frame, least recently used first
+        self.lock = threading.Lock()
+        self.prefetch_generation = 0 #increased by each prefetch, so older prefetches stop early
+
+    #get the frame of an index, preparing it if it is not cached
+    def get(self,index):
+        with self.lock:
+            frame = self.frames.get(index)
+            if frame is not None:
+                self.frames.move_to_end(index)
+                return frame
+        frame = self.prepare_frame(index) #outside the lock, so other threads can use the cache meanwhile
+        with self.lock:
+            self.frames[index] = frame
+            self.frames.move_to_end(index)
+            while len(self.frames)>self.capacity:
+                self.frames.popitem(last=False)
+        return frame
+
+    #prepare the frames of indices on a background thread, replacing any prefetch still running
+    def prefetch(self,indices):
+        with self.lock:
+            self.prefetch_generation = self.prefetch_generation + 1
+            generation = self.prefetch_generation
+            indices = [index for index in indices if index not in self.frames]
+        def run():
+            for index in indices:
+                if self.prefetch_generation!=generation:
+                    return
+                self.get(index)
+        threading.Thread(target=run,daemon=True).start()
+
+    #forget every frame, eg when the appearance of frames changes
+    def clear(self):
+        with self.lock:
+            self.frames.clear()
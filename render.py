@@ -7,6 +7,11 @@ import pandas as pd
 import numpy as np 
 import network as n
 import evaluator as e
+import loader as loader #for parsing node locations
+import canvas_pool as canvas_pool #for reusing canvas items between frames
+import playback as playback #for preparing simulation frames on a worker thread
+import style as style #for the default appearance and colour scales of the network
+import spatial_index as spatial_index #for finding the nodes on screen and grouping nearby nodes
 import warnings as warnings
 import cProfile as profile
 import pstats
@@ -29,23 +34,24 @@ class Display:
     #setup the constants which control the default physical appearance of the network display
     def setup_display_constants(self):
         #node constants 
-        self.max_node_radius = 30 #maximum node radius if node size scaled
-        self.default_node_radius = 5 #node size if nodes unscaled
-        self.min_node_radius = 2 #minimum node size if nodes scaled
-        self.custom_node_exponent = 3 #how does node radii scale with amount of stuff happening at that node (if nodes scaled)  
-        self.default_node_colour = 'grey' #node colour if nodes uncoloured
+        #defaults shared with the image exporter are in style.py
+        self.max_node_radius = style.MAX_NODE_RADIUS #maximum node radius if node size scaled
+        self.default_node_radius = style.DEFAULT_NODE_RADIUS #node size if nodes unscaled
+        self.min_node_radius = style.MIN_NODE_RADIUS #minimum node size if nodes scaled
+        self.custom_node_exponent = style.CUSTOM_NODE_EXPONENT #how does node radii scale with amount of stuff happening at that node (if nodes scaled)  
+        self.default_node_colour = style.DEFAULT_NODE_COLOUR #node colour if nodes uncoloured
         #edge constants
-        self.default_edge_width = 2 #default width of an edge
+        self.default_edge_width = style.DEFAULT_EDGE_WIDTH #default width of an edge
         self.active_width_addition = 2 #how much will the edge grow in size when clicked on
         self.min_edge_width = 1 #minimum width of an edge if edges scaled
         self.max_edge_width = 10 #maximum width of an edge if edges scaled
         self.custom_edge_exponent = 2 #how does edge width scale with amount of stuff happening at that edge (if edge scaled)
-        self.default_edge_colour = 'black' #what colour will an edge be by default 
+        self.default_edge_colour = style.DEFAULT_EDGE_COLOUR #what colour will an edge be by default 
         self.path_edge_colour = 'magenta' #what colour will an edge which is part of the drawn path be
         self.path_edge_width = 3 #what width will an edge which is part of the drawn path be
         #vehicle constants
-        self.default_vehicle_length = 3
-        self.default_vehicle_colour = 'blue'
+        self.default_vehicle_length = style.DEFAULT_VEHICLE_LENGTH
+        self.default_vehicle_colour = style.DEFAULT_VEHICLE_COLOUR
         #node text constants
         self.default_node_text_colour = 'black'
         self.default_edge_text_colour = 'purple'
@@ -55,13 +61,25 @@ class Display:
         self.text_id_line_end = -1 #default value, to indicate no such object
         self.text_id_line_start = -1 #default value, to indicate no such object
         self.sim_frame_time = 1 #how many seconds between simulation view updates, reciprocal of frame-rate
+        self.playback_queue_frames = 8 #how many frames the playback worker prepares ahead of the display
+        self.playback_wait_ms = 5 #how long to wait before checking again if the playback worker has not yet prepared a due frame
+        self.playback_step = 1 #how many timesteps the simulation view moves forward each update, more than 1 plays faster by skipping timesteps
+        self.playback_cache_frames = 128 #how many prepared frames are kept, so seeking back to a recent timestep is immediate
+        self.playback_prefetch_radius = 8 #how many updates either side of a seek are prepared in the background
         #index of vehicle text popups
         self.index_vehicle_text_popup = -1 #default value, to indicate no such object
         self.name_vehicle_text_popup = -1 #default value, to indicate no such object
         #default vehicle capacities, used for determining vehicle colours based on crowding levels
         #note standing capacity is standing + seated capacity
-        self.vehicle_seated_capacity = 960 #sydney trains A/B class, 8 carriage
-        self.vehicle_standing_capacity = 1680 #sydney trains A/B class, 8 carriage, roughly 4 pax/m^2 open space
+        self.vehicle_seated_capacity = style.VEHICLE_SEATED_CAPACITY
+        self.vehicle_standing_capacity = style.VEHICLE_STANDING_CAPACITY
+        #level of detail constants, which keep large networks responsive
+        self.cull_margin = 0.5 #items within this fraction of the screen size beyond its edges are still drawn, so a short pan does not show empty space
+        self.lod_min_nodes = 1000 #networks with fewer nodes are drawn in full detail (apart from items off screen)
+        self.cluster_pixels = 12 #on larger networks, nodes closer together than about this many pixels are drawn as one cluster
+        self.default_cluster_colour = 'dim grey' #colour of clusters of nodes
+        self.label_min_zoom = 4 #on larger networks, names and numeric overlays are only drawn when zoomed in at least this far
+        self.edge_hit_tolerance = 2 #how many pixels beyond the side of an edge the mouse is still over it
 
     #set the various flags (and modes) used by the rendering engine to their default value
     def set_default_flags(self):
@@ -74,6 +92,10 @@ class Display:
         self.last_node_left_click_index = -1 #index of last node left-clicked, -1 indicates that no nodes have been clicked yet
         self.last_node_right_click_index = -1 #index of last node right-clicked, -1 indicates that no nodes have been right clicked yet
         self.path_edge_arrows = True #will arrows be drawn on plotted routes between nodes, indicating direction of travel
+        self.playback_worker = None #worker thread preparing frames of the simulation being viewed, None if no simulation is being viewed
+        self.playback_after_id = None #id of the scheduled call to draw the next frame, so it can be cancelled
+        self.frame_cache = None #prepared frames of the simulation being viewed, None if no simulation has been viewed
+        self.timeline_dragging = False #is the timeline being dragged, in which case playback doesn't move it
 
     #setup the window object, in which all of our GUI will be contained
     def setup_window(self): 
@@ -101,11 +123,35 @@ class Display:
         self.canvas.pack(side = tk.RIGHT) 
         #bind canvas to scroll options
         self.canvas.bind("<MouseWheel>",self.zoom_canvas)
-        self.canvas.bind("<ButtonPress-1>",self.pan_start)
+        self.canvas.bind("<ButtonPress-1>",self.canvas_left_click) #also starts a pan
+        self.canvas.bind("<Button-2>",self.canvas_right_click)
+        self.canvas.bind("<Motion>",self.canvas_motion)
+        self.canvas.bind("<Leave>",self.canvas_leave)
         self.canvas.bind("<B1-Motion>",self.pan_end)
+        self.canvas.bind("<ButtonRelease-1>",self.pan_finish)
         self.current_zoom = 1 #current zoom level
         self.current_zoom_offset_x = 0 #how much is the display x origin offset from the true x origin
         self.current_zoom_offset_y = 0 #how much is the display y origin offset from the true y origin
+        self.setup_canvas_pools()
+
+    #setup the pools of canvas items used to draw the network, items are reused between renders rather than deleted and recreated
+    #items are not bound to event handlers, the canvas handlers find the item under the mouse with spatial indices (see hit_test)
+    def setup_canvas_pools(self):
+        self.edge_pool = canvas_pool.CanvasItemPool(self.canvas,'line','edge')
+        self.node_pool = canvas_pool.CanvasItemPool(self.canvas,'oval','node')
+        self.vehicle_pool = canvas_pool.CanvasItemPool(self.canvas,'rectangle','vehicle')
+        self.cluster_pool = canvas_pool.CanvasItemPool(self.canvas,'oval','cluster')
+        #pools only draw what is on screen, so the item at each pool index is for the node/edge/vehicle at that index of these arrays
+        self.node_pool_indices = np.zeros(0,dtype=np.int64)
+        self.edge_pool_indices = np.zeros(0,dtype=np.int64)
+        self.vehicle_pool_indices = np.zeros(0,dtype=np.int64)
+        self.label_node_indices = np.zeros(0,dtype=np.int64) #nodes which names and numeric overlays are drawn next to
+        self.vehicle_grid = spatial_index.GridIndex([],[]) #drawn vehicles, rebuilt with each frame
+        self.hover_item = ('none',-1) #type and index of the item under the mouse
+        #text is not interactive, so is shown disabled
+        self.node_above_text_pool = canvas_pool.CanvasItemPool(self.canvas,'text','node_above_text',shown_state=tk.DISABLED)
+        self.node_below_text_pool = canvas_pool.CanvasItemPool(self.canvas,'text','node_below_text',shown_state=tk.DISABLED)
+        self.edge_text_pool = canvas_pool.CanvasItemPool(self.canvas,'text','edge_text',shown_state=tk.DISABLED)
         
     #setup the main control options
     def setup_main_controls(self):
@@ -170,6 +216,11 @@ class Display:
         self.scenario_file_path_entry = tk.Entry(master=self.main_controls,fg='black',bg='white',width=20)
         self.scenario_file_path_entry.insert(0,default_scenario)
         self.scenario_file_path_entry.pack()   
+        #directory to stream the simulation trace to, leave empty to keep the trace in memory
+        self.trace_file_path_label = tk.Label(master=self.main_controls,text='TRACE FILE PATH',fg='black',bg='white',width=20)
+        self.trace_file_path_label.pack()
+        self.trace_file_path_entry = tk.Entry(master=self.main_controls,fg='black',bg='white',width=20)
+        self.trace_file_path_entry.pack()
         #control for importing files 
         self.import_files_button = tk.Button(master=self.main_controls,text='IMPORT FILES',fg='black',bg='white',command=self.import_files_click,width=20)
         self.import_files_button.pack()
@@ -205,6 +256,10 @@ class Display:
         self.optimiser_button = tk.Button(master=self.main_controls,text="CSV TIMETABLE",fg='black',bg='white',width=20,command=self.switch_optimiser)
         self.optimiser_button.pack()
         self.optimiser = 'hardcoded'
+        #set how passengers are grouped into agents
+        self.agent_mode_button = tk.Button(master=self.main_controls,text="INDIVIDUAL AGENTS",fg='black',bg='white',width=20,command=self.switch_agent_mode)
+        self.agent_mode_button.pack()
+        self.agent_mode = 'individual'
         #create the underlying visulisation controls
         #this button will allow choosing different types of controls
         self.secondary_controls = tk.Frame(master=self.window)
@@ -227,9 +282,20 @@ class Display:
         if self.simulation_setup_flag==True:
             self.message_update('note you must resetup the simulation to apply a new optimiser')
 
+    #switch between one agent per origin-destination pair per minute, and agents merged into cohorts by remaining path
+    def switch_agent_mode(self):
+        if self.agent_mode=="individual":
+            self.agent_mode_button.config(text="COHORT AGENTS")
+            self.agent_mode = 'cohort'
+        else:
+            self.agent_mode_button.config(text="INDIVIDUAL AGENTS")
+            self.agent_mode = 'individual'
+        if self.simulation_setup_flag==True:
+            self.message_update('note you must resetup the simulation to apply a new agent mode')
+
     def run_evaluation_click(self):
         if self.simulation_run_flag==True:
-            evaluator_message = self.evaluator.evaluate(self.sim_times,self.sim_vehicle_passengers,self.sim_node_passengers,self.num_failed_passengers,self.num_successful_passengers)
+            evaluator_message = self.evaluator.report() #costs were accumulated while the simulation ran
             self.message_update('please see terminal\n for evaluation printout')
             print(evaluator_message)
         
@@ -420,7 +486,7 @@ class Display:
             self.draw_network_click()
         
         time1 = time.time()
-        self.sim_network = n.Network(nodes_csv=self.nodes_csv,edges_csv=self.edges_csv,schedule_csv=self.schedule_csv,parameters_csv=self.parameter_csv,verbose=self.verbose,segment_csv=self.schedule_segments_csv,eval_csv=self.eval_csv,scenario_csv=self.scenario_csv,schedule_type=self.schedule_type,optimiser=self.optimiser)
+        self.sim_network = n.Network(nodes_csv=self.nodes_csv,edges_csv=self.edges_csv,schedule_csv=self.schedule_csv,parameters_csv=self.parameter_csv,verbose=self.verbose,segment_csv=self.schedule_segments_csv,eval_csv=self.eval_csv,scenario_csv=self.scenario_csv,schedule_type=self.schedule_type,optimiser=self.optimiser,agent_mode=self.agent_mode)
         time2 = time.time()
         simulation_setup_message = "simulation setup in \n" +  "{:.3f}".format(time2-time1) + " seconds"
         self.log_print(simulation_setup_message)
@@ -436,7 +502,8 @@ class Display:
         self.simulation_setup_flag = True #flag to indicate that the simulation has been setup
 
     def setup_evaluator(self):
-        self.evaluator = e.Evaluator(self.eval_csv,self.parameter_csv)
+        self.evaluator = e.OnlineEvaluator(self.eval_csv,self.parameter_csv)
+        self.sim_network.attach_evaluator(self.evaluator) #costs are accumulated as the simulation runs
 
     #run the simulation click using Cprofile to determine running times
     def profile_run_simulation_click(self):
@@ -454,7 +521,11 @@ class Display:
             self.log_print(simulation_start_message)
             self.message_update(simulation_start_message)
             time1 = time.time()
-            self.sim_times,self.sim_vehicle_latitudes,self.sim_vehicle_longitudes,self.sim_vehicle_names,self.sim_vehicle_passengers,self.sim_node_passengers,self.num_failed_passengers,self.num_successful_passengers,self.sim_time_taken = self.sim_network.basic_sim() #run the simulation and store the data
+            trace_path = self.trace_file_path_entry.get()
+            if trace_path=='':
+                trace_path = None #keep the trace in memory
+            self.sim_trace,self.num_failed_passengers,self.num_successful_passengers,self.sim_time_taken = self.sim_network.basic_sim(trace_path=trace_path) #run the simulation and store the data
+            self.sim_times = self.sim_trace.times
             self.setup_default_sim_current_values() #set default values for information about specific timesteps
             self.simulation_run_flag = True #simulation has been run and relevant values have been stored
             time2 = time.time()
@@ -470,11 +541,13 @@ class Display:
         num_nodes = len(self.node_names)
         self.sim_node_current_passengers = np.zeros(num_nodes)
         self.sim_vehicles_current_names = []
-        self.sim_vehicles_current_latitudes = []
-        self.sim_vehicles_current_longitudes = []
         self.sim_vehicles_current_passengers = []
         self.sim_vehicles_current_colour = []
-        self.sim_vehicles_current_length = []
+        self.sim_vehicles_current_length = np.zeros(0)
+        self.sim_vehicles_current_x_original = np.zeros(0)
+        self.sim_vehicles_current_y_original = np.zeros(0)
+        self.sim_vehicles_current_x = np.zeros(0)
+        self.sim_vehicles_current_y = np.zeros(0)
 
     def view_simulation_click(self):
         if self.simulation_run_flag == False: #simulation needs to be run to be displayed
@@ -491,42 +564,122 @@ class Display:
                     #we need to delete any lingering past vehicles
                     self.derender_vehicles(override=True)
                 self.num_sim_times = len(self.sim_times)
+                self.stop_playback()
+                self.playback_trace = self.sim_trace #playback keeps using this trace even if the simulation is run again during playback
+                self.frame_cache = playback.FrameCache(self.prepare_frame,self.playback_cache_frames)
+                self.timeline_scale.config(from_=self.sim_times[0],to=self.sim_times[-1])
                 time_index = 0
-                #self.render_simulation_update(time_index)
-                self.render_simulation_update(time_index) 
-
-    #render a simulation update after a delay
-    def render_simulation_update(self,index):
-        if self.paused == False: #if we are playing back the simulation, play the next frame
-            start_render_time = time.time() #get the time at the start of renderings
-            end_render_time = start_render_time + self.sim_frame_time  #calculate what time we need to move to the next frame to maintain a steady frame-rate
-            #extract the data for the current timestep
-            sim_time = self.sim_times[index]
-            #update the time display
-            time_text = 'TIME ' + str(sim_time)
-            self.time_label.config(text=time_text)
-            #extract other information from the calculate vehicles
-            self.extract_current_vehicles_info(index) #extract info about the vehicles in the current simulation timesteps
-            self.update_vehicle_text_index() #update the index of the vehicle whose info we are displaying as a popup
-            self.extract_current_nodes_info(index) #extract info about the nodes in the current simulation timesteps
-            self.calculate_vehicle_position() #calculate the position of the vehicles in the network
-            self.simulation_view_flag = True #simulation view has been setup
-            self.update_nodes()
-            self.update_text_same_node() 
-            self.generate_edge_overlay_text()
-            #after rendering, wait till we reach the time set for the next visual update
-            remaining_frame_time = end_render_time-time.time()
-            index = index + 1 #index of the next batch of data
-            if index>=self.num_sim_times: #we have finished displaying the simulation
-                self.log_print("Simulation Display Finished")
-                self.message_update("Simulated Display Finished")
-                self.simulation_view_flag = False #simulation is no longer being run
-                self.simulation_past_vehicles_flag = True #past vehicles still exist that will need to be deleted if we replay the simulation
-            elif index < self.num_sim_times:
-                #call the callback again once we have waited long enough
-                self.time_label.after(int(remaining_frame_time*1000),self.render_simulation_update,index)
+                self.start_playback(time_index)
+
+    #start playing back the simulation from a timestep, frames are prepared by a worker thread and drawn by the tk thread as they fall due
+    def start_playback(self,index):
+        self.stop_playback()
+        self.playback_worker = playback.FrameWorker(self.frame_cache.get,index,self.num_sim_times,step=self.playback_step,max_frames=self.playback_queue_frames)
+        if self.paused == True:
+            self.playback_worker.pause()
+        self.playback_worker.start()
+        self.playback_clock = playback.PlaybackClock(index,self.sim_frame_time,self.playback_step)
+        self.playback_next_index = index #the first frame which has not yet been drawn
+        self.simulation_view_flag = True #simulation view has been setup
+        if self.paused == False:
+            self.render_simulation_update()
+
+    #stop the current playback (if any), so it can be replaced
+    def stop_playback(self):
+        if self.playback_after_id is not None:
+            self.time_label.after_cancel(self.playback_after_id)
+            self.playback_after_id = None
+        if self.playback_worker is not None:
+            self.playback_worker.stop()
+            self.playback_worker = None
+
+    #prepare the data needed to draw a timestep, this runs on the playback worker thread so must not use tk or change the display
+    def prepare_frame(self,index):
+        trace = self.playback_trace
+        ids,latitudes,longitudes,passengers = trace.get_vehicles_at(index)
+        has_position = np.isfinite(latitudes)
+        if has_position.all()==False:
+            #only display vehicles whose position was recorded at this timestep
+            ids = ids[has_position]
+            latitudes = latitudes[has_position]
+            longitudes = longitudes[has_position]
+            passengers = passengers[has_position]
+        x_original,y_original = self.convert_lat_long_to_x_y(latitudes,longitudes) #unzoomed, as the zoom may change before the frame is drawn
+        frame = {'time':trace.times[index],'names':trace.get_vehicle_names(ids),'passengers':passengers,'x_original':x_original,'y_original':y_original,
+                 'colours':self.calculate_vehicle_colours(passengers),'node_passengers':trace.get_node_loads_at(index)}
+        return frame
+
+    #draw the latest frame which is due, dropping any frames we are too far behind to draw, then wait for the next frame
+    def render_simulation_update(self):
+        self.playback_after_id = None
         if self.paused == True:
-            self.time_label.after(10,self.render_simulation_update,index) #check to see if we are still paused 100 times per second
+            return #resuming playback calls this again
+        due_index = min(max(self.playback_clock.due_index(),self.playback_next_index),self.num_sim_times-1)
+        index,frame = self.playback_worker.take_frame(due_index)
+        if frame is None:
+            #the worker has not prepared the frame yet, check again shortly
+            self.playback_after_id = self.time_label.after(self.playback_wait_ms,self.render_simulation_update)
+            return
+        self.apply_frame(frame)
+        self.playback_next_index = index + self.playback_step #index of the next batch of data
+        if self.playback_next_index>=self.num_sim_times: #we have finished displaying the simulation
+            self.finish_playback()
+        else:
+            #call the callback again once the next frame is due
+            remaining_frame_time = self.playback_clock.time_until(self.playback_next_index)
+            self.playback_after_id = self.time_label.after(int(remaining_frame_time*1000),self.render_simulation_update)
+
+    #end the playback once the last frame has been drawn
+    def finish_playback(self):
+        self.log_print("Simulation Display Finished")
+        if self.playback_worker is not None and self.playback_worker.num_dropped>0:
+            self.log_print(str(self.playback_worker.num_dropped) + " frames dropped to keep up")
+        self.message_update("Simulated Display Finished")
+        self.stop_playback()
+        self.simulation_view_flag = False #simulation is no longer being run
+        self.simulation_past_vehicles_flag = True #past vehicles still exist that will need to be deleted if we replay the simulation
+
+    #jump to a timestep, drawing it straight away and carrying on playing (or staying paused) from there
+    #the frame is read directly from the trace (or the cache), so seeking costs the same wherever the timestep is
+    def seek_playback(self,index):
+        if self.frame_cache is None:
+            self.log_print('simulation not yet viewed, view simulation to seek')
+            return False
+        index = int(min(max(index,0),self.num_sim_times-1))
+        self.apply_frame(self.frame_cache.get(index))
+        #prepare the frames either side in the background, nearest (and ahead) first, so stepping around the cursor is immediate
+        nearby_indices = []
+        for offset in range(1,self.playback_prefetch_radius+1):
+            nearby_indices.append(index + offset*self.playback_step)
+            nearby_indices.append(index - offset*self.playback_step)
+        self.frame_cache.prefetch([nearby_index for nearby_index in nearby_indices if nearby_index>=0 and nearby_index<self.num_sim_times])
+        self.playback_next_index = index + self.playback_step
+        if self.playback_next_index>=self.num_sim_times:
+            self.finish_playback()
+        else:
+            self.simulation_view_flag = True #seeking after the display finished carries on viewing the simulation
+            self.start_playback(self.playback_next_index)
+        return True
+
+    #draw a frame prepared by prepare_frame
+    def apply_frame(self,frame):
+        #update the time display
+        time_text = 'TIME ' + str(frame['time'])
+        self.time_label.config(text=time_text)
+        if self.timeline_dragging == False:
+            self.timeline_scale.set(frame['time'])
+        self.sim_vehicles_current_names = frame['names']
+        self.sim_vehicles_current_passengers = frame['passengers']
+        self.sim_vehicles_current_colour = frame['colours']
+        self.sim_vehicles_current_length = np.full(len(frame['names']),self.default_vehicle_length)
+        self.sim_vehicles_current_x_original = frame['x_original']
+        self.sim_vehicles_current_y_original = frame['y_original']
+        self.sim_node_current_passengers = frame['node_passengers']
+        self.update_vehicle_text_index() #update the index of the vehicle whose info we are displaying as a popup
+        self.recalculate_vehicle_position() #apply accumulated zoom to the new vehicle positions
+        self.update_nodes()
+        self.update_text_same_node() 
+        self.generate_edge_overlay_text()
     
     #update the index of the vehicle whose info we are displaying as a popup
     def update_vehicle_text_index(self):
@@ -545,17 +698,6 @@ class Display:
             #change the stored index to reflect the new position in the list of current vehicles
             self.index_vehicle_text_popup = new_index
 
-    def extract_current_vehicles_info(self,index):
-        #extract the info for the current time (given by index)
-        self.sim_vehicles_current_names = self.sim_vehicle_names[index]
-        self.sim_vehicles_current_latitudes = self.sim_vehicle_latitudes[index]
-        self.sim_vehicles_current_longitudes = self.sim_vehicle_longitudes[index]
-        self.sim_vehicles_current_passengers = self.sim_vehicle_passengers[index]
-
-    def extract_current_nodes_info(self,index):
-        #extract the info for the current time (given by index)
-        self.sim_node_current_passengers = self.sim_node_passengers[index]
-
     #switch logging levels (verbosity level)
     def verbose_button_click(self):
         if self.verbose==0:
@@ -569,7 +711,7 @@ class Display:
             self.verbose = 0
         if self.simulation_setup_flag == True:#also update the logging level in the simulation if it exists
             self.log_print('SIMULATION LOG LEVEL UPDATED TO '+ str(self.verbose),2)
-            self.sim_network.verbose = self.verbose
+            self.sim_network.set_verbose(self.verbose)
 
     #NETWORK VIZ TOOLS
     #tools for exploring aspects of the simulated network which do not depend on actual simulation
@@ -639,6 +781,11 @@ class Display:
         #create a label to display the time
         self.time_label = tk.Label(master=self.simulation_viz,text='TIME',fg='black',bg='white',width=20)
         self.time_label.pack()
+        #create a timeline to jump to any time of the simulation, its range is set when the simulation is viewed
+        self.timeline_scale = tk.Scale(master=self.simulation_viz,from_=0,to=0,orient=tk.HORIZONTAL,showvalue=False,fg='black',bg='white',length=150,command=self.timeline_move)
+        self.timeline_scale.bind('<ButtonPress-1>',self.timeline_press)
+        self.timeline_scale.bind('<ButtonRelease-1>',self.timeline_release)
+        self.timeline_scale.pack()
         #create a button to enable us to control whether the simulation is running
         self.pause_play_button = tk.Button(master=self.simulation_viz,text='PLAYING',fg='black',bg='white',width=20,command=self.pause_play_button_click)
         self.paused = False #simulation visualisation starts paused
@@ -655,6 +802,14 @@ class Display:
         #add a button to update the frame speed
         self.simulation_speed_update_button = tk.Button(master=self.simulation_viz,text='UPDATE SPEED',fg='black',bg='white',command=self.simulation_speed_update_click,width=20)
         self.simulation_speed_update_button.pack()
+        #create controls to play faster than the update rate allows, by skipping timesteps
+        self.simulation_step_label = tk.Label(master=self.simulation_viz,text='TIMESTEPS PER UPDATE = 1',fg='black',bg='white',width=20)
+        self.simulation_step_label.pack()
+        self.simulation_step_entry = tk.Entry(master=self.simulation_viz,fg='black',bg='white',width=20)
+        self.simulation_step_entry.insert(0,self.playback_step)
+        self.simulation_step_entry.pack()
+        self.simulation_step_update_button = tk.Button(master=self.simulation_viz,text='UPDATE STEP',fg='black',bg='white',command=self.simulation_step_update_click,width=20)
+        self.simulation_step_update_button.pack()
         #add controls for vehicle appearance rendering
         self.vehicle_appearance_label = tk.Label(master=self.simulation_viz,text='VEHICLE APPEARANCE',fg='black',bg='white',width=20)
         self.vehicle_appearance_label.pack()
@@ -671,7 +826,12 @@ class Display:
             self.vehicle_colour_type = "crowding"
         
         self.vehicle_colour_button_text_update()
-        self.calculate_vehicle_position #rerender vehicles to match the new colour scheme 
+        if self.simulation_run_flag == True:
+            #rerender vehicles to match the new colour scheme, frames already prepared by the playback worker may still use the old one
+            if self.frame_cache is not None:
+                self.frame_cache.clear() #cached frames have the old colours
+            self.sim_vehicles_current_colour = self.calculate_vehicle_colours(self.sim_vehicles_current_passengers)
+            self.render_vehicles()
     
     def vehicle_colour_button_text_update(self):
         if self.vehicle_colour_type == "crowding":
@@ -693,18 +853,66 @@ class Display:
         else:
             #calculate the new time between frames
             self.sim_frame_time = 1/new_updates_per_second
+            if self.playback_worker is not None:
+                self.playback_clock.restart(self.playback_next_index,self.sim_frame_time,self.playback_step) #play the remaining frames at the new speed
             updates_per_second_text = 'UPDATES/SECOND = ' + str(new_updates_per_second)
             self.simulation_speed_label.config(text=updates_per_second_text)
 
+
+    def simulation_step_update_click(self):
+        #extract the new number of timesteps per update
+        new_step = self.simulation_step_entry.get()
+        try:
+            new_step = int(new_step)
+        except:
+            error_text = str(new_step) + " Is not a whole number, please enter a whole number of timesteps"
+            self.log_print(error_text)
+        else:
+            if new_step<1:
+                self.log_print("timesteps per update must be at least 1")
+                return
+            self.playback_step = new_step
+            if self.playback_worker is not None:
+                self.start_playback(self.playback_next_index) #the worker prepares every step'th frame, so replace it with one using the new step
+            self.simulation_step_label.config(text='TIMESTEPS PER UPDATE = ' + str(new_step))
+
+    #event for when the timeline is pressed, playback stops until it is released
+    def timeline_press(self,event):
+        self.timeline_dragging = True
+        self.stop_playback() #releasing the timeline restarts playback from wherever it was dragged to
+
+    #event for when the timeline moves, while it is being dragged the frame under it is shown without restarting playback
+    def timeline_move(self,value):
+        if self.timeline_dragging == False or self.frame_cache is None:
+            return #moved by playback rather than the user
+        index = self.playback_trace.index_at_time(float(value))
+        self.apply_frame(self.frame_cache.get(index))
+
+    #event for when the timeline is released, playback carries on from the time it was released at
+    def timeline_release(self,event):
+        self.timeline_dragging = False
+        if self.frame_cache is None:
+            return
+        self.seek_playback(self.playback_trace.index_at_time(self.timeline_scale.get()))
        
     #control whether the simulation visulisation is paused or playing
+    #pausing stops both the worker preparing frames and the drawing of frames, rather than polling until playback resumes
     def pause_play_button_click(self):
         if self.paused == True:
             self.paused = False
             self.pause_play_button.config(text="PLAYING")
+            if self.playback_worker is not None:
+                self.playback_worker.resume()
+                self.playback_clock.restart(self.playback_next_index,self.sim_frame_time,self.playback_step) #carry on from the frame after the one on screen
+                self.render_simulation_update()
         elif self.paused == False:
             self.paused = True
             self.pause_play_button.config(text="PAUSED")
+            if self.playback_worker is not None:
+                self.playback_worker.pause()
+                if self.playback_after_id is not None:
+                    self.time_label.after_cancel(self.playback_after_id)
+                    self.playback_after_id = None
 
     #hide the network_viz tool controls 
     def clear_network_viz_tools(self):
@@ -1111,66 +1319,18 @@ class Display:
 
     #calculate and perform final setting of node colour based on provided information
     def calculate_node_colours(self,nodes_quantity,total_quantity,mode='default'):
-        num_nodes = len(nodes_quantity)
-        for i in range(num_nodes):
-            node_fraction = nodes_quantity[i]/total_quantity#fraction of total amount occuring at that node
-            #determine how far along the spectrum from blue to red through green the colour is
-            if mode=='default': #use custom scaling (by default cubic), good for passenger volumes
-                node_colour_fraction = (node_fraction**(1/self.custom_node_exponent))
-            elif mode=='linear': #use linear scaling, good for distance to travel in smaller maps
-                node_colour_fraction = node_fraction
-            #convert node_colour_fraction to RGB, blue at 0, green at 0.3, red at 1
-
-            midpoint = 0.3 #midpoint of colour scale is green
-            if node_colour_fraction<=midpoint:
-                #colour scale is from blue to green
-                green = node_colour_fraction/midpoint
-                blue =  1-green
-                red = 0
-            elif node_colour_fraction>midpoint:
-                #colour scale is from green to red
-                red = (node_colour_fraction-midpoint)/(1-midpoint)
-                green = 1-red
-                blue = 0
-            
-            #convert 24 bit RGB colour to the hex format expected by tkinter 
-            self.nodes_colour[i] = RGB_TO_TK_HEX(int(red*255),int(green*255),int(blue*255))
-
-    #calculate vehicle colours based on how crowded the vehicles are
-    #note at the moment, this code requires all vehicles to all have the same capacity
+        node_fractions = np.asarray(nodes_quantity,dtype=np.float64)/total_quantity #fraction of total amount occuring at each node
+        #determine how far along the spectrum from blue to red through green the colour is
+        if mode=='default': #use custom scaling (by default cubic), good for passenger volumes
+            node_colour_fractions = node_fractions**(1/self.custom_node_exponent)
+        elif mode=='linear': #use linear scaling, good for distance to travel in smaller maps
+            node_colour_fractions = node_fractions
+        #convert to RGB, blue at 0, green at 0.3, red at 1, then to the hex format expected by tkinter
+        self.nodes_colour = style.rgb_to_hex(style.node_scale_rgb(node_colour_fractions,midpoint=0.3))
+
+    #calculate vehicle colours based on how crowded the vehicles are, see style.crowding_rgb
     def calculate_vehicle_colours_crowding(self,vehicle_num_passengers,seated_capacity,standing_capacity):
-        #blue is empty, green is half seated capacity, yellow is full seated capacity, red is full standing capacity
-        num_vehicles = len(vehicle_num_passengers)
-        for i in range(num_vehicles):
-            this_vehicle_num_passengers = vehicle_num_passengers[i]
-            if this_vehicle_num_passengers<=seated_capacity:
-                fraction_seated_capacity = this_vehicle_num_passengers/seated_capacity
-                midpoint = 0.5
-                if fraction_seated_capacity<=midpoint:
-                    #for less than half seats occupied
-                    #no red, smooth transition from blue to green
-                    red = 0
-                    green = fraction_seated_capacity/midpoint
-                    blue = 1 - green
-                else:
-                    #for more than half seats occupied but no standing
-                    #smooth transition from green to yellow
-                    red = (fraction_seated_capacity-midpoint)/(1-midpoint)
-                    green = 1
-                    blue = 0
-            elif this_vehicle_num_passengers<=standing_capacity:
-                fraction_standing_capacity = (this_vehicle_num_passengers-seated_capacity)/(standing_capacity-seated_capacity)
-                #smooth transition from yellow at no-standing to red at max standing
-                red = 1
-                green = 1-fraction_standing_capacity
-                blue = 0
-            else:
-                #for overloaded vehicles
-                red = 1
-                green = 0
-                blue = 0
-            #now set the colour of the vehicle
-            self.sim_vehicles_current_colour[i] = RGB_TO_TK_HEX(int(red*255),int(green*255),int(blue*255))
+        return style.rgb_to_hex(style.crowding_rgb(vehicle_num_passengers,seated_capacity,standing_capacity))
 
     #FUNCTIONS TO DETERINE EDGE WIDTH/COLOUR
     #set edge width based on data about the edge (which data depends on mode)
@@ -1307,6 +1467,7 @@ class Display:
     def message_update(self,string):
         self.message.config(text=string)
 
+    #convert latitudes and longitudes (single values or numpy arrays) to unzoomed canvas coordinates
     def convert_lat_long_to_x_y(self,latitude,longitude):
         latitude_offset = latitude-self.central_latitude
         longitude_offset = longitude-self.central_longitude
@@ -1319,13 +1480,9 @@ class Display:
     #extract the list of nodes from a csv file into a python list, and calculate global geographical information for plotting
     def extract_nodes_graph(self):
         self.node_names = self.nodes_csv["Name"].to_list()
-        node_positions = self.nodes_csv["Location"].to_list()
-        self.node_latitudes = []
-        self.node_longitudes = []
-        for position in node_positions:
-            latitude,longitude = n.extract_coordinates(position)
-            self.node_latitudes.append(latitude)
-            self.node_longitudes.append(longitude)
+        node_latitudes,node_longitudes = loader.parse_coordinates(self.nodes_csv["Location"]) #parse all the node locations at once
+        self.node_latitudes = node_latitudes.tolist()
+        self.node_longitudes = node_longitudes.tolist()
 
         #get the minimum/maximum longitude and latitude
         min_latitude = min(self.node_latitudes)
@@ -1355,18 +1512,19 @@ class Display:
         #find the index of edge starts and ends in the list of nodes
         self.edge_start_indices = []
         self.edge_end_indices = []
+        node_indices = {name:i for i,name in reversed(list(enumerate(self.node_names)))} #index of the first node with each name, a list search per edge is too slow for large networks
         for i in range(num_edges):
             #get the start index
             try:
-                start_index = self.node_names.index(edge_starts[i])
-            except ValueError:
+                start_index = node_indices[edge_starts[i]]
+            except KeyError:
                 warnings.warn('edge start ', edge_starts[i],' not present in list of node names')
                 start_index = -1 #this will cause a crash later (by design), as our program a non-existent start node
             
             #get the end index
             try:
-                end_index = self.node_names.index(edge_ends[i])
-            except ValueError:
+                end_index = node_indices[edge_ends[i]]
+            except KeyError:
                 warnings.warn('edge end ', edge_ends[i],' not present in list of node names')
                 end_index = -1 #this will cause a crash later (by design), as our program contains a non-existent end node
 
@@ -1375,81 +1533,49 @@ class Display:
             self.edge_start_indices.append(start_index)
             self.edge_end_indices.append(end_index)
 
-        self.edge_canvas_ids = ['blank']*num_edges #store edge canvas ids in a list so we can delete them later, 'blank' indicates they have not yet been created
         self.edge_widths = [self.default_edge_width]*num_edges #store the default width of every edge
         self.edge_colours = [self.default_edge_colour]*num_edges #store the default colour of every edge
         self.edge_arrows = [tk.NONE]*num_edges #by default there will be no arrows on an edge
 
     #calculate information about position of nodes
+    #positions are numpy arrays, the original (unzoomed) positions are kept so zooming is a single transform of them
     def calculate_node_position(self):
         num_nodes = len(self.node_names)
-        self.nodes_x = []
-        self.nodes_y = []
         self.nodes_radii = [self.default_node_radius]*num_nodes #default size for nodes
         self.nodes_colour = [self.default_node_colour]*num_nodes #default
-        self.node_below_text_ids = ['blank']*num_nodes  #canvas ids for text which could be displayed below all nodes
-        self.node_above_text_ids = ['blank']*num_nodes  #canvas ids for text which could be displayed above all nodes
-        self.node_canvas_ids = ['blank']*num_nodes #canvas ids for the nodes themsleves
-        for i in range(num_nodes):
-            x,y = self.convert_lat_long_to_x_y(self.node_latitudes[i],self.node_longitudes[i])
-            self.nodes_x.append(x)
-            self.nodes_y.append(y)
-        #original copy of node position, so that scaling can be calculated relative to the original values
-        self.nodes_x_original = self.nodes_x
-        self.nodes_y_original = self.nodes_y
+        self.nodes_x_original,self.nodes_y_original = self.convert_lat_long_to_x_y(np.asarray(self.node_latitudes),np.asarray(self.node_longitudes))
+        self.node_grid = spatial_index.GridIndex(self.nodes_x_original,self.nodes_y_original) #for finding the nodes on screen, built once as zooming is a transform of the original positions
+        self.recalculate_nodes_position()
 
     #calculate the midpoint of edges, used for plotting overlay text on edges
     #this needs to be done after node positions are calculated
     def calculate_edges_midpoints(self):
-        num_edges = len(self.edge_names)
-        self.edges_midpoint_x = []
-        self.edges_midpoint_y = []
-        self.edge_text_ids = ['blank']*num_edges  #canvas ids for text which could be displayed next to all edges
-        for i in range(num_edges):
-            #extract the location of the nodes which the edge connects
-            edge_start_index = self.edge_start_indices[i] 
-            edge_end_index = self.edge_end_indices[i]
-            #and then calculate the midpoint of the edge
-            edge_midpoint_x = (self.nodes_x[edge_start_index] + self.nodes_x[edge_end_index])/2
-            edge_midpoint_y = (self.nodes_y[edge_start_index] + self.nodes_y[edge_end_index])/2
-            #and store this calculated value in a list
-            self.edges_midpoint_x.append(edge_midpoint_x)
-            self.edges_midpoint_y.append(edge_midpoint_y)
-        
-        #original copy of edge midpoints, so that scaling can be calculated relative to the original values
-        self.edges_midpoint_x_original = self.edges_midpoint_x
-        self.edges_midpoint_y_original = self.edges_midpoint_y
+        edge_start_indices = np.asarray(self.edge_start_indices,dtype=np.int64)
+        edge_end_indices = np.asarray(self.edge_end_indices,dtype=np.int64)
+        #midpoints of the original node positions, so that zooming can be calculated from the original values
+        self.edges_midpoint_x_original = (self.nodes_x_original[edge_start_indices] + self.nodes_x_original[edge_end_indices])/2
+        self.edges_midpoint_y_original = (self.nodes_y_original[edge_start_indices] + self.nodes_y_original[edge_end_indices])/2
+        self.recalculate_edge_midpoints()
+        #points along every edge, so the edges near the mouse can be found (see hit_edge), spaced about as far apart as nodes
+        self.edge_sample_spacing = self.node_grid.cell_size
+        sample_x,sample_y,self.edge_sample_owners = spatial_index.sample_segments(self.nodes_x_original[edge_start_indices],self.nodes_y_original[edge_start_indices],
+                                                                                   self.nodes_x_original[edge_end_indices],self.nodes_y_original[edge_end_indices],self.edge_sample_spacing)
+        self.edge_grid = spatial_index.GridIndex(sample_x,sample_y)
 
     #calculate the position, colour and size of vehicles
-    def calculate_vehicle_position(self):
-        #as vehicle quantities change from timestep to timestep, need to delete old vehicles first
-        self.derender_vehicles()    
-        num_vehicles = len(self.sim_vehicles_current_names)
-        self.sim_vehicles_current_x = []
-        self.sim_vehicles_current_y = []
-        self.sim_vehicles_current_length = [self.default_vehicle_length]*num_vehicles
-        self.set_vehicle_colours() #set the vehicle colour based on the choosen mode
-        self.vehicle_canvas_ids = ['blank']*num_vehicles #canvas ids for the nodes themsleves
-        for i in range(num_vehicles):
-            x,y = self.convert_lat_long_to_x_y(self.sim_vehicles_current_latitudes[i],self.sim_vehicles_current_longitudes[i])
-            x,y = self.apply_accumlated_zoom(x,y)#apply accumulated zoom to new vehicle objects
-            self.sim_vehicles_current_x.append(x)
-            self.sim_vehicles_current_y.append(y)
-        self.sim_vehicles_current_x_original = self.sim_vehicles_current_x
-        self.sim_vehicles_current_y_original = self.sim_vehicles_current_y
-
-    #function to set the colour of vehicles
-    def set_vehicle_colours(self):
-        num_vehicles = len(self.sim_vehicles_current_names)
-        self.sim_vehicles_current_colour = [self.default_vehicle_colour]*num_vehicles
+    #function to calculate the colour of vehicles with the given numbers of passengers, based on the choosen mode
+    #this is called from the playback worker thread (see prepare_frame), so it returns the colours rather than changing the display
+    def calculate_vehicle_colours(self,vehicle_num_passengers):
+        num_vehicles = len(vehicle_num_passengers)
         if self.vehicle_colour_type == "constant":
-            pass #default colours have already been set
+            return [self.default_vehicle_colour]*num_vehicles
         elif self.vehicle_colour_type == "crowding":
-            self.calculate_vehicle_colours_crowding(self.sim_vehicles_current_passengers,self.vehicle_seated_capacity,self.vehicle_standing_capacity)
+            return self.calculate_vehicle_colours_crowding(vehicle_num_passengers,self.vehicle_seated_capacity,self.vehicle_standing_capacity)
         else:
-            #default to the default colour, which has already been set
+            #default to the default colour
             message = "INVALID COLOUR TYPE " + self.vehicle_colour_type + "\n COLOUR SET TO DEFAULT"
             self.log_print(message)
+            return [self.default_vehicle_colour]*num_vehicles
             
     #FUNCTIONS PERFORMING ACTUAL RENDERING
     #derender displayed vehicles
@@ -1457,11 +1583,9 @@ class Display:
         #delete all existing vehicles
         #overide option allows the function to operate even simulation_view_flag is false
         if self.simulation_view_flag==True or override==True:
-            num_vehicles_old = len(self.vehicle_canvas_ids)
-            for i in range(num_vehicles_old):
-                if self.vehicle_canvas_ids[i]!='blank':
-                        #delete the old oval object if one exists
-                        self.canvas.delete(self.vehicle_canvas_ids[i])
+            self.vehicle_pool.hide() #hidden rather than deleted, so they can be reused
+            self.vehicle_pool_indices = np.zeros(0,dtype=np.int64)
+            self.vehicle_grid = spatial_index.GridIndex([],[]) #hidden vehicles can't be hovered over
 
     #derender the text produced by hovering over a vehicle
     def derender_hover_vehicle_text(self):
@@ -1491,106 +1615,294 @@ class Display:
             self.text_id_line_start =  -1
             self.text_id_line_end = -1
 
+    #find the region of the canvas (in zoomed coordinates) worth drawing, the part on screen plus a margin around it
+    #panning scrolls the canvas, so the screen starts at canvasx(0),canvasy(0) rather than the origin
+    def calculate_view_region(self):
+        margin_x = self.canvas_width*self.cull_margin
+        margin_y = self.canvas_height*self.cull_margin
+        left = self.canvas.canvasx(0)
+        top = self.canvas.canvasy(0)
+        self.view_region = (left-margin_x,top-margin_y,left+self.canvas_width+margin_x,top+self.canvas_height+margin_y)
+
+    #find which points (numpy arrays of zoomed positions) are inside the view region
+    def in_view_region(self,x,y):
+        x_min,y_min,x_max,y_max = self.view_region
+        return (x>=x_min) & (x<=x_max) & (y>=y_min) & (y<=y_max)
+
+    #decide what is drawn for the current zoom and pan, nodes off screen are skipped and on large networks nearby nodes are drawn as one cluster
+    #sets node_pool_indices (nodes drawn individually), the clusters, the position each node's edges are drawn to and label_node_indices
+    def update_level_of_detail(self):
+        self.calculate_view_region()
+        num_nodes = len(self.node_names)
+        #the view region in original (unzoomed) coordinates, where the grid index was built
+        x_min,y_min,x_max,y_max = self.view_region
+        corners_x = (np.array([x_min,x_max])-self.current_zoom_offset_x)/self.current_zoom
+        corners_y = (np.array([y_min,y_max])-self.current_zoom_offset_y)/self.current_zoom
+        visible_nodes = self.node_grid.query(np.min(corners_x),np.min(corners_y),np.max(corners_x),np.max(corners_y))
+        large_network = num_nodes>=self.lod_min_nodes
+        self.node_groups = np.arange(num_nodes) #nodes in the same group (cluster) are drawn as one, edges within a group are not drawn
+        self.node_draw_x = self.nodes_x.copy() #where edges of each node are drawn to, the centre of its cluster if it is in one
+        self.node_draw_y = self.nodes_y.copy()
+        self.cluster_x = np.zeros(0)
+        self.cluster_y = np.zeros(0)
+        self.cluster_counts = np.zeros(0,dtype=np.int64)
+        if large_network and len(visible_nodes)>0:
+            #clusters are cells of a fixed size on screen, so they get smaller (in the original coordinates) as we zoom in
+            cell_size = self.cluster_pixels/abs(self.current_zoom)
+            labels,centre_x,centre_y,counts = spatial_index.cluster_points(self.nodes_x_original[visible_nodes],self.nodes_y_original[visible_nodes],cell_size)
+            in_cluster = counts[labels]>1 #cells holding a single node are drawn as that node
+            cluster_cells = np.flatnonzero(counts>1)
+            cluster_numbers = np.full(len(counts),-1)
+            cluster_numbers[cluster_cells] = np.arange(len(cluster_cells))
+            self.cluster_x,self.cluster_y = self.apply_accumlated_zoom(centre_x[cluster_cells],centre_y[cluster_cells])
+            self.cluster_counts = counts[cluster_cells]
+            clustered_nodes = visible_nodes[in_cluster]
+            node_clusters = cluster_numbers[labels[in_cluster]]
+            self.node_groups[clustered_nodes] = num_nodes + node_clusters
+            self.node_draw_x[clustered_nodes] = self.cluster_x[node_clusters]
+            self.node_draw_y[clustered_nodes] = self.cluster_y[node_clusters]
+            self.node_pool_indices = visible_nodes[~in_cluster]
+        else:
+            self.node_pool_indices = visible_nodes
+        self.node_drawn = np.zeros(num_nodes,dtype=bool) #whether each node is drawn individually, for hit-testing
+        self.node_drawn[self.node_pool_indices] = True
+        #names and numeric overlays of a large network are unreadable until zoomed in
+        if large_network==False or abs(self.current_zoom)>=self.label_min_zoom:
+            self.label_node_indices = self.node_pool_indices
+        else:
+            self.label_node_indices = np.zeros(0,dtype=np.int64)
+
     #needs to be run after edges have been extracted and nodes have been drawn to work correctly
+    #only edges crossing the view region are drawn, edges between clusters are drawn once between the cluster centres
     def render_edges(self):
         self.derender_hover_edge_text()#derender additional edge text if it exists
-        num_edges = len(self.edge_start_indices)
-        for i in range(num_edges):
-            start_index = self.edge_start_indices[i]
-            end_index = self.edge_end_indices[i]
-            start_x = self.nodes_x[start_index]
-            start_y = self.nodes_y[start_index]
-            end_x = self.nodes_x[end_index]
-            end_y = self.nodes_y[end_index]
-            colour = self.edge_colours[i]
-            width = int(self.edge_widths[i]) #interesting thing about tkinter, circles can have non-integer sizes but lines need integer sizes
-            edge_arrow = self.edge_arrows[i]
-            #end_size = self.nodes_radii[end_index] #unused, we draw nodes over edges so no need to crop the edges
-            #print('width ', width)
-            #print('activewidth ',width+self.active_width_addition)
-            if self.edge_canvas_ids[i]!='blank':
-                #delete the old line object if one exists
-                self.canvas.delete(self.edge_canvas_ids[i])
-                
-            id = self.canvas.create_line(start_x,start_y,end_x,end_y,fill=colour,width=width,activewidth=width+self.active_width_addition,arrow=edge_arrow) #draw a line to represent the edge
-            self.canvas.tag_bind(id,'<Enter>',self.edge_enter) #some information about the start and end nodes will be displayed when we mouse over an edge
-            self.canvas.tag_bind(id,'<Leave>',self.edge_leave) #this information will stop being displayed when the mouse is no longer over the node
-            self.edge_canvas_ids[i] = id
-
-    #draw the nodes on the canvas
+        start_indices = np.asarray(self.edge_start_indices,dtype=np.int64)
+        end_indices = np.asarray(self.edge_end_indices,dtype=np.int64)
+        start_x = self.node_draw_x[start_indices]
+        start_y = self.node_draw_y[start_indices]
+        end_x = self.node_draw_x[end_indices]
+        end_y = self.node_draw_y[end_indices]
+        #an edge may cross the view region with both ends outside it, so compare the bounding box of each edge with the region
+        x_min,y_min,x_max,y_max = self.view_region
+        on_screen = (np.maximum(start_x,end_x)>=x_min) & (np.minimum(start_x,end_x)<=x_max) & (np.maximum(start_y,end_y)>=y_min) & (np.minimum(start_y,end_y)<=y_max)
+        start_groups = self.node_groups[start_indices]
+        end_groups = self.node_groups[end_indices]
+        edges = np.flatnonzero(on_screen & (start_groups!=end_groups))
+        if len(self.cluster_counts)>0:
+            #many edges may join the same pair of clusters, only the first is drawn
+            group_pairs = np.column_stack((np.minimum(start_groups,end_groups),np.maximum(start_groups,end_groups)))[edges]
+            first_edges = np.unique(group_pairs,axis=0,return_index=True)[1]
+            edges = edges[np.sort(first_edges)]
+        self.edge_pool_indices = edges
+        self.edge_drawn = np.zeros(len(start_indices),dtype=bool) #whether each edge is drawn, for hit-testing
+        self.edge_drawn[edges] = True
+        coords = np.column_stack((start_x[edges],start_y[edges],end_x[edges],end_y[edges])).tolist()
+        widths = np.asarray(self.edge_widths)[edges].astype(int).tolist() #interesting thing about tkinter, circles can have non-integer sizes but lines need integer sizes
+        active_widths = [width+self.active_width_addition for width in widths]
+        colours = [self.edge_colours[i] for i in edges]
+        arrows = [self.edge_arrows[i] for i in edges]
+        #end_size = self.nodes_radii[end_index] #unused, we draw nodes over edges so no need to crop the edges
+        #draw a line to represent each edge, information about the start and end nodes will be displayed when we mouse over an edge
+        self.edge_pool.update(coords,fill=colours,width=widths,activewidth=active_widths,arrow=arrows)
+
+    #draw the nodes on the canvas, only those in view and not part of a cluster
     def render_nodes(self):
-        num_nodes = len(self.node_names)
-        for i in range(num_nodes):
-            #extract data
-            x = self.nodes_x[i]
-            y = self.nodes_y[i]
-            radius = self.nodes_radii[i]
-            colour = self.nodes_colour[i]
-            try:
-                self.canvas.delete(self.text_id) #delete the text popup if one exists
-            except AttributeError:
-                pass #if it does not exist, don't delete it
-            #delete all old node objects
-            if self.node_canvas_ids[i]!='blank':
-                #delete the old oval object if one exists
-                self.canvas.delete(self.node_canvas_ids[i])
-            id = self.canvas.create_oval(x-radius,y-radius,x+radius,y+radius,fill=colour) #draw a circle to represent the node
-            self.canvas.tag_bind(id,'<Enter>',self.node_enter) #some information about the node will be displayed when the mouse is hovered over it
-            self.canvas.tag_bind(id,'<Leave>',self.node_leave) #this information will stop being displayed when the mouse is no longer over the node
-            self.canvas.tag_bind(id,'<Button-1>',self.node_left_click) #depending on gui_mode, information about the nodes relationship to other nodes will be displayed
-            self.canvas.tag_bind(id,'<Button-2>',self.node_right_click) #depending on gui_mode, information about the nodes relationship to other nodes will be displayed
-            self.node_canvas_ids[i] = id #store the id so we can delete the object later
-
-    #draw the vehicle objects on the canvas
+        try:
+            self.canvas.delete(self.text_id) #delete the text popup if one exists
+        except AttributeError:
+            pass #if it does not exist, don't delete it
+        nodes = self.node_pool_indices
+        radii = np.asarray(self.nodes_radii)[nodes]
+        x = self.nodes_x[nodes]
+        y = self.nodes_y[nodes]
+        coords = np.column_stack((x-radii,y-radii,x+radii,y+radii)).tolist()
+        #draw a circle to represent each node, hovering and clicking on nodes displays information about them (see node_enter etc)
+        self.node_pool.update(coords,fill=[self.nodes_colour[i] for i in nodes])
+        self.render_clusters()
+
+    #draw clusters of nodes as circles growing with the number of nodes they contain, hovering over a cluster shows how many
+    def render_clusters(self):
+        self.cluster_radii = np.minimum(self.default_node_radius*np.sqrt(self.cluster_counts),self.max_node_radius)
+        x = self.cluster_x
+        y = self.cluster_y
+        coords = np.column_stack((x-self.cluster_radii,y-self.cluster_radii,x+self.cluster_radii,y+self.cluster_radii)).tolist()
+        self.cluster_pool.update(coords,fill=self.default_cluster_colour)
+        self.cluster_grid = spatial_index.GridIndex(x,y) #in zoomed coordinates, as clusters change with the zoom
+
+    #draw the vehicle objects on the canvas, only those in view
     def render_vehicles(self):
-        num_vehicles = len(self.sim_vehicles_current_names)
         self.derender_hover_vehicle_text() #remove existing vehicle hover text
-        #loop through all the current vehicles
-        for i in range(num_vehicles):
-            #extract data
-            x = self.sim_vehicles_current_x[i]
-            y = self.sim_vehicles_current_y[i]
-            length = self.sim_vehicles_current_length[i]
-            colour = self.sim_vehicles_current_colour[i]
-            #delete all old vehicle objects
-            if self.vehicle_canvas_ids[i]!='blank':
-                #delete the old rectangle object if one exists
-                self.canvas.delete(self.vehicle_canvas_ids[i])
-            id = self.canvas.create_rectangle(x-length,y-length,x+length,y+length,fill=colour)
-            self.canvas.tag_bind(id,'<Enter>',self.vehicle_enter) #some information about the vehicle will be displayed when the mouse is hovered over it
-            self.canvas.tag_bind(id,'<Leave>',self.vehicle_leave) #this information will be displayed when the mouse is no longer over the vehicle
-            self.canvas.tag_bind(id,'<Button-1>',self.vehicle_left_click) #this information will be displayed when the mouse is no longer over the vehicle
-            self.canvas.tag_bind(id,'<Button-2>',self.vehicle_right_click) #this information will be displayed when the mouse is no longer over the vehicle
-            #add code to display info about the vehicle when we hover over it
-            self.vehicle_canvas_ids[i] = id #store the id so we can delete the object later
+        self.calculate_view_region()
+        vehicles = np.flatnonzero(self.in_view_region(self.sim_vehicles_current_x,self.sim_vehicles_current_y))
+        self.vehicle_pool_indices = vehicles
+        x = self.sim_vehicles_current_x[vehicles]
+        y = self.sim_vehicles_current_y[vehicles]
+        length = self.sim_vehicles_current_length[vehicles]
+        coords = np.column_stack((x-length,y-length,x+length,y+length)).tolist()
+        #vehicles of the previous frame are moved and recoloured, some information about a vehicle will be displayed when the mouse is hovered over it
+        self.vehicle_pool.update(coords,fill=[self.sim_vehicles_current_colour[i] for i in vehicles])
+        self.vehicle_grid = spatial_index.GridIndex(x,y) #vehicles move every frame, so their grid (in zoomed coordinates) is rebuilt with them
 
         self.render_hover_vehicle_text() #recreate old vehicle hover text at the new location
 
     #combination of render nodes and render edges, in correct order to prevent edges spawning over nodes
     def render_graph(self):
+        self.update_level_of_detail() #decide what to draw for the current zoom and pan
         self.render_edges()
         self.render_nodes()
         if self.simulation_run_flag == True:
             self.render_vehicles() #render vehicles if we are in simulation view mode
+        self.hover_item = ('none',-1) #hover text was removed when redrawing, the next mouse movement finds the item under the mouse again
 
     #stop displaying all the nodes and edges
     def erase_network_graph(self):
         self.derender_hover_edge_text()
-        #erase all edges
-        for id in self.edge_canvas_ids:
-            if id!='blank':
-                self.canvas.delete(id)
-        #erase all nodes
-        for id in self.node_canvas_ids:
-            if id!='blank':
-                self.canvas.delete(id)
+        self.edge_pool.hide() #erase all edges
+        self.node_pool.hide() #erase all nodes
+        self.cluster_pool.hide() #erase all clusters of nodes
     
+    #HIT-TESTING, FINDING WHAT IS UNDER THE MOUSE
+    #one handler for the whole canvas finds the item under the mouse with spatial indices, rather than tk bindings on every item
+    #items on top are checked first, vehicles then nodes then clusters then edges
+
+    #convert zoomed canvas coordinates back to original (unzoomed) coordinates
+    def remove_accumulated_zoom(self,x,y):
+        original_x = (x-self.current_zoom_offset_x)/self.current_zoom
+        original_y = (y-self.current_zoom_offset_y)/self.current_zoom
+        return original_x,original_y
+
+    #index of the drawn node under canvas position x,y, -1 if there is none
+    #the node grid is over original positions, so the mouse position is converted rather than the grid being rebuilt on each zoom
+    def hit_node(self,x,y):
+        original_x,original_y = self.remove_accumulated_zoom(x,y)
+        search_radius = self.max_node_radius/abs(self.current_zoom) #no node is larger than this on screen
+        candidates = self.node_grid.query(original_x-search_radius,original_y-search_radius,original_x+search_radius,original_y+search_radius)
+        candidates = candidates[self.node_drawn[candidates]]
+        distances = np.hypot(self.nodes_x[candidates]-x,self.nodes_y[candidates]-y)
+        radii = np.array([self.nodes_radii[i] for i in candidates]) #only the candidates are converted, converting every radius would be O(nodes)
+        inside = distances<=radii
+        if np.any(inside)==False:
+            return -1
+        return int(candidates[inside][np.argmin(distances[inside])]) #the closest node if several overlap
+
+    #index of the cluster under canvas position x,y, -1 if there is none
+    def hit_cluster(self,x,y):
+        search_radius = self.max_node_radius #no cluster is larger than this
+        candidates = self.cluster_grid.query(x-search_radius,y-search_radius,x+search_radius,y+search_radius)
+        distances = np.hypot(self.cluster_x[candidates]-x,self.cluster_y[candidates]-y)
+        inside = distances<=self.cluster_radii[candidates]
+        if np.any(inside)==False:
+            return -1
+        return int(candidates[inside][np.argmin(distances[inside])])
+
+    #index of the drawn edge under canvas position x,y, -1 if there is none
+    #the edge grid holds points along each edge at original positions, an edge drawn to a cluster is at most a cluster cell away from its original position
+    def hit_edge(self,x,y):
+        original_x,original_y = self.remove_accumulated_zoom(x,y)
+        search_pixels = self.max_edge_width/2 + self.edge_hit_tolerance
+        if len(self.cluster_counts)>0:
+            search_pixels = search_pixels + self.cluster_pixels*np.sqrt(2)
+        search_radius = search_pixels/abs(self.current_zoom) + self.edge_sample_spacing/2
+        samples = self.edge_grid.query(original_x-search_radius,original_y-search_radius,original_x+search_radius,original_y+search_radius)
+        candidates = np.unique(self.edge_sample_owners[samples])
+        candidates = candidates[self.edge_drawn[candidates]]
+        start_indices = np.array([self.edge_start_indices[i] for i in candidates],dtype=np.int64)
+        end_indices = np.array([self.edge_end_indices[i] for i in candidates],dtype=np.int64)
+        widths = np.array([self.edge_widths[i] for i in candidates])
+        distances = spatial_index.distance_to_segments(x,y,self.node_draw_x[start_indices],self.node_draw_y[start_indices],self.node_draw_x[end_indices],self.node_draw_y[end_indices])
+        inside = distances<=widths/2 + self.edge_hit_tolerance
+        if np.any(inside)==False:
+            return -1
+        return int(candidates[inside][np.argmin(distances[inside])])
+
+    #index of the drawn vehicle under canvas position x,y, -1 if there is none
+    def hit_vehicle(self,x,y):
+        search_radius = self.default_vehicle_length
+        candidates = self.vehicle_grid.query(x-search_radius,y-search_radius,x+search_radius,y+search_radius)
+        vehicles = self.vehicle_pool_indices[candidates] #the vehicle grid only holds the drawn vehicles
+        length = self.sim_vehicles_current_length[vehicles]
+        inside = (np.abs(self.sim_vehicles_current_x[vehicles]-x)<=length) & (np.abs(self.sim_vehicles_current_y[vehicles]-y)<=length)
+        if np.any(inside)==False:
+            return -1
+        return int(vehicles[inside][-1]) #the last one drawn is on top
+
+    #find the item under canvas position x,y, returns the type of item ('vehicle','node','cluster','edge' or 'none') and its index
+    def hit_test(self,x,y):
+        if self.first_render_flag==True:
+            return ('none',-1) #there is no network drawn yet
+        if self.simulation_run_flag==True:
+            vehicle_index = self.hit_vehicle(x,y)
+            if vehicle_index!=-1:
+                return ('vehicle',vehicle_index)
+        node_index = self.hit_node(x,y)
+        if node_index!=-1:
+            return ('node',node_index)
+        cluster_index = self.hit_cluster(x,y)
+        if cluster_index!=-1:
+            return ('cluster',cluster_index)
+        edge_index = self.hit_edge(x,y)
+        if edge_index!=-1:
+            return ('edge',edge_index)
+        return ('none',-1)
+
+    #event for when the mouse moves over the canvas, calls the enter/leave handlers when the item under the mouse changes
+    def canvas_motion(self,event):
+        hit = self.hit_test(self.canvas.canvasx(event.x),self.canvas.canvasy(event.y))
+        if hit!=self.hover_item:
+            self.hover_leave()
+            self.hover_item = hit
+            self.hover_enter()
+
+    #event for when the mouse leaves the canvas
+    def canvas_leave(self,event):
+        self.hover_leave()
+        self.hover_item = ('none',-1)
+
+    #call the enter handler of the item under the mouse
+    def hover_enter(self):
+        item_type,id_index = self.hover_item
+        if item_type=='node':
+            self.node_enter(id_index)
+        elif item_type=='cluster':
+            self.cluster_enter(id_index)
+        elif item_type=='edge':
+            self.edge_enter(id_index)
+        elif item_type=='vehicle':
+            self.vehicle_enter(id_index)
+
+    #call the leave handler of the item the mouse was over
+    def hover_leave(self):
+        item_type,id_index = self.hover_item
+        if item_type=='node':
+            self.node_leave(id_index)
+        elif item_type=='cluster':
+            self.cluster_leave(id_index)
+        elif item_type=='edge':
+            self.edge_leave(id_index)
+        elif item_type=='vehicle':
+            self.vehicle_leave(id_index)
+
+    #event for a left click on the canvas, which starts a pan and may also click on a node or vehicle
+    def canvas_left_click(self,event):
+        self.pan_start(event)
+        item_type,id_index = self.hit_test(self.canvas.canvasx(event.x),self.canvas.canvasy(event.y))
+        if item_type=='node':
+            self.node_left_click(id_index)
+        elif item_type=='vehicle':
+            self.vehicle_left_click(id_index)
+
+    #event for a right click on the canvas
+    def canvas_right_click(self,event):
+        item_type,id_index = self.hit_test(self.canvas.canvasx(event.x),self.canvas.canvasy(event.y))
+        if item_type=='node':
+            self.node_right_click(id_index)
+        elif item_type=='vehicle':
+            self.vehicle_right_click(id_index)
+
     #EVENT HANDLERS (eg clicking, hovering) FOR CANVAS NODES
 
     #event for when we mouse over a node, create a text box revealling node name and (planned) number of waiting passengers   
-    def node_enter(self,event):
-        event_id = event.widget.find_withtag('current')[0]
-        id_index = self.node_canvas_ids.index(event_id)
+    def node_enter(self,id_index):
         node_name = self.node_names[id_index]
         self.log_print('node viewed ' + node_name)
         x = self.nodes_x[id_index]
@@ -1599,17 +1911,12 @@ class Display:
         self.text_id = self.canvas.create_text(x,y-15,text=display_text,state=tk.DISABLED) #create a text popup, which is not interactive
 
     #event for when the mouse leaves a node, remove the text box
-    def node_leave(self,event):
-        event_id = event.widget.find_withtag('current')[0]
-        id_index = self.node_canvas_ids.index(event_id)
-        node_name = self.node_names[id_index]
-        self.log_print('node left ' + node_name)
+    def node_leave(self,id_index):
+        self.log_print('node left ' + self.node_names[id_index])
         self.canvas.delete(self.text_id) #delete the text popup from node_enter
 
     #event for when we left-click on a node, outcome will depend on viewing mode
-    def node_left_click(self,event):
-        event_id = event.widget.find_withtag('current')[0]
-        id_index = self.node_canvas_ids.index(event_id) #get the index of the node which has been clicked on
+    def node_left_click(self,id_index):
         if self.last_node_right_click_index !=-1: #if a node has been right clicked on
             self.reset_edges_plot() #remove any old route
             self.plot_path_nodes(id_index,self.last_node_right_click_index,text_nodes=False,arrows=True) #draw a path from the left clicked node to the right clicked node
@@ -1619,9 +1926,7 @@ class Display:
         self.update_nodes()
 
     #event for when we right-click on a node
-    def node_right_click(self,event):
-        event_id = event.widget.find_withtag('current')[0]
-        id_index = self.node_canvas_ids.index(event_id) #get the index of the node which has been clicked on
+    def node_right_click(self,id_index):
         if id_index == self.last_node_left_click_index: #right clicking on a node we just left clicked on will do nothing for now
             pass
         elif self.last_node_left_click_index == -1: #as will right clicking if no left click has occured
@@ -1632,12 +1937,19 @@ class Display:
             self.render_graph() #re-render the network
             self.last_node_right_click_index = id_index
 
+    #event for when we mouse over a cluster of nodes, show how many nodes it contains
+    def cluster_enter(self,id_index):
+        display_text = str(self.cluster_counts[id_index]) + ' nodes, zoom in to view'
+        self.text_id = self.canvas.create_text(self.cluster_x[id_index],self.cluster_y[id_index]-15,text=display_text,state=tk.DISABLED)
+
+    #event for when the mouse leaves a cluster of nodes, remove the text box
+    def cluster_leave(self,id_index):
+        self.canvas.delete(self.text_id) #delete the text popup from cluster_enter
+
     #EVENT HANDLERS FOR CANVAS EDGES
 
     #event for when we mouse over an edge, display text boxes above connected nodes
-    def edge_enter(self,event):
-        event_id = event.widget.find_withtag('current')[0]
-        id_index = self.edge_canvas_ids.index(event_id)
+    def edge_enter(self,id_index):
         #find the nodes at the ends of the edge
         start_index = self.edge_start_indices[id_index]
         end_index = self.edge_end_indices[id_index]
@@ -1659,13 +1971,11 @@ class Display:
 
 
     #event for when we mouse away from an edge
-    def edge_leave(self,event):
+    def edge_leave(self,id_index):
         self.derender_hover_edge_text() #delete any hovering text related to the edge
 
     #event for when we mouse over a vehicle
-    def vehicle_enter(self,event):
-        event_id = event.widget.find_withtag('current')[0]
-        id_index = self.vehicle_canvas_ids.index(event_id)
+    def vehicle_enter(self,id_index):
         vehicle_name = self.sim_vehicles_current_names[id_index]
         #delete hover text if it exists
         self.derender_hover_vehicle_text()
@@ -1676,21 +1986,15 @@ class Display:
         
         
     #event for when we mouse away from a vehicle
-    def vehicle_leave(self,event):
-        event_id = event.widget.find_withtag('current')[0]
-        id_index = self.vehicle_canvas_ids.index(event_id)
-        #at the moment, we don't actually do anything here as we still want to display info about the vehicle when we are hovering over it
+    def vehicle_leave(self,id_index):
+        pass #at the moment, we don't actually do anything here as we still want to display info about the vehicle when we are hovering over it
     
     #event for when we left click a vehicle
-    def vehicle_left_click(self,event):
-        event_id = event.widget.find_withtag('current')[0]
-        id_index = self.vehicle_canvas_ids.index(event_id)
-        #placeholder for future functionality
+    def vehicle_left_click(self,id_index):
+        pass #placeholder for future functionality
     
     #event for when we right click a vehicle
-    def vehicle_right_click(self,event):
-        event_id = event.widget.find_withtag('current')[0]
-        id_index = self.vehicle_canvas_ids.index(event_id)
+    def vehicle_right_click(self,id_index):
         #right clicks will reset the vehicle popup text rendering
         self.derender_hover_vehicle_text()
         self.index_vehicle_text_popup = -1
@@ -1713,10 +2017,14 @@ class Display:
     #recreate existing objects in the correctly zoomed position
     def apply_correct_zoom(self,zoom_delta,mouse_x,mouse_y):
         #update the graph
-        self.recalculate_nodes_position(zoom_delta,mouse_x,mouse_y)
-        self.recalculate_edge_midpoints(zoom_delta,mouse_x,mouse_y)
+        self.recalculate_nodes_position()
+        self.recalculate_edge_midpoints()
         if self.simulation_run_flag == True: #only recalculate vehicle position if vehicles exists
-            self.recalculate_vehicle_position(zoom_delta,mouse_x,mouse_y)
+            self.recalculate_vehicle_position()
+        self.refresh_view()
+
+    #redraw the graph and the text on it, after the zoom or the part of the canvas on screen has changed
+    def refresh_view(self):
         self.render_graph()
         self.node_names_update() #update the rendering of node names
         #update text overlays if simulation has been setup
@@ -1724,44 +2032,23 @@ class Display:
             self.update_text_same_node() 
             self.generate_edge_overlay_text()
 
-    #apply the accumulated zoom to newly created objects
+    #apply the accumulated zoom (the view transform, a scale followed by an offset) to original positions, x and y may be numpy arrays
     def apply_accumlated_zoom(self,x,y):
         new_x = (x*self.current_zoom)+(self.current_zoom_offset_x)
         new_y = (y*self.current_zoom)+(self.current_zoom_offset_y)
         return new_x,new_y 
 
-    #recalculate all node positions in response to the zoom action
-    def recalculate_nodes_position(self,zoom_delta,mouse_x,mouse_y):
-        num_nodes = len(self.nodes_x)
-        #recalculate the position of all nodes
-        for i in range(num_nodes):
-            new_x,new_y = self.recalculate_zoom_position(self.nodes_x[i],self.nodes_y[i],zoom_delta,mouse_x,mouse_y)
-            self.nodes_x[i] = new_x
-            self.nodes_y[i] = new_y
+    #recalculate all node positions from their original positions, in response to the zoom action
+    def recalculate_nodes_position(self):
+        self.nodes_x,self.nodes_y = self.apply_accumlated_zoom(self.nodes_x_original,self.nodes_y_original)
     
     #recalculate the midpoint of all edges in response to zooming
-    def recalculate_edge_midpoints(self,zoom_delta,mouse_x,mouse_y):
-        num_edges = len(self.edges_midpoint_x)
-        #recalculate the position of all edge midpoints
-        for i in range(num_edges):
-            new_x,new_y = self.recalculate_zoom_position(self.edges_midpoint_x[i],self.edges_midpoint_y[i],zoom_delta,mouse_x,mouse_y)
-            self.edges_midpoint_x[i] = new_x
-            self.edges_midpoint_y[i] = new_y
+    def recalculate_edge_midpoints(self):
+        self.edges_midpoint_x,self.edges_midpoint_y = self.apply_accumlated_zoom(self.edges_midpoint_x_original,self.edges_midpoint_y_original)
 
     #recalculate the position of all vehicles in response to zooming
-    def recalculate_vehicle_position(self,zoom_delta,mouse_x,mouse_y):
-        num_vehicles = len(self.sim_vehicles_current_names)
-        #recalculate the position of all vehicles
-        for i in range(num_vehicles):
-            new_x,new_y = self.recalculate_zoom_position(self.sim_vehicles_current_x[i],self.sim_vehicles_current_y[i],zoom_delta,mouse_x,mouse_y)
-            self.sim_vehicles_current_x[i] = new_x
-            self.sim_vehicles_current_y[i] = new_y
-
-    #recalculate the position of an object to be correct under the new zoom regime
-    def recalculate_zoom_position(self,x,y,zoom_delta,mouse_x,mouse_y):
-        new_x = x*(1+zoom_delta)-(mouse_x*zoom_delta)
-        new_y = y*(1+zoom_delta)-(mouse_y*zoom_delta)
-        return new_x,new_y
+    def recalculate_vehicle_position(self):
+        self.sim_vehicles_current_x,self.sim_vehicles_current_y = self.apply_accumlated_zoom(self.sim_vehicles_current_x_original,self.sim_vehicles_current_y_original)
 
     #define pan function
     def pan_start(self,event):
@@ -1770,6 +2057,7 @@ class Display:
         #mouse_y = int(self.canvas.canvasy(event.y))
         #print('mouse x ',mouse_x,' mouse y ',mouse_y)
         self.canvas.scan_mark(event.x, event.y) #record the position of start of scan
+        self.pan_start_view = (self.canvas.canvasx(0),self.canvas.canvasy(0)) #part of the canvas on screen before the pan
     
     #define scan function
     def pan_end(self,event):
@@ -1779,6 +2067,13 @@ class Display:
         #print('mouse x ',mouse_x,' mouse y ',mouse_y)
         self.canvas.scan_dragto(event.x, event.y,gain=self.scroll_gain) #record the position of start of scan
 
+    #at the end of a pan, draw what has come into view (only what was on screen, plus a margin, was drawn)
+    def pan_finish(self,event):
+        if self.first_render_flag==True:
+            return #there is no network drawn yet
+        if (self.canvas.canvasx(0),self.canvas.canvasy(0))!=self.pan_start_view: #a click without dragging does not move the view
+            self.refresh_view()
+
     #FUNCTIONS TO GENERATE INFO TEXT ABOVE NODES
 
     #display the number of passengers travelling to/from a clicked node to all other nodes (per hour as currently setup) as text above the nodes
@@ -1815,39 +2110,34 @@ class Display:
     #perform the actual text rendering of text near all nodes
     #whether this happens above or below all nodes can be selected 
     def display_text_info_node(self,info,where_mode='below',type_mode='text'):
-        num_nodes = len(self.node_names)
-        self.erase_all_nodes_text(mode=where_mode) #clear any old text
+        #only nodes drawn individually (and only when zoomed in far enough on large networks) get text
+        nodes = self.label_node_indices
+        info = [info[i] for i in nodes]
+        if type_mode=='float':
+            texts = ["{:.2f}".format(this_info) for this_info in info] #floating point data
+        elif type_mode=='integer':
+            texts = [str(this_info) for this_info in info] #integer data
+        else:
+            texts = list(info)
+        #text is shown with the items used for the previous text, which is replaced
         if where_mode=='below':
-            self.node_below_text_ids = ['blank']*num_nodes #create a container for the new text ids
+            text_pool = self.node_below_text_pool
+            text_offset = 15
         elif where_mode=='above':
-            self.node_above_text_ids = ['blank']*num_nodes #create a container for the new text ids
-        for i in range(num_nodes): #for every node
-            node_x = self.nodes_x[i]
-            node_y = self.nodes_y[i]
-            this_info = info[i]
-            if type_mode=='float':
-                this_info = "{:.2f}".format(this_info) #floating point data
-            elif type_mode=='integer':
-                this_info = str(this_info) #integer data
-            if where_mode=='below':
-                self.node_below_text_ids[i] = self.canvas.create_text(node_x,node_y+15,text=this_info,state=tk.DISABLED,fill=self.default_node_text_colour) #create a text popup, which is not interactive
-            elif where_mode=='above':
-                self.node_above_text_ids[i] = self.canvas.create_text(node_x,node_y-15,text=this_info,state=tk.DISABLED,fill=self.default_node_text_colour) #create a text popup, which is not interactive
+            text_pool = self.node_above_text_pool
+            text_offset = -15
+        coords = np.column_stack((self.nodes_x[nodes],self.nodes_y[nodes]+text_offset)).tolist()
+        text_pool.update(coords,text=texts,fill=self.default_node_text_colour)
+        text_pool.raise_items() #keep the text above the network, as newly created text would be
 
     #erase text displayed next to all nodes (eg num passengers/journey time)
     def erase_all_nodes_text(self,mode='both'):
         #self.last_node_left_click_index = -1 #we are deleting all nodes text, so reset if any nodes have been clicked
         #text to delete depends on mode
-        if mode == 'above':
-            text_ids = self.node_above_text_ids
-        elif mode == 'below':
-            text_ids = self.node_below_text_ids
-        elif mode == 'both':
-            text_ids = self.node_above_text_ids + self.node_below_text_ids
-        #delete the selected text
-        for id in text_ids:
-            if id!='blank':
-                self.canvas.delete(id)
+        if mode == 'above' or mode == 'both':
+            self.node_above_text_pool.hide()
+        if mode == 'below' or mode == 'both':
+            self.node_below_text_pool.hide()
 
     #FUNCTIONS TO GENERATE INFO TEXT ABOVE EDGES
 
@@ -1909,13 +2199,19 @@ class Display:
         self.display_text_info_above_edges(edges_text)
 
     def display_text_info_above_edges(self,info):
-        num_edges = len(self.edge_names)
-        self.erase_all_edges_text() #clear any old text
-        self.edge_text_ids = ['blank']*num_edges #create a container for the new text ids
-        for i in range(num_edges): #for every edge
-            edge_x = self.edges_midpoint_x[i]
-            edge_y = self.edges_midpoint_y[i]
-            self.edge_text_ids[i] = self.canvas.create_text(edge_x,edge_y,text=info[i],state=tk.DISABLED,fill=self.default_edge_text_colour) #create a text popup, which is not interactive
+        self.last_edge_left_click_index = -1 #the old text is replaced, so reset if any edges have been clicked
+        #text at the midpoint of edges in view, when node text is shown and neither end is part of a cluster
+        if len(self.label_node_indices)>0:
+            start_indices = np.asarray(self.edge_start_indices,dtype=np.int64)
+            end_indices = np.asarray(self.edge_end_indices,dtype=np.int64)
+            num_nodes = len(self.node_names)
+            unclustered = (self.node_groups[start_indices]<num_nodes) & (self.node_groups[end_indices]<num_nodes)
+            edges = np.flatnonzero(unclustered & self.in_view_region(self.edges_midpoint_x,self.edges_midpoint_y))
+        else:
+            edges = np.zeros(0,dtype=np.int64)
+        coords = np.column_stack((self.edges_midpoint_x[edges],self.edges_midpoint_y[edges])).tolist()
+        self.edge_text_pool.update(coords,text=[info[i] for i in edges],fill=self.default_edge_text_colour)
+        self.edge_text_pool.raise_items() #keep the text above the network, as newly created text would be
 
     #render edge names
     def render_edge_names(self):
@@ -1924,9 +2220,7 @@ class Display:
     #erase text displayed next to all edges
     def erase_all_edges_text(self):
         self.last_edge_left_click_index = -1 #we are deleting all nodes text, so reset if any edges have been clicked
-        for id in self.edge_text_ids:
-            if id!='blank':
-                self.canvas.delete(id)
+        self.edge_text_pool.hide()
 
     #FUNCTIONS TO GENERATE INFO TEXT ABOVE VEHICLES
 
@@ -2,6 +2,7 @@
 #schedule class, stores the list of nodes the vehicle is trying to reach, and the edge needed to reach each node
 import numpy as np
 import copy as copy
+import bisect as bisect #for finding the next service in a timetable
 
 class Schedule:
     #initialise the empty schedule
@@ -100,10 +101,54 @@ class Schedule:
         
         return node_found,search_node_time,nodes_after,node_times_after
 
+    #index of the first visit to each node name in the schedule, used to find the schedules stopping at every node in one pass
+    def first_node_positions(self):
+        positions = {}
+        for i,node_name in enumerate(self.node_names):
+            positions.setdefault(node_name,i)
+        return positions
+
+    #the nodes after position i and the times to reach them from it, as returned by node_name_in_schedule
+    def nodes_after_position(self,i):
+        search_node_time = self.schedule_times[i]
+        node_times_after = [schedule_time-search_node_time for schedule_time in self.schedule_times[i+1:]]
+        return search_node_time,self.nodes[i+1:],node_times_after
+
     def get_length(self): #get the length of a schedule (time taken to traverse)
         length = 0
         for edge in self.edges:
             length = length + edge.travel_time
         return length
 
+#departure times (from the start node) of every service of a schedule, in order
+#one timetable is shared by the network (for dispatch) and every node the schedule stops at, nodes add the time taken to reach them
+#so nodes store an offset rather than their own copy of the times
+class Timetable:
+    def __init__(self,departures):
+        self.departures = tuple(departures) #immutable, as it is shared
+
+    def __len__(self):
+        return len(self.departures)
+
+    #index of the first service reaching a node (offset minutes after departing) at or after time, searching from index start
+    def next_service_index(self,time,offset=0,start=0):
+        return bisect.bisect_left(self.departures,time,start,key=lambda departure: departure+offset)
+
+    #index of the first service reaching a node (offset minutes after departing) after time, searching from index start
+    def first_service_after(self,time,offset=0,start=0):
+        return bisect.bisect_right(self.departures,time,start,key=lambda departure: departure+offset)
+
+    #time service i reaches a node offset minutes after departing, infinite if there is no such service
+    def service_time(self,i,offset=0):
+        if i<len(self.departures):
+            return self.departures[i]+offset
+        return np.inf
 
+#departures every gap minutes from offset until finish, the fixed gap timetable of the simple and complex schedule formats
+def regular_departures(offset,gap,finish):
+    departures = []
+    service_time = offset
+    while service_time<=finish:
+        departures.append(service_time)
+        service_time = service_time + gap
+    return departures
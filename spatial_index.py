@@ -0,0 +1,94 @@
+#spatial_index.py
+#grid based spatial index of points (eg node positions), for finding the points in a region, grouping nearby points and finding what is under the mouse
+
+import numpy as np #for large scale mathematical operations
+
+#uniform grid over a set of points, points are sorted by the cell they fall in so each row of cells is one contiguous block
+#cells are sized to hold points_per_cell points on average
+class GridIndex:
+    def __init__(self,x,y,points_per_cell=4):
+        self.x = np.asarray(x,dtype=np.float64)
+        self.y = np.asarray(y,dtype=np.float64)
+        num_points = len(self.x)
+        if num_points==0:
+            self.min_x = self.min_y = 0.0
+            self.cell_size = 1.0
+            self.num_columns = self.num_rows = 1
+            self.order = np.zeros(0,dtype=np.int64)
+            self.cell_starts = np.zeros(2,dtype=np.int64)
+            return
+        self.min_x = np.min(self.x)
+        self.min_y = np.min(self.y)
+        width = np.max(self.x)-self.min_x
+        height = np.max(self.y)-self.min_y
+        area = max(width,1e-9)*max(height,1e-9)
+        self.cell_size = max(np.sqrt(area*points_per_cell/num_points),1e-9)
+        self.num_columns = int(width/self.cell_size) + 1
+        self.num_rows = int(height/self.cell_size) + 1
+        keys = self.cell_rows(self.y)*self.num_columns + self.cell_columns(self.x)
+        self.order = np.argsort(keys,kind='stable') #points sorted by cell, row by row
+        #points of cell k are order[cell_starts[k]:cell_starts[k+1]]
+        self.cell_starts = np.searchsorted(keys[self.order],np.arange(self.num_rows*self.num_columns+1))
+
+    def cell_columns(self,x):
+        return np.clip(((np.asarray(x)-self.min_x)/self.cell_size).astype(np.int64),0,self.num_columns-1)
+
+    def cell_rows(self,y):
+        return np.clip(((np.asarray(y)-self.min_y)/self.cell_size).astype(np.int64),0,self.num_rows-1)
+
+    #indices (in increasing order) of the points inside a rectangle
+    def query(self,x_min,y_min,x_max,y_max):
+        if len(self.order)==0 or x_max<self.min_x or y_max<self.min_y:
+            return np.zeros(0,dtype=np.int64)
+        first_column,last_column = self.cell_columns([x_min,x_max])
+        first_row,last_row = self.cell_rows([y_min,y_max])
+        blocks = []
+        for row in range(first_row,last_row+1): #the cells of a row between two columns are contiguous
+            start = self.cell_starts[row*self.num_columns + first_column]
+            end = self.cell_starts[row*self.num_columns + last_column + 1]
+            blocks.append(self.order[start:end])
+        candidates = np.concatenate(blocks)
+        #cells on the border of the rectangle may hold points outside it
+        inside = (self.x[candidates]>=x_min) & (self.x[candidates]<=x_max) & (self.y[candidates]>=y_min) & (self.y[candidates]<=y_max)
+        return np.sort(candidates[inside])
+
+#group points into clusters, one per square cell of the given size (with corners at multiples of cell_size)
+#returns the cluster of each point, and the centre (mean position) and number of points of each cluster
+def cluster_points(x,y,cell_size):
+    x = np.asarray(x,dtype=np.float64)
+    y = np.asarray(y,dtype=np.float64)
+    if len(x)==0:
+        return np.zeros(0,dtype=np.int64),np.zeros(0),np.zeros(0),np.zeros(0,dtype=np.int64)
+    cells = np.column_stack((np.floor(x/cell_size),np.floor(y/cell_size)))
+    cells,labels,counts = np.unique(cells,axis=0,return_inverse=True,return_counts=True)
+    labels = labels.reshape(-1)
+    centre_x = np.bincount(labels,weights=x)/counts
+    centre_y = np.bincount(labels,weights=y)/counts
+    return labels,centre_x,centre_y,counts
+
+#points spaced at most spacing apart along each segment (including both ends), so a grid index of them finds segments near a point
+#returns the sample positions and the index of the segment each sample belongs to
+def sample_segments(start_x,start_y,end_x,end_y,spacing):
+    start_x = np.asarray(start_x,dtype=np.float64)
+    start_y = np.asarray(start_y,dtype=np.float64)
+    end_x = np.asarray(end_x,dtype=np.float64)
+    end_y = np.asarray(end_y,dtype=np.float64)
+    lengths = np.hypot(end_x-start_x,end_y-start_y)
+    num_steps = np.ceil(lengths/spacing).astype(np.int64) + 1 #samples per segment
+    owners = np.repeat(np.arange(len(lengths)),num_steps)
+    #position of each sample along its segment, from 0 (start) to 1 (end)
+    first_samples = np.cumsum(num_steps)-num_steps
+    steps = np.arange(len(owners))-first_samples[owners]
+    fractions = steps/np.maximum(num_steps[owners]-1,1)
+    sample_x = start_x[owners] + (end_x[owners]-start_x[owners])*fractions
+    sample_y = start_y[owners] + (end_y[owners]-start_y[owners])*fractions
+    return sample_x,sample_y,owners
+
+#distance from a point to each segment
+def distance_to_segments(x,y,start_x,start_y,end_x,end_y):
+    delta_x = end_x-start_x
+    delta_y = end_y-start_y
+    length_squared = delta_x**2 + delta_y**2
+    #fraction along the segment of the closest point, segments of zero length are treated as a point
+    fractions = np.clip(((x-start_x)*delta_x + (y-start_y)*delta_y)/np.where(length_squared>0,length_squared,1),0,1)
+    return np.hypot(start_x+fractions*delta_x-x,start_y+fractions*delta_y-y)
@@ -0,0 +1,65 @@
+#style.py
+#appearance of the network, shared by the tk display (render.py) and the headless image exporter (export.py)
+#colour scales take numpy arrays and return (n x 3) arrays of 0-255 rgb values, which can be converted to tk hex colours
+
+import numpy as np #for large scale mathematical operations
+
+#default appearance
+DEFAULT_NODE_RADIUS = 5 #node size if nodes unscaled
+MAX_NODE_RADIUS = 30 #maximum node radius if node size scaled
+MIN_NODE_RADIUS = 2 #minimum node size if nodes scaled
+CUSTOM_NODE_EXPONENT = 3 #how does node radii (and colour) scale with amount of stuff happening at that node
+DEFAULT_NODE_COLOUR = 'grey' #node colour if nodes uncoloured
+DEFAULT_EDGE_WIDTH = 2 #default width of an edge
+DEFAULT_EDGE_COLOUR = 'black' #what colour will an edge be by default
+DEFAULT_VEHICLE_LENGTH = 3
+DEFAULT_VEHICLE_COLOUR = 'blue'
+OUTLINE_COLOUR = 'black' #tk draws nodes and vehicles with a one pixel outline of this colour
+BACKGROUND_COLOUR = 'white'
+#default vehicle capacities, used for determining vehicle colours based on crowding levels
+#note standing capacity is standing + seated capacity
+VEHICLE_SEATED_CAPACITY = 960 #sydney trains A/B class, 8 carriage
+VEHICLE_STANDING_CAPACITY = 1680 #sydney trains A/B class, 8 carriage, roughly 4 pax/m^2 open space
+
+#rgb values of the tk named colours used by the display
+NAMED_COLOURS = {'white':(255,255,255),'black':(0,0,0),'grey':(190,190,190),'dim grey':(105,105,105),'blue':(0,0,255),'magenta':(255,0,255),'purple':(160,32,240)}
+
+#convert a tk colour (a name in NAMED_COLOURS or "#rrggbb") to an rgb tuple
+def colour_to_rgb(colour):
+    if colour.startswith('#') and len(colour)==7:
+        return (int(colour[1:3],16),int(colour[3:5],16),int(colour[5:7],16))
+    return NAMED_COLOURS[colour]
+
+#convert an (n x 3) array of 0-255 rgb values to the hex format expected by tkinter
+def rgb_to_hex(rgb):
+    return ['#%02x%02x%02x' % (red,green,blue) for red,green,blue in np.asarray(rgb).tolist()]
+
+#convert fractions from 0 to 1 of red, green and blue to 0-255 values, truncating as int() does
+def to_rgb(red,green,blue):
+    return (np.column_stack((red,green,blue))*255).astype(np.int64)
+
+#colour scale for nodes, blue at 0, green at midpoint and red at 1
+def node_scale_rgb(fractions,midpoint=0.3):
+    fractions = np.asarray(fractions,dtype=np.float64)
+    low = fractions<=midpoint
+    red = np.where(low,0,(fractions-midpoint)/(1-midpoint)) #from green to red above the midpoint
+    green = np.where(low,fractions/midpoint,1-red) #from blue to green below the midpoint
+    blue = np.where(low,1-green,0)
+    return to_rgb(red,green,blue)
+
+#colour of vehicles based on how crowded they are
+#blue is empty, green is half seated capacity, yellow is full seated capacity, red is full standing capacity (and overloaded)
+#note at the moment, this requires all vehicles to all have the same capacity
+def crowding_rgb(vehicle_num_passengers,seated_capacity,standing_capacity):
+    passengers = np.asarray(vehicle_num_passengers,dtype=np.float64)
+    fraction_seated_capacity = passengers/seated_capacity
+    fraction_standing_capacity = (passengers-seated_capacity)/(standing_capacity-seated_capacity)
+    midpoint = 0.5
+    half_seated = (passengers<=seated_capacity) & (fraction_seated_capacity<=midpoint)
+    seated = (passengers<=seated_capacity) & (half_seated==False)
+    standing = (passengers>seated_capacity) & (passengers<=standing_capacity)
+    #anything else (overloaded) is red
+    red = np.select([half_seated,seated,standing],[0,(fraction_seated_capacity-midpoint)/(1-midpoint),1],1)
+    green = np.select([half_seated,seated,standing],[fraction_seated_capacity/midpoint,1,1-fraction_standing_capacity],0)
+    blue = np.where(half_seated,1-fraction_seated_capacity/midpoint,0)
+    return to_rgb(red,green,blue)
@@ -0,0 +1,287 @@
+#trace_store.py
+#stores the data logged about vehicles and nodes over the course of a simulation as numpy columns
+
+import numpy as np
+import os as os #for creating trace directories
+import json as json #for trace metadata
+
+#names and types of the per vehicle record columns
+VEHICLE_COLUMNS = (('vehicle_ids',np.int32),('vehicle_latitudes',np.float32),('vehicle_longitudes',np.float32),('vehicle_passengers',np.float32))
+
+#what data is recorded into the trace during a simulation
+#vehicle_position_interval: record vehicle positions every this many timesteps, 0 to never record positions
+#timesteps where positions are not recorded store nan positions, and skip calculating vehicle coordinates
+#record_vehicle_passengers: record the passenger count of each vehicle every timestep
+#record_node_loads: record the passengers waiting at each node every timestep
+class RecordingPolicy:
+    def __init__(self,vehicle_position_interval=1,record_vehicle_passengers=True,record_node_loads=True):
+        self.vehicle_position_interval = vehicle_position_interval
+        self.record_vehicle_passengers = record_vehicle_passengers
+        self.record_node_loads = record_node_loads
+
+    #should vehicle positions be recorded at the timestep with the given index
+    def record_positions_at(self,index):
+        return self.vehicle_position_interval>0 and index%self.vehicle_position_interval==0
+
+    #is anything about vehicles recorded at the timestep with the given index
+    def record_vehicles_at(self,index):
+        return self.record_vehicle_passengers or self.record_positions_at(index)
+
+#get one of the standard recording policies by name
+#full: everything every timestep, this is needed to view the simulation
+#sparse_positions: vehicle positions every 5 timesteps, counts every timestep
+#counts_only: vehicle passenger counts and node loads but no positions, enough for evaluation
+#none: nothing is recorded into the trace, for when only evaluator accumulators are needed
+def recording_policy_preset(name):
+    if name=='full':
+        return RecordingPolicy()
+    elif name=='sparse_positions':
+        return RecordingPolicy(vehicle_position_interval=5)
+    elif name=='counts_only':
+        return RecordingPolicy(vehicle_position_interval=0)
+    elif name=='none':
+        return RecordingPolicy(vehicle_position_interval=0,record_vehicle_passengers=False,record_node_loads=False)
+    else:
+        raise ValueError(str(name) + ' is not a valid recording policy, use full, sparse_positions, counts_only or none')
+
+#columnar store for simulation data
+#node data is a preallocated (time x node) matrix, as the number of nodes is fixed, with no rows if node loads are not recorded
+#vehicle data is stored one row per vehicle per timestep in growable columns, rows for timestep i are vehicle_offsets[i]:vehicle_offsets[i+1]
+#vehicles are stored by integer id, their names are stored once in the vehicle_names lookup table
+class TraceStore:
+    #max_times is the most timesteps that will be recorded, num_nodes the number of nodes in the network
+    #vehicle_names is the list of vehicle names indexed by vehicle id, this is normally the networks own list and is appended to as vehicles are created
+    #record_node_loads False (see RecordingPolicy) allocates no node rows, as the matrix is the largest part of the trace on large networks
+    def __init__(self,max_times,num_nodes,vehicle_names,initial_vehicle_capacity=4096,record_node_loads=True):
+        self.num_times = 0 #number of timesteps recorded so far
+        self.times = np.zeros(max_times,dtype=np.int32) #simulation time at each recorded timestep
+        self.node_loads = np.zeros((max_times if record_node_loads else 0,num_nodes),dtype=np.float32) #passengers waiting at each node at each timestep
+        self.vehicle_names = vehicle_names
+        self.vehicle_offsets = np.zeros(max_times+1,dtype=np.int64) #where each timesteps vehicle rows start
+        self.num_vehicle_records = 0 #number of vehicle rows used
+        self.vehicle_ids = np.zeros(initial_vehicle_capacity,dtype=np.int32)
+        self.vehicle_latitudes = np.zeros(initial_vehicle_capacity,dtype=np.float32)
+        self.vehicle_longitudes = np.zeros(initial_vehicle_capacity,dtype=np.float32)
+        self.vehicle_passengers = np.zeros(initial_vehicle_capacity,dtype=np.float32)
+
+    #start recording a new timestep
+    def record_time(self,time):
+        self.times[self.num_times] = time
+        self.num_times = self.num_times + 1
+        self.vehicle_offsets[self.num_times] = self.num_vehicle_records #timestep starts with no vehicles
+
+    #record the vehicles present at the current timestep, arguments are equal length sequences
+    def record_vehicles(self,ids,latitudes,longitudes,passengers):
+        start = self.num_vehicle_records
+        end = start + len(ids)
+        if end>len(self.vehicle_ids):
+            self.grow_vehicle_records(end)
+        self.vehicle_ids[start:end] = ids
+        self.vehicle_latitudes[start:end] = latitudes
+        self.vehicle_longitudes[start:end] = longitudes
+        self.vehicle_passengers[start:end] = passengers
+        self.num_vehicle_records = end
+        self.vehicle_offsets[self.num_times] = end
+
+    #record the passengers waiting at each node at the current timestep
+    def record_nodes(self,loads):
+        self.node_loads[self.num_times-1] = loads
+
+    #grow the vehicle columns so they can hold at least min_capacity rows, capacity is doubled to keep appends cheap
+    def grow_vehicle_records(self,min_capacity):
+        new_capacity = max(min_capacity,2*len(self.vehicle_ids))
+        for column_name,column_type in VEHICLE_COLUMNS:
+            old_column = getattr(self,column_name)
+            new_column = np.zeros(new_capacity,dtype=old_column.dtype)
+            new_column[:self.num_vehicle_records] = old_column[:self.num_vehicle_records]
+            setattr(self,column_name,new_column)
+
+    #trim the store down to the data actually recorded, called once the simulation has finished
+    #returns the trace to read the data back from, which for an in memory store is the store itself
+    def finish(self):
+        self.times = self.times[:self.num_times]
+        self.node_loads = self.node_loads[:self.num_times]
+        self.vehicle_offsets = self.vehicle_offsets[:self.num_times+1]
+        used = self.num_vehicle_records
+        self.vehicle_ids = self.vehicle_ids[:used].copy()
+        self.vehicle_latitudes = self.vehicle_latitudes[:used].copy()
+        self.vehicle_longitudes = self.vehicle_longitudes[:used].copy()
+        self.vehicle_passengers = self.vehicle_passengers[:used].copy()
+        return self
+
+    #get the ids, latitudes, longitudes and passenger counts of the vehicles present at the timestep with the given index
+    #these are views into the store, not copies
+    def get_vehicles_at(self,index):
+        start = self.vehicle_offsets[index]
+        end = self.vehicle_offsets[index+1]
+        return self.vehicle_ids[start:end],self.vehicle_latitudes[start:end],self.vehicle_longitudes[start:end],self.vehicle_passengers[start:end]
+
+    #convert vehicle ids into vehicle names
+    def get_vehicle_names(self,ids):
+        return [self.vehicle_names[id] for id in ids]
+
+    #index of the last recorded timestep at or before a simulation time (the first timestep if time is before it)
+    #timesteps are normally recorded at a regular interval, so the index is calculated directly and only checked against the times
+    def index_at_time(self,time):
+        num_times = len(self.times)
+        if num_times==0:
+            return -1
+        first_time = self.times[0]
+        interval = self.times[1]-first_time if num_times>1 else 1
+        if interval>0:
+            index = int(min(max((time-first_time)//interval,0),num_times-1))
+            if self.times[index]<=time and (index==num_times-1 or self.times[index+1]>time):
+                return index
+        #irregular timesteps, search for the time instead
+        return int(max(np.searchsorted(self.times,time,side='right')-1,0))
+
+    #get the passengers waiting at each node at the timestep with the given index, zero if node loads were not recorded
+    def get_node_loads_at(self,index):
+        if len(self.node_loads)==0:
+            return np.zeros(self.node_loads.shape[1],dtype=np.float32)
+        return self.node_loads[index]
+
+    #get all vehicle rows for timesteps start to end (not including end) as array views
+    #also returns the offsets of each timestep within the returned rows
+    def get_vehicles_in_range(self,start,end):
+        first = self.vehicle_offsets[start]
+        last = self.vehicle_offsets[end]
+        offsets = self.vehicle_offsets[start:end+1] - first
+        return offsets,self.vehicle_ids[first:last],self.vehicle_latitudes[first:last],self.vehicle_longitudes[first:last],self.vehicle_passengers[first:last]
+
+    #get the passenger counts of vehicles at each timestep from start to end, as a list of array views
+    def vehicle_passengers_by_time(self,start=0,end=None):
+        if end is None:
+            end = self.num_times
+        offsets = self.vehicle_offsets
+        return [self.vehicle_passengers[offsets[i]:offsets[i+1]] for i in range(start,end)]
+
+    #passenger counts from start to end as a dense (time x vehicle) matrix for vectorised evaluation
+    #column j holds the j'th vehicle recorded at each timestep (not a fixed vehicle), unused entries are nan
+    def vehicle_passenger_matrix(self,start=0,end=None):
+        if end is None:
+            end = self.num_times
+        offsets,ids,latitudes,longitudes,passengers = self.get_vehicles_in_range(start,end)
+        counts = np.diff(offsets)
+        num_columns = np.max(counts,initial=0)
+        matrix = np.full((end-start,num_columns),np.nan,dtype=np.float32)
+        rows = np.repeat(np.arange(end-start),counts) #timestep of each record
+        columns = np.arange(len(passengers)) - offsets[rows] #position of each record within its timestep
+        matrix[rows,columns] = passengers
+        return matrix
+
+    #memory used by the stored arrays in bytes, not including vehicle names
+    def nbytes(self):
+        return self.times.nbytes + self.node_loads.nbytes + self.vehicle_offsets.nbytes + self.vehicle_ids.nbytes + self.vehicle_latitudes.nbytes + self.vehicle_longitudes.nbytes + self.vehicle_passengers.nbytes
+
+
+#writes a trace to disk as it is recorded, rather than holding it in memory, for long simulations of large networks
+#has the same recording interface as TraceStore
+#trace_path is a directory, node loads, times and offsets are preallocated .npy files accessed through memory maps
+#vehicle columns are appended to raw binary files as each timestep is recorded
+#resume_from (num_times,num_vehicle_records) carries on writing an unfinished trace already at trace_path after its first num_times timesteps, eg from a checkpoint
+class MemmapTraceWriter:
+    def __init__(self,trace_path,max_times,num_nodes,vehicle_names,record_node_loads=True,resume_from=None):
+        os.makedirs(trace_path,exist_ok=True)
+        self.trace_path = trace_path
+        self.num_nodes = num_nodes
+        self.vehicle_names = vehicle_names
+        if resume_from is None:
+            self.num_times = 0
+            self.num_vehicle_records = 0
+            self.times = np.lib.format.open_memmap(os.path.join(trace_path,'times.npy'),mode='w+',dtype=np.int32,shape=(max_times,))
+            self.node_loads = np.lib.format.open_memmap(os.path.join(trace_path,'node_loads.npy'),mode='w+',dtype=np.float32,shape=(max_times if record_node_loads else 0,num_nodes))
+            self.vehicle_offsets = np.lib.format.open_memmap(os.path.join(trace_path,'vehicle_offsets.npy'),mode='w+',dtype=np.int64,shape=(max_times+1,))
+            self.vehicle_offsets[0] = 0
+            self.vehicle_files = [open(os.path.join(trace_path,column_name+'.bin'),'wb') for column_name,column_type in VEHICLE_COLUMNS]
+        else:
+            self.num_times,self.num_vehicle_records = resume_from
+            self.times = np.lib.format.open_memmap(os.path.join(trace_path,'times.npy'),mode='r+')
+            self.node_loads = np.lib.format.open_memmap(os.path.join(trace_path,'node_loads.npy'),mode='r+')
+            self.vehicle_offsets = np.lib.format.open_memmap(os.path.join(trace_path,'vehicle_offsets.npy'),mode='r+')
+            self.vehicle_files = []
+            for column_name,column_type in VEHICLE_COLUMNS:
+                file = open(os.path.join(trace_path,column_name+'.bin'),'r+b')
+                file.truncate(self.num_vehicle_records*np.dtype(column_type).itemsize) #drop rows recorded after the point being resumed from
+                file.seek(0,os.SEEK_END)
+                self.vehicle_files.append(file)
+
+    def record_time(self,time):
+        self.times[self.num_times] = time
+        self.num_times = self.num_times + 1
+        self.vehicle_offsets[self.num_times] = self.num_vehicle_records
+
+    def record_vehicles(self,ids,latitudes,longitudes,passengers):
+        for file,values,(column_name,column_type) in zip(self.vehicle_files,(ids,latitudes,longitudes,passengers),VEHICLE_COLUMNS):
+            np.asarray(values,dtype=column_type).tofile(file)
+        self.num_vehicle_records = self.num_vehicle_records + len(ids)
+        self.vehicle_offsets[self.num_times] = self.num_vehicle_records
+
+    def record_nodes(self,loads):
+        self.node_loads[self.num_times-1] = loads
+
+    #write everything recorded so far to disk, so the files can be read (eg by checkpoint.load_checkpoint) while recording carries on
+    def flush(self):
+        for file in self.vehicle_files:
+            file.flush()
+        self.times.flush()
+        self.node_loads.flush()
+        self.vehicle_offsets.flush()
+
+    #flush everything to disk, write the metadata and return a reader for the finished trace
+    def finish(self):
+        for file in self.vehicle_files:
+            file.close()
+        self.times.flush()
+        self.node_loads.flush()
+        self.vehicle_offsets.flush()
+        metadata = {'num_times':self.num_times,'num_nodes':self.num_nodes,'num_vehicle_records':self.num_vehicle_records,'vehicle_names':list(self.vehicle_names)}
+        with open(os.path.join(self.trace_path,'metadata.json'),'w') as file:
+            json.dump(metadata,file)
+        #drop the write maps before reopening the files for reading
+        del self.times,self.node_loads,self.vehicle_offsets
+        return TraceReader(self.trace_path)
+
+
+#read only access to a trace written by MemmapTraceWriter
+#arrays are memory mapped, so reading any timestep or range of timesteps only pages in the data needed
+class TraceReader(TraceStore):
+    def __init__(self,trace_path):
+        self.trace_path = trace_path
+        with open(os.path.join(trace_path,'metadata.json'),'r') as file:
+            metadata = json.load(file)
+        self.num_times = metadata['num_times']
+        self.num_vehicle_records = metadata['num_vehicle_records']
+        self.vehicle_names = metadata['vehicle_names']
+        self.times = np.load(os.path.join(trace_path,'times.npy'),mmap_mode='r')[:self.num_times]
+        self.node_loads = np.load(os.path.join(trace_path,'node_loads.npy'),mmap_mode='r')[:self.num_times]
+        self.vehicle_offsets = np.load(os.path.join(trace_path,'vehicle_offsets.npy'),mmap_mode='r')[:self.num_times+1]
+        for column_name,column_type in VEHICLE_COLUMNS:
+            if self.num_vehicle_records>0:
+                column = np.memmap(os.path.join(trace_path,column_name+'.bin'),dtype=column_type,mode='r',shape=(self.num_vehicle_records,))
+            else:
+                column = np.zeros(0,dtype=column_type) #an empty file cannot be memory mapped
+            setattr(self,column_name,column)
+
+    #the trace is read only
+    def record_time(self,time):
+        raise ValueError('a TraceReader cannot record data')
+
+    def finish(self):
+        return self
+
+
+#stack the traces of many runs (replications or scenarios) into (run x time x vehicle) and (run x time x node) arrays for batch evaluation
+#shorter runs are padded with nan vehicles and empty nodes
+def stack_traces(traces):
+    vehicle_matrices = [trace.vehicle_passenger_matrix() for trace in traces]
+    num_times = max([len(matrix) for matrix in vehicle_matrices])
+    num_columns = max([matrix.shape[1] for matrix in vehicle_matrices])
+    num_nodes = traces[0].node_loads.shape[1]
+    vehicle_passengers = np.full((len(traces),num_times,num_columns),np.nan,dtype=np.float32)
+    node_loads = np.zeros((len(traces),num_times,num_nodes),dtype=np.float32)
+    for i,trace in enumerate(traces):
+        matrix = vehicle_matrices[i]
+        vehicle_passengers[i,:matrix.shape[0],:matrix.shape[1]] = matrix
+        node_loads[i,:len(trace.node_loads)] = trace.node_loads #traces which did not record node loads are left empty
+    return vehicle_passengers,node_loads
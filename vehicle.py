@@ -7,10 +7,11 @@ import network as Network
 #base vehicle class
 class Vehicle:
     #create the vehicle
-    def __init__(self,schedule,start_time,name,seated_capacity=960,standing_capacity=1680):
+    def __init__(self,schedule,start_time,name,id,seated_capacity=960,standing_capacity=1680,cohort_pool=None):
         self.schedule = copy.copy(schedule)
         self.schedule_name = self.schedule.name
         self.name = name
+        self.id = id #id of the vehicle, used to look up its name in logged data
         self.state = 'at_stop' #vehicle states are 'at_stop' and 'moving'
         self.state_new = True #newly created, will not stop if final_destination = current destination to allow the city circle to function
         self.schedule.offset_schedule_times(start_time)#adjust the schedule to reflect the time we started
@@ -20,18 +21,32 @@ class Vehicle:
         self.final_destination = self.schedule.provide_final_destination() #get the final destination as well
         self.at_final_destination = False #mark if a vehicle has reached it's final destination, and will be deleted next update
         self.agents = [] #container to store agents in the vehicle
+        self.cohort_pool = cohort_pool #if set, agents with the same remaining path are merged into cohorts and merged agents returned to this pool
+        self.agent_cohorts = {} #the agent aboard for each remaining path, used in cohort mode
         self.num_passengers = 0 #number of passengers in the vehicle
         self.max_passengers = 1610 #maximum number of passengers in the vehicle
 
     #have an agent try and board the vehicle
     def board_agent(self,agent):
-        self.agents.append(agent) #add agents to the list of agents on the vehicle
         self.num_passengers = self.num_passengers + agent.number_passengers #the number of passengers has increased
+        if self.cohort_pool is not None:
+            #merge the agent into the cohort already aboard with the same remaining path, if there is one
+            cohort_key = agent.remaining_path()
+            cohort = self.agent_cohorts.get(cohort_key)
+            if cohort is not None:
+                cohort.number_passengers = cohort.number_passengers + agent.number_passengers
+                self.cohort_pool.release(agent)
+                return
+            agent.cohort_key = cohort_key
+            self.agent_cohorts[cohort_key] = agent
+        self.agents.append(agent) #add agents to the list of agents on the vehicle
 
     #have an agent try and leave the vehicle
     def alight_agent(self,id):
         removed_agent = self.agents.pop(id)
         self.num_passengers = self.num_passengers - removed_agent.number_passengers #the number of passengers has decreased
+        if self.cohort_pool is not None:
+            del self.agent_cohorts[removed_agent.cohort_key]
         return removed_agent
     
     def get_capacity(self):
@@ -105,6 +120,28 @@ class Vehicle:
         #    num_agents = num_agents + agent.number_passengers
         return self.num_passengers
 
+    #save the state of the vehicle, agents aboard are saved by id, see restore_vehicle
+    def capture_state(self):
+        state = dict(self.__dict__)
+        state['schedule'] = copy.copy(self.schedule) #the remaining destinations are removed as the vehicle moves, so must be copied
+        state['agents'] = [agent.id for agent in self.agents]
+        del state['agent_cohorts'] #rebuilt from the agents
+        del state['cohort_pool']
+        return state
+
+#recreate a vehicle from a state saved by Vehicle.capture_state, agents is the agent pools list of agents
+def restore_vehicle(state,agents,cohort_pool=None):
+    restored_vehicle = Vehicle.__new__(Vehicle)
+    restored_vehicle.__dict__.update(state)
+    restored_vehicle.schedule = copy.copy(state['schedule']) #copy again so the saved state can be restored more than once
+    restored_vehicle.agents = [agents[id] for id in state['agents']]
+    restored_vehicle.cohort_pool = cohort_pool
+    restored_vehicle.agent_cohorts = {}
+    if cohort_pool is not None:
+        for agent in restored_vehicle.agents:
+            restored_vehicle.agent_cohorts[agent.cohort_key] = agent
+    return restored_vehicle
+
 
 
 